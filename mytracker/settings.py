@@ -42,20 +42,26 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'projects.instrumentation.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'projects.staticfiles.StaticAssetsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'projects.asynchronous.AsyncRequestMiddleware',
+    'projects.sharding.TenantShardMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'projects.instrumentation.middleware.ViewTimingMiddleware',
 ]
 
 ROOT_URLCONF = 'mytracker.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates timing the renders for projects.instrumentation
+        'BACKEND': 'projects.instrumentation.templates.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -74,12 +80,86 @@ WSGI_APPLICATION = 'mytracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# WAL lets readers and the single writer work at the same time; writes take
+# the lock when their transaction starts (IMMEDIATE) so that concurrent
+# read-then-write transactions wait on busy_timeout ('timeout', in seconds)
+# instead of failing with "database is locked". synchronous=NORMAL is safe
+# in WAL mode (a power loss can only drop the last transactions, never
+# corrupt the file).
+SQLITE_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA mmap_size=268435456;'  # 256 Mo
+        'PRAGMA cache_size=-65536;'  # 64 Mo
+        'PRAGMA temp_store=MEMORY;'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        # Keep connections open across requests
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    # Read-only connection to the same file for the views wrapped in
+    # projects.routers.read_only_view
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': SQLITE_OPTIONS['init_command'] + 'PRAGMA query_only=ON;',
+            'timeout': SQLITE_OPTIONS['timeout'],
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
+    # Second shard, unused until listed in PROJECTS_SHARDS (the sharding tests
+    # enable it)
+    'shard1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'shard1.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+DATABASE_ROUTERS = ['projects.routers.ShardRouter', 'projects.routers.ReadOnlyViewRouter']
+
+# Aliases holding the projects and tasks of users, by consistent hashing of
+# their id (projects.sharding). Each extra shard is an alias of DATABASES
+# configured like default, such as 'shard1' above, migrated with
+# `manage.py migrate --database shard1`; existing users are then moved with
+# `manage.py rebalance_shards`. A single alias disables sharding.
+PROJECTS_SHARDS = ['default']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The project list cache (projects.cache) works with any backend, e.g.
+# 'django.core.cache.backends.filebased.FileBasedCache' or
+# 'django.core.cache.backends.redis.RedisCache' with a LOCATION.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+PROJECTS_CACHE = 'default'
+
+# Sessions read from the cache, the database only on a miss. The alternative,
+# 'django.contrib.sessions.backends.signed_cookies', stores nothing server side
+# (sessions are then limited to ~4 KB and cannot be revoked one by one).
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Logged in user and permissions read from the cache (projects.auth)
+AUTHENTICATION_BACKENDS = ['projects.auth.CachedModelBackend']
 
 
 # Password validation
@@ -117,10 +197,44 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic: content-hashed names plus .gz/.br variants, served with
+# immutable cache headers by projects.staticfiles.StaticAssetsMiddleware
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'projects.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+
+# Tailwind CLI used by `manage.py build_assets` (pip install tailwindcss-bin)
+PROJECTS_TAILWIND_CLI = 'tailwindcss'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = '/projects/'
-LOGOUT_REDIRECT_URL = '/'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = '/'
+
+# Background jobs (projects.jobs): run them inline instead of through
+# `manage.py run_workers`
+PROJECTS_JOBS_EAGER = False
+
+# Uploaded import files wait here for a worker (None: system temp directory).
+# Must be shared with the workers when they run on other machines.
+PROJECTS_IMPORT_DIR = None
+
+# Live updates of the project pages (projects.events, ASGI only). The default
+# in-process broker only reaches the pages served by the same process; with
+# several processes use 'projects.events.DatabaseEventBackend'.
+PROJECTS_EVENT_BACKEND = 'projects.events.InProcessEventBackend'
+
+# Request instrumentation (projects.instrumentation): share of the requests
+# whose queries and renders are recorded, slow query log (None disables it,
+# EXPLAIN adds one query per slow SELECT), N+1 detection (None disables it)
+# and the Server-Timing header. Metrics: /projects/metrics/ (staff only).
+PROJECTS_METRICS_SAMPLE_RATE = 1.0
+PROJECTS_SLOW_QUERY_MS = 200
+PROJECTS_EXPLAIN_SLOW_QUERIES = True
+PROJECTS_NPLUSONE_THRESHOLD = 10
+PROJECTS_SERVER_TIMING = True
@@ -1,3 +1,76 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import router, transaction
 
-# Register your models here.
+from . import jobs
+from .deletion import restore_project, soft_delete_projects
+from .models import Project, ProjectSnapshot, Task, TaskDependency, TimeEntry, Timer
+
+# Rows removed along with a project, and the lookup from each of them to it
+PROJECT_CASCADE = [
+    (Task, 'project_id__in'),
+    (TaskDependency, 'project_id__in'),
+    (TimeEntry, 'task__project_id__in'),
+    (Timer, 'task__project_id__in'),
+    (ProjectSnapshot, 'project_id__in'),
+]
+
+
+@admin.register(Project)
+class ProjectAdmin(admin.ModelAdmin):
+    """Projects, soft-deleted ones included.
+
+    Deleting here hides the project at once and queues its purge, in batches
+    (``projects.deletion``), without waiting for the undo window and instead
+    of letting the collector load every task of the project.
+    """
+
+    list_display = ('title', 'user', 'status', 'task_count', 'deadline', 'deleted_at')
+    list_filter = ('status', ('deleted_at', admin.EmptyFieldListFilter))
+    search_fields = ('title',)
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    actions = ['restore_projects']
+
+    def get_queryset(self, request):
+        queryset = Project.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def get_deleted_objects(self, objs, request):
+        # Pas de parcours des tâches par le collecteur: les projets sont listés,
+        # les lignes qui partent avec eux seulement comptées
+        deleted = [f'{Project._meta.verbose_name}: {obj}' for obj in objs]
+        model_count = {Project._meta.verbose_name_plural: len(deleted)}
+        perms_needed = set()
+        project_ids = [obj.pk for obj in objs]
+        for model, lookup in PROJECT_CASCADE:
+            count = model.objects.filter(**{lookup: project_ids}).count()
+            if not count:
+                continue
+            model_count[model._meta.verbose_name_plural] = count
+            opts = model._meta
+            if not request.user.has_perm(f'{opts.app_label}.delete_{opts.model_name}'):
+                perms_needed.add(opts.verbose_name)
+        return deleted, model_count, perms_needed, []
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, [obj])
+
+    def delete_queryset(self, request, queryset):
+        projects = list(queryset)
+        with transaction.atomic(using=router.db_for_write(Project)):
+            soft_delete_projects([project for project in projects if project.deleted_at is None])
+            # Purge en tâche de fond: les workers ne la voient qu'une fois la
+            # suppression validée, et la vue ne garde pas la base verrouillée
+            for project in projects:
+                jobs.enqueue('purge_project', {'project_id': project.pk}, user_id=project.user_id)
+
+    @admin.action(description='Restaurer les projets sélectionnés')
+    def restore_projects(self, request, queryset):
+        restored = sum(
+            restore_project(project.user, project.pk) is not None
+            for project in queryset.filter(deleted_at__isnull=False).select_related('user')
+        )
+        self.message_user(request, f'{restored} projet(s) restauré(s).', messages.SUCCESS)
@@ -0,0 +1,245 @@
+"""Read-only JSON API (v1) for projects and tasks.
+
+Every endpoint applies the ownership rules of the HTML views: a project is
+only visible to its ``user``, a task only through its project. Lists use the
+same keyset pagination as ``project_list`` (``?cursor=``, ``?limit=``) and
+accept ``?fields=a,b`` to select only the listed columns with ``.only()``.
+
+Responses carry an ``ETag`` built from the per-user cache version (see
+``projects.cache``) and a ``Last-Modified``, so polling clients get a 304
+while nothing changed, and are gzipped when the client accepts it.
+
+The endpoints are async views (see ``projects.asynchronous``); the
+statistics endpoints run their queries concurrently.
+"""
+import hashlib
+from datetime import timedelta
+from functools import partial, wraps
+
+from django.db.models import Count
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from .asynchronous import aget_object_or_404, condition, gather_queries
+from .cache import last_modified, user_version
+from .dependencies import project_schedule as compute_schedule
+from .models import Project, Task
+from .pagination import KeysetPaginator
+from .rollups import burndown, history, velocity
+from .routers import read_only_view
+
+DEFAULT_LIMIT = 24
+MAX_LIMIT = 100
+# Séries quotidiennes (burndown, historique): une année au plus
+MAX_HISTORY_DAYS = 366
+
+PROJECT_FIELDS = (
+    'id', 'title', 'description', 'deadline', 'status', 'progress', 'total_time',
+    'task_count', 'completed_count', 'overdue_count', 'created_at', 'updated_at',
+)
+TASK_FIELDS = (
+    'id', 'project', 'title', 'description', 'deadline', 'priority', 'is_completed',
+    'time_spent', 'created_at', 'updated_at',
+)
+PROJECT_SORTS = ('title', 'deadline', 'status', 'progress', 'created_at')
+# Tâches: même ordre que Task.Meta.ordering, servi par task_project_deadline_idx
+TASK_ORDERING = ['deadline', 'priority']
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _etag(request, *args, **kwargs):
+    # Overdue counts, burndowns and schedules move at midnight without any write
+    parts = [
+        str(user_version(request.user.pk)),
+        timezone.localdate().isoformat(),
+        request.get_full_path(),
+    ]
+    return hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def _last_modified(request, *args, **kwargs):
+    return last_modified(request.user.pk)
+
+
+def api_view(view):
+    """Common plumbing of the API endpoints.
+
+    Anonymous requests get a JSON 401 instead of the login redirect, only GET
+    and HEAD are allowed, ``ApiError`` becomes a JSON error response, and the
+    conditional GET and gzip handling described in the module docstring is
+    applied. Reads go to the read-only connection.
+    """
+    conditional = read_only_view(
+        condition(etag_func=_etag, last_modified_func=_last_modified)(view)
+    )
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not (await request.auser()).is_authenticated:
+            return JsonResponse({'error': 'Authentification requise.'}, status=401)
+        try:
+            return await conditional(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'error': str(error)}, status=error.status)
+
+    return gzip_page(require_GET(wrapper))
+
+
+def _requested_fields(request, allowed):
+    """Return the fields listed in ``?fields=``, or every allowed field."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(allowed)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise ApiError(f"Champ(s) inconnu(s) : {', '.join(unknown)}.")
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError('Le paramètre limit doit être un entier.')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _period_start(request, default):
+    """First day of the ``?days=`` days ending today."""
+    try:
+        days = int(request.GET.get('days', default))
+    except ValueError:
+        raise ApiError('Le paramètre days doit être un entier.')
+    days = max(1, min(days, MAX_HISTORY_DAYS))
+    return timezone.localdate() - timedelta(days=days - 1)
+
+
+def _serialize(obj, fields):
+    # attname: the id of a foreign key, without loading the related object
+    return {name: getattr(obj, obj._meta.get_field(name).attname) for name in fields}
+
+
+async def _paginated(request, queryset, ordering, fields):
+    """Serialize one keyset page of ``queryset`` restricted to ``fields``."""
+    sort_fields = [ordering] if isinstance(ordering, str) else ordering
+    # The cursor is built from the sort fields, which must be loaded as well
+    queryset = queryset.only(*fields, *(name.lstrip('-') for name in sort_fields))
+    page = await KeysetPaginator(queryset, ordering, per_page=_limit(request)).aget_page(
+        request.GET.get('cursor')
+    )
+    next_url = None
+    if page.has_next:
+        query = request.GET.copy()
+        query['cursor'] = page.next_cursor
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+    return JsonResponse({
+        'results': [_serialize(obj, fields) for obj in page],
+        'next': next_url,
+    })
+
+
+@api_view
+async def project_list(request):
+    """Projects of the current user (``?status=``, ``?sort=``, ``?fields=``)."""
+    fields = _requested_fields(request, PROJECT_FIELDS)
+    sort_by = request.GET.get('sort', '-created_at')
+    if sort_by.lstrip('-') not in PROJECT_SORTS:
+        raise ApiError(f'Tri invalide : {sort_by}.')
+    projects = Project.objects.filter(user=request.user)
+    if request.GET.get('status'):
+        projects = projects.filter(status=request.GET['status'])
+    return await _paginated(request, projects, sort_by, fields)
+
+
+@api_view
+async def project_detail(request, pk):
+    fields = _requested_fields(request, PROJECT_FIELDS)
+    project = await aget_object_or_404(Project.objects.only(*fields), pk=pk, user=request.user)
+    return JsonResponse(_serialize(project, fields))
+
+
+@api_view
+async def project_tasks(request, pk):
+    """Tasks of one project by deadline then priority (``?completed=0|1``)."""
+    fields = _requested_fields(request, TASK_FIELDS)
+    project = await aget_object_or_404(Project.objects.only('pk'), pk=pk, user=request.user)
+    tasks = project.tasks.all()
+    completed = request.GET.get('completed')
+    if completed in ('0', '1'):
+        tasks = tasks.filter(is_completed=completed == '1')
+    elif completed:
+        raise ApiError('Le paramètre completed doit valoir 0 ou 1.')
+    return await _paginated(request, tasks, TASK_ORDERING, fields)
+
+
+@api_view
+async def project_stats(request, pk):
+    project, statistics = await gather_queries(
+        partial(get_object_or_404, Project.objects.only('pk'), pk=pk, user=request.user),
+        Task.objects.filter(project_id=pk, project__user=request.user).statistics,
+    )
+    return JsonResponse({'project': project.pk, **statistics})
+
+
+@api_view
+async def project_burndown(request, pk):
+    """Daily open/completed/overdue tasks of one project over ``?days=`` (default 30)."""
+    start = _period_start(request, 30)
+    project = await aget_object_or_404(
+        Project.objects.only('pk', 'deadline'), pk=pk, user=request.user
+    )
+    (days,) = await gather_queries(partial(burndown, project, start))
+    return JsonResponse({'project': project.pk, 'deadline': project.deadline, 'days': days})
+
+
+@api_view
+async def project_schedule(request, pk):
+    """Critical path of one project: earliest and latest dates and slack of every task."""
+    project = await aget_object_or_404(
+        Project.objects.only('pk', 'deadline'), pk=pk, user=request.user
+    )
+    (schedule,) = await gather_queries(partial(compute_schedule, project, timezone.localdate()))
+    return JsonResponse(schedule.as_dict())
+
+
+@api_view
+async def task_detail(request, pk):
+    fields = _requested_fields(request, TASK_FIELDS)
+    task = await aget_object_or_404(Task.objects.visible().only(*fields), pk=pk, project__user=request.user)
+    return JsonResponse(_serialize(task, fields))
+
+
+@api_view
+async def stats(request):
+    """Aggregates over every project and task of the current user."""
+    by_status, task_statistics = await gather_queries(
+        lambda: dict(
+            Project.objects.filter(user=request.user).order_by()
+            .values('status').annotate(n=Count('pk')).values_list('status', 'n')
+        ),
+        Task.objects.visible().filter(project__user=request.user).statistics,
+    )
+    return JsonResponse({
+        'projects': sum(by_status.values()),
+        'projects_by_status': by_status,
+        'tasks': task_statistics,
+    })
+
+
+@api_view
+async def stats_history(request):
+    """Daily totals of the current user over ``?days=`` (default 365), with the weekly velocity."""
+    start = _period_start(request, 365)
+    (days,) = await gather_queries(partial(history, request.user, start))
+    return JsonResponse({'days': days, 'velocity': velocity(days)})
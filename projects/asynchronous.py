@@ -0,0 +1,150 @@
+"""Support for the async views of the projects app.
+
+``project_list``, ``project_detail`` and the JSON API are coroutines. Served
+over ASGI (``mytracker.asgi``), a request waiting on the database or on a
+slow client no longer holds a worker thread; under WSGI Django runs them in
+an event loop of their own, so both deployments keep working.
+
+The ORM stays synchronous underneath: ``aget()``, ``aiterator()`` and the
+other async methods hop to the request's thread with ``sync_to_async()``,
+which copies the context variables routing the queries (current shard,
+``read_only_view``). A query run directly in the event loop raises
+``SynchronousOnlyOperation`` instead, hence:
+
+* ``AsyncRequestMiddleware`` resolves ``request.user`` once, so templates and
+  ``condition()`` callbacks can read it from the event loop;
+* ``condition()`` below runs the ETag/Last-Modified callbacks in the
+  request's thread, Django's version calls them from the event loop;
+* querysets are evaluated before the template is rendered.
+"""
+import asyncio
+import datetime
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import close_old_connections, connections
+from django.http import Http404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+def _in_transaction():
+    return any(conn.in_atomic_block for conn in connections.all(initialized_only=True))
+
+
+def _run_query(query):
+    # Executor threads outlive requests, nothing else recycles their connections
+    close_old_connections()
+    return query()
+
+
+async def gather_queries(*queries):
+    """Run the synchronous ``queries`` (callables) concurrently; return their results.
+
+    Gathering ``aget()``/``aaggregate()`` calls would not help: they all hop
+    to the request's one thread and run in turn. Each query runs instead in
+    a thread of the default executor, on that thread's own connection, with
+    the routing context of the request. Inside an open transaction other
+    connections would not see its changes, so the queries then run one after
+    the other on the request's thread (this is the case under ``TestCase``).
+    """
+    if await sync_to_async(_in_transaction)():
+        return [await sync_to_async(query)() for query in queries]
+    return await asyncio.gather(
+        *(sync_to_async(_run_query, thread_sensitive=False)(query) for query in queries)
+    )
+
+
+async def aiterate(iterable):
+    """Iterate a synchronous ``iterable`` from async code, one item at a time.
+
+    Django's ASGI handler consumes a synchronous streaming response with
+    ``list()`` before sending anything; items are pulled lazily in the
+    request's thread instead, so streamed responses keep a flat memory.
+    """
+    iterator = iter(iterable)
+    done = object()
+    while (item := await sync_to_async(next)(iterator, done)) is not done:
+        yield item
+
+
+def condition(etag_func=None, last_modified_func=None):
+    """``django.views.decorators.http.condition`` for async views.
+
+    Both callbacks run together in the request's thread, where they may
+    query the database.
+    """
+    def compute(request, *args, **kwargs):
+        etag = etag_func(request, *args, **kwargs) if etag_func else None
+        modified = last_modified_func(request, *args, **kwargs) if last_modified_func else None
+        return etag, modified
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            etag, modified = await sync_to_async(compute)(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            if modified and not timezone.is_aware(modified):
+                modified = timezone.make_aware(modified, datetime.timezone.utc)
+            modified = int(modified.timestamp()) if modified else None
+            response = get_conditional_response(request, etag=etag, last_modified=modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return wrapper
+    return decorator
+
+
+class AsyncRequestMiddleware:
+    """Prepare requests for the async views, under WSGI as under ASGI.
+
+    The user is resolved here, in the request's thread, and pinned for both
+    ``request.user`` and ``request.auser()``, which Django otherwise resolves
+    separately. Under ASGI, synchronous streaming content is also handed to
+    ``aiterate()``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _pin_user(request, user):
+        async def auser():
+            return user
+
+        request.user = user
+        request.auser = auser
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        # Evaluates the lazy user now, before a view's event loop reads it
+        request.user.is_authenticated
+        self._pin_user(request, request.user)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self._pin_user(request, await request.auser())
+        response = await self.get_response(request)
+        if response.streaming and not response.is_async:
+            response.streaming_content = aiterate(response.streaming_content)
+        return response
@@ -0,0 +1,107 @@
+"""Authentication without a database round trip per request.
+
+With ``SESSION_ENGINE`` set to ``cached_db`` the session comes from the cache
+(``signed_cookies`` keeps it in the cookie itself), and ``CachedModelBackend``
+resolves the logged in user and their permissions from the cache too, so a
+request whose session and user are cached runs no auth query at all.
+
+The cached entries embed a per-user version, like the project lists of
+``projects.cache``: the signals in ``projects.signals`` bump it when the user
+is saved or deleted (password, ``is_active``, ``is_staff``...) or when their
+groups or permissions change, and the next request reads the user again.
+Changing a password therefore still logs out the other sessions. Writes
+that bypass the signals (``QuerySet.update()`` on users) must call
+``bump_auth_version()``; entries expire after ``AUTH_TIMEOUT`` anyway.
+
+Expired sessions of the database backends are removed in batches by
+``clear_expired_sessions()`` (``manage.py clear_expired_sessions``).
+"""
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.db import router, transaction
+from django.utils import timezone
+
+from .cache import get_cache
+
+AUTH_TIMEOUT = 15 * 60
+SESSION_CLEANUP_BATCH_SIZE = 1000
+
+
+def _version_key(user_id):
+    return f'auth:version:{user_id}'
+
+
+def auth_version(user_id):
+    cache = get_cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # Time-based seed: an evicted version never comes back to an old value
+        cache.add(_version_key(user_id), time.time_ns(), None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def bump_auth_version(*user_ids):
+    """Drop the cached user and permissions of ``user_ids``."""
+    cache = get_cache()
+    for user_id in user_ids:
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            cache.add(_version_key(user_id), time.time_ns(), None)
+
+
+class CachedModelBackend(ModelBackend):
+    """``ModelBackend`` whose ``get_user()`` and permission lookups hit the cache."""
+
+    def get_user(self, user_id):
+        cache = get_cache()
+        key = f'auth:user:{user_id}:{auth_version(user_id)}'
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, AUTH_TIMEOUT)
+        return user
+
+    def _cached_permissions(self, user_obj, obj, kind, lookup):
+        if obj is not None or not user_obj.is_active or user_obj.is_anonymous:
+            return lookup(user_obj, obj)
+        cache = get_cache()
+        key = f'auth:perms:{kind}:{user_obj.pk}:{auth_version(user_obj.pk)}'
+        permissions = cache.get(key)
+        if permissions is None:
+            permissions = lookup(user_obj, obj)
+            cache.set(key, permissions, AUTH_TIMEOUT)
+        return permissions
+
+    def get_user_permissions(self, user_obj, obj=None):
+        return self._cached_permissions(user_obj, obj, 'user', super().get_user_permissions)
+
+    def get_group_permissions(self, user_obj, obj=None):
+        return self._cached_permissions(user_obj, obj, 'group', super().get_group_permissions)
+
+
+def clear_expired_sessions(batch_size=SESSION_CLEANUP_BATCH_SIZE):
+    """Delete the expired database sessions, ``batch_size`` per transaction.
+
+    Returns the number deleted; 0 with an engine that stores nothing server
+    side (``signed_cookies``). The ``cached_db`` cache entries expire on
+    their own.
+    """
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    if not hasattr(store, 'get_model_class'):
+        return 0
+    model = store.get_model_class()
+    expired = model.objects.filter(expire_date__lt=timezone.now())
+    removed = 0
+    while True:
+        with transaction.atomic(using=router.db_for_write(model)):
+            keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+            if keys:
+                removed += model.objects.filter(session_key__in=keys).delete()[0]
+        if len(keys) < batch_size:
+            return removed
@@ -0,0 +1,102 @@
+"""Operations applied to many tasks in one request.
+
+``apply_task_operation()`` turns an operation over a set of task ids into a
+single ``UPDATE`` (or ``DELETE``) whose ``WHERE`` clause also checks that the
+tasks, and for a move the target project, belong to the user: ids of other
+users' tasks are simply not matched. Like ``scheduling.apply_plan()`` the
+write bypasses the model signals, so the counters of the projects involved
+are reconciled, the search index updated, the user's cache version bumped
+and a ``tasks.bulk`` event published (see ``projects.events``) in the same
+transaction.
+"""
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db import router, transaction
+from django.db.models import Exists, F
+from django.utils import timezone
+
+from .cache import bump_user_version
+from .counters import reconcile_task_counters
+from .dependencies import detach_tasks, reschedule_tasks
+from .events import publish
+from .models import Project, Task, TimeEntry, Timer
+from .search import get_search_backend
+
+# Ids acceptés par requête
+MAX_BULK_TASKS = 5000
+
+
+@dataclass
+class BulkResult:
+    operation: str
+    count: int = 0
+    project_ids: list = field(default_factory=list)
+
+    def as_dict(self):
+        return {'operation': self.operation, 'count': self.count, 'projects': self.project_ids}
+
+
+def _changes(operation, priority, days, project):
+    if operation == 'complete':
+        return {'is_completed': True}
+    if operation == 'uncomplete':
+        return {'is_completed': False}
+    if operation == 'priority':
+        return {'priority': priority}
+    if operation == 'shift':
+        return {'deadline': F('deadline') + timedelta(days=days)}
+    if operation == 'move':
+        return {'project_id': project}
+    raise ValueError(f'Unknown bulk operation: {operation}')
+
+
+def apply_task_operation(user, task_ids, operation, priority=None, days=None, project=None):
+    """Apply ``operation`` to the tasks of ``user`` among ``task_ids``; return a ``BulkResult``.
+
+    ``priority`` goes with ``'priority'``, ``days`` (possibly negative) with
+    ``'shift'`` and the id of the target ``project`` with ``'move'``.
+    """
+    result = BulkResult(operation)
+    tasks = Task.objects.visible().filter(pk__in=task_ids, project__user=user)
+    if operation == 'move':
+        tasks = tasks.filter(Exists(Project.objects.filter(pk=project, user=user)))
+    using = router.db_for_write(Task)
+    with transaction.atomic(using=using):
+        # Read under the write lock: ids and projects of the tasks about to change
+        rows = list(tasks.using(using).order_by().values_list('pk', 'project_id'))
+        if not rows:
+            return result
+        owned_ids = [pk for pk, _ in rows]
+        project_ids = {project_id for _, project_id in rows}
+        backend = get_search_backend()
+        if operation in ('delete', 'move'):
+            # Dependencies stay within a project
+            detach_tasks(owned_ids, using)
+        if operation == 'delete':
+            # QuerySet.delete() would load every task to send its signals; the
+            # rows referencing the tasks go first, their time with the reconcile
+            for model in (TimeEntry, Timer):
+                model.objects.filter(task_id__in=owned_ids)._raw_delete(using)
+            result.count = tasks._raw_delete(using)
+            backend.remove_tasks(owned_ids)
+        else:
+            result.count = tasks.update(
+                **_changes(operation, priority, days, project), updated_at=timezone.now()
+            )
+            if operation == 'move':
+                project_ids.add(project)
+                backend.move_tasks(owned_ids, project)
+            elif operation in ('complete', 'uncomplete'):
+                # A completed task has no work left in the schedule
+                reschedule_tasks(owned_ids, using)
+        if operation != 'priority':
+            reconcile_task_counters(Project.objects.filter(pk__in=project_ids))
+        publish(user.pk, {
+            'type': 'tasks.bulk', 'operation': operation, 'count': result.count,
+            'projects': sorted(project_ids),
+        }, using)
+        # Even when no counter drifted: the tasks shown in the API changed
+        bump_user_version(user.pk, using=using)
+    result.project_ids = sorted(project_ids)
+    return result
@@ -0,0 +1,118 @@
+"""Per-user caching of the project list.
+
+Every user has a version number stored in the cache. Cached list fragments
+embed that version in their key, so bumping it (from the model signals in
+``projects.signals``, or explicitly after bulk writes that bypass them)
+invalidates every cached list of the user at once without having to know
+which keys exist. The bump waits for the commit of the write. The same
+version backs the ``ETag`` of ``project_list``, and the time of the last bump
+its ``Last-Modified``.
+
+Only ``get``/``set``/``add``/``incr`` are used, so any Django cache backend
+works (locmem, file based, Redis/Memcached compatible). The alias is chosen
+with the ``PROJECTS_CACHE`` setting.
+"""
+import hashlib
+import time
+from functools import partial
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Max
+
+LIST_TIMEOUT = 15 * 60
+STATS_KEY = 'projects:stats:{}'
+
+
+def get_cache():
+    return caches[getattr(settings, 'PROJECTS_CACHE', 'default')]
+
+
+def _version_key(user_id):
+    return f'projects:version:{user_id}'
+
+
+def _modified_key(user_id):
+    return f'projects:modified:{user_id}'
+
+
+def user_version(user_id):
+    cache = get_cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # Seed with the current time so a version evicted from the cache can
+        # never come back to a value that older cached fragments still use.
+        cache.add(_version_key(user_id), time.time_ns(), None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def bump_user_version(user_id, modified=None, using=None):
+    """Invalidate every cached list of ``user_id`` once the transaction on ``using`` commits.
+
+    Bumped before the commit, the version would let a concurrent request
+    render the data not committed yet, and cache it under the new version.
+    Outside a transaction the version is bumped at once.
+    """
+    transaction.on_commit(partial(_bump_user_version, user_id, modified), using=using)
+
+
+def _bump_user_version(user_id, modified):
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.add(_version_key(user_id), time.time_ns(), None)
+    cache.set(_modified_key(user_id), modified or datetime.now(dt_timezone.utc), None)
+
+
+def last_modified(user_id):
+    """Return when the projects of ``user_id`` last changed.
+
+    Falls back to ``MAX(updated_at)`` when the cache has no record yet.
+    """
+    from .models import Project
+
+    cache = get_cache()
+    modified = cache.get(_modified_key(user_id))
+    if modified is None:
+        modified = Project.objects.filter(user_id=user_id).aggregate(
+            last=Max('updated_at')
+        )['last']
+        if modified is not None:
+            cache.add(_modified_key(user_id), modified, None)
+    return modified
+
+
+def list_cache_key(user_id, params, today):
+    """Key of one rendered list (filters, search, sort and cursor) of a user."""
+    query = '&'.join(f'{key}={value}' for key, value in sorted(params.items()))
+    digest = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+    return f'projects:list:{user_id}:{user_version(user_id)}:{today.isoformat()}:{digest}'
+
+
+def get_cached_list(key):
+    value = get_cache().get(key)
+    _count('hits' if value is not None else 'misses')
+    return value
+
+
+def set_cached_list(key, value):
+    get_cache().set(key, value, LIST_TIMEOUT)
+
+
+def _count(name):
+    cache = get_cache()
+    key = STATS_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def cache_stats():
+    cache = get_cache()
+    return {name: cache.get(STATS_KEY.format(name), 0) for name in ('hits', 'misses')}
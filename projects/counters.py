@@ -0,0 +1,141 @@
+"""Denormalized task counters stored on ``Project``.
+
+``task_count``, ``completed_count`` and ``overdue_count`` are adjusted in place
+with ``F()`` expressions whenever a task is created, completed, re-dated,
+moved or deleted (see ``projects.signals``), so reading them never touches the
+task table. ``progress`` is derived from the first two in the same UPDATE.
+
+Anything that bypasses model signals (``QuerySet.update()``, ``bulk_create()``,
+raw SQL) must call ``reconcile_task_counters()`` for the affected projects.
+``overdue_count`` also goes stale on its own as days pass; the
+``reconcile_counters`` management command repairs that in bulk and is meant to
+run daily. Reconciling also recounts ``time_spent`` (see ``projects.timetracking``)
+from the tasks, which follows set-based task moves and deletions.
+"""
+from collections import defaultdict
+
+from django.db import router, transaction
+from django.db.models import Case, Count, F, FloatField, Max, Min, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Round
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .cache import bump_user_version
+from .events import publish
+from .models import Project, Task
+from .rollups import apply_snapshot_delta, refresh_project_snapshots
+
+
+def progress_expression(task_count, completed_count):
+    """Completion percentage, left untouched for projects without tasks."""
+    return Case(
+        When(
+            GreaterThan(task_count, 0),
+            then=Round(completed_count * Value(100.0) / task_count, 1),
+        ),
+        default=F('progress'),
+        output_field=FloatField(),
+    )
+
+
+def apply_task_counter_change(old, new):
+    """Move one task's contribution from state ``old`` to state ``new``.
+
+    States are the ``(project_id, is_completed, is_overdue)`` tuples returned by
+    ``Task.counted_state()``; ``None`` means "not counted" (creation or
+    deletion). Each affected project gets a single atomic UPDATE. Returns the
+    ``{project_id: (tasks, completed, overdue)}`` deltas applied.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        project_id, is_completed, is_overdue = state
+        delta = deltas[project_id]
+        delta[0] += sign
+        delta[1] += sign * is_completed
+        delta[2] += sign * is_overdue
+
+    applied = {}
+    for project_id, (tasks, completed, overdue) in deltas.items():
+        if tasks or completed or overdue:
+            _bump(project_id, tasks, completed, overdue)
+            applied[project_id] = (tasks, completed, overdue)
+    return applied
+
+
+def _bump(project_id, tasks, completed, overdue):
+    task_count = Greatest(F('task_count') + tasks, 0)
+    completed_count = Greatest(F('completed_count') + completed, 0)
+    # Part of the caller's transaction (Task.save(), bulk operations) when there is one
+    with transaction.atomic(using=router.db_for_write(Project), savepoint=False):
+        Project.objects.filter(pk=project_id).update(
+            task_count=task_count,
+            completed_count=completed_count,
+            overdue_count=Greatest(F('overdue_count') + overdue, 0),
+            progress=progress_expression(task_count, completed_count),
+            # Cards and list ETags key on updated_at, which must follow the counters
+            updated_at=timezone.now(),
+        )
+        apply_snapshot_delta(project_id, tasks, completed, overdue)
+
+
+def reconcile_task_counters(projects=None):
+    """Recount the counters of ``projects`` (a queryset, default all) from tasks.
+
+    Only projects whose counters drifted are written, in a single set-based
+    UPDATE regardless of their number, and their daily snapshots refreshed.
+    Returns the number of projects fixed.
+    """
+    if projects is None:
+        projects = Project.objects.all()
+    today = timezone.now().date()
+    tasks = Task.objects.filter(project=OuterRef('pk')).order_by().values('project')
+
+    def count(**filters):
+        counted = tasks.filter(**filters).annotate(n=Count('pk')).values('n')
+        return Coalesce(Subquery(counted), 0)
+
+    actual = {
+        'task_count': count(),
+        'completed_count': count(is_completed=True),
+        'overdue_count': count(is_completed=False, deadline__lt=today),
+        'time_spent': Coalesce(Subquery(tasks.annotate(s=Sum('time_spent')).values('s')), 0),
+    }
+    drifted = projects.alias(**{f'actual_{name}': value for name, value in actual.items()}).exclude(
+        **{name: F(f'actual_{name}') for name in actual}
+    )
+    using = router.db_for_write(Project)
+    with transaction.atomic(using=using):
+        rows = list(drifted.values_list('pk', 'user_id'))
+        if not rows:
+            return 0
+        updated = Project.objects.filter(pk__in=drifted.values('pk')).update(
+            **actual,
+            progress=progress_expression(actual['task_count'], actual['completed_count']),
+            updated_at=timezone.now(),
+        )
+        refresh_project_snapshots(pk for pk, _ in rows)
+        for pk, user_id in rows:
+            publish(user_id, {'type': 'project.updated', 'project': pk}, using)
+        for user_id in {user_id for _, user_id in rows}:
+            bump_user_version(user_id, using=using)
+    return updated
+
+
+def reconcile_in_batches(projects, batch_size=5000):
+    """Reconcile ``projects`` one primary key range at a time.
+
+    Each batch is its own short transaction, so the write lock is released
+    between batches. Returns the number of projects updated.
+    """
+    bounds = projects.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return 0
+    total = 0
+    # From the first pk: the ids of a shard start at n * SHARD_ID_SPAN
+    for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+        total += reconcile_task_counters(
+            projects.filter(pk__gte=start, pk__lt=start + batch_size)
+        )
+    return total
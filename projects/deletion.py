@@ -0,0 +1,125 @@
+"""Soft deletion of projects, with an undo window and a batched purge.
+
+Deleting a project with ``Model.delete()`` makes Django's collector load
+every task to cascade and send signals, in the request, while the database
+stays locked. ``soft_delete_project()`` instead stamps ``deleted_at`` with
+one UPDATE: the default manager (``Project.objects``) hides the project at
+once and ``restore_project()`` can bring it back during ``UNDO_WINDOW``.
+
+Past the window, ``purge_deleted_projects()`` (the ``purge_deleted_projects``
+job, queued by the view for the end of the window, or the management command
+of the same name) removes the project with ``purge_project()``: its tasks and
+the rows referencing them go ``PURGE_BATCH_SIZE`` at a time with raw DELETEs,
+each batch in its own short transaction, then the project row. No model is
+loaded and no signal sent: the search index is updated here, and the user's
+caches, rollups and live pages were already updated at soft deletion. The
+admin deletes projects through the same path (``soft_delete_projects()`` for
+a whole selection), queuing the ``purge_project`` job without waiting for
+the window.
+"""
+from datetime import timedelta
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from .cache import bump_user_version
+from .events import publish
+from .models import Project, ProjectSnapshot, Task, TaskDependency, TimeEntry, Timer
+from .rollups import refresh_user_snapshots
+from .search import get_search_backend
+
+UNDO_WINDOW = timedelta(minutes=10)
+# Stays below SQLite's default limit of 999 bound parameters per statement
+PURGE_BATCH_SIZE = 900
+
+
+def soft_delete_project(project, now=None):
+    """Hide ``project`` at once; it is purged after ``UNDO_WINDOW``."""
+    soft_delete_projects([project], now)
+
+
+def soft_delete_projects(projects, now=None):
+    """Hide ``projects`` at once, with set-based UPDATEs (admin bulk deletions).
+
+    The snapshots and the cache version of each owner are refreshed once,
+    however many of their projects go.
+    """
+    now = now or timezone.now()
+    using = router.db_for_write(Project)
+    project_ids = [project.pk for project in projects]
+    user_ids = sorted({project.user_id for project in projects})
+    with transaction.atomic(using=using):
+        for start in range(0, len(project_ids), PURGE_BATCH_SIZE):
+            Project.objects.filter(pk__in=project_ids[start:start + PURGE_BATCH_SIZE]).update(
+                deleted_at=now, updated_at=now,
+            )
+        refresh_user_snapshots(user_ids)
+        for project in projects:
+            publish(project.user_id, {'type': 'project.deleted', 'project': project.pk}, using)
+        for user_id in user_ids:
+            bump_user_version(user_id, using=using)
+    for project in projects:
+        project.deleted_at = now
+
+
+def restore_project(user, pk, now=None):
+    """Undo the deletion of project ``pk`` of ``user``; ``None`` once the window is over."""
+    now = now or timezone.now()
+    using = router.db_for_write(Project)
+    with transaction.atomic(using=using):
+        restored = Project.all_objects.filter(
+            pk=pk, user=user, deleted_at__gt=now - UNDO_WINDOW,
+        ).update(deleted_at=None, updated_at=now)
+        if not restored:
+            return None
+        refresh_user_snapshots([user.pk])
+        publish(user.pk, {'type': 'project.created', 'project': pk}, using)
+        bump_user_version(user.pk, using=using)
+    return Project.objects.get(pk=pk)
+
+
+def purge_project(project_id, batch_size=PURGE_BATCH_SIZE):
+    """Remove project ``project_id``, deleted or not, and everything under it.
+
+    Returns the number of tasks removed.
+    """
+    using = router.db_for_write(Task)
+    backend = get_search_backend()
+    tasks = Task.objects.using(using).filter(project_id=project_id).order_by()
+    removed = 0
+    while True:
+        with transaction.atomic(using=using):
+            task_ids = list(tasks.values_list('pk', flat=True)[:batch_size])
+            if task_ids:
+                for model in (TimeEntry, Timer):
+                    model.objects.filter(task_id__in=task_ids)._raw_delete(using)
+                TaskDependency.objects.filter(predecessor_id__in=task_ids)._raw_delete(using)
+                TaskDependency.objects.filter(successor_id__in=task_ids)._raw_delete(using)
+                removed += Task.objects.filter(pk__in=task_ids)._raw_delete(using)
+                backend.remove_tasks(task_ids)
+        if len(task_ids) < batch_size:
+            break
+    with transaction.atomic(using=using):
+        ProjectSnapshot.objects.filter(project_id=project_id)._raw_delete(using)
+        project = Project.all_objects.using(using).filter(pk=project_id).first()
+        if project is not None:
+            backend.remove_project(project)
+            Project.all_objects.filter(pk=project_id)._raw_delete(using)
+    return removed
+
+
+def purge_deleted_projects(before=None, user_id=None, batch_size=PURGE_BATCH_SIZE):
+    """Purge the projects soft-deleted before ``before`` (default: ``UNDO_WINDOW`` ago).
+
+    Limited to the projects of ``user_id`` when given. Returns
+    ``(projects, tasks)`` removed.
+    """
+    before = before or timezone.now() - UNDO_WINDOW
+    expired = Project.all_objects.filter(deleted_at__lt=before)
+    if user_id is not None:
+        expired = expired.filter(user_id=user_id)
+    projects = tasks = 0
+    for project_id in list(expired.order_by().values_list('pk', flat=True)):
+        tasks += purge_project(project_id, batch_size)
+        projects += 1
+    return projects, tasks
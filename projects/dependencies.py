@@ -0,0 +1,391 @@
+"""Task dependencies and critical-path scheduling.
+
+A ``TaskDependency`` makes its ``successor`` wait until its ``predecessor`` is
+done. The dependencies of a project form a directed acyclic graph:
+``add_dependency()`` refuses an edge that would close a cycle.
+
+Each task stores two lengths, in days of remaining work (``Task.duration``,
+0 once the task is completed):
+
+* ``before_days``, the longest chain of tasks it has to wait for: started
+  today, it can start ``before_days`` days from now at the earliest;
+* ``after_days``, the longest chain of tasks waiting for it: it has to be
+  done ``after_days`` days before the project deadline at the latest.
+
+``project_schedule()`` turns them into the dates of the critical path method
+(earliest and latest start and finish, slack) against today and
+``Project.deadline``. Neither length depends on the deadline, so moving it
+recomputes nothing. When dependencies, durations or completions change,
+``reschedule_tasks()`` only walks the tasks whose lengths actually change:
+the successors for ``before_days``, the predecessors for ``after_days``,
+loaded through the indexes as the walk reaches them. ``schedule_project()``
+recomputes a whole project from scratch.
+"""
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from heapq import heapify, heappop, heappush
+from itertools import chain, islice
+
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+
+from .models import Project, Task, TaskDependency
+
+# Stays below SQLite's default limit of 999 bound parameters per statement
+BATCH_SIZE = 900
+
+NODE_FIELDS = ('duration', 'is_completed', 'before_days', 'after_days')
+# Index of the lengths in a node, and the neighbours each one is computed from
+DURATION, BEFORE, AFTER = 0, 1, 2
+UPSTREAM = {BEFORE: 'predecessor', AFTER: 'successor'}
+DOWNSTREAM = {BEFORE: 'successor', AFTER: 'predecessor'}
+
+
+def _batches(ids, size=BATCH_SIZE):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+class _Graph:
+    """The tasks and dependencies a reschedule reaches, loaded on demand.
+
+    ``nodes`` maps a task id to ``[remaining_days, before_days, after_days]``
+    and ``edges['predecessor'][pk]`` (``['successor'][pk]``) lists the
+    predecessors (successors) of a task once loaded. A reschedule runs one
+    small query per step of the walk, so they are plain SQL: building them
+    with the ORM would cost more than running them.
+    """
+
+    def __init__(self, using):
+        self.using = using
+        self.nodes = {}
+        self.stored = {}
+        self.edges = {'predecessor': {}, 'successor': {}}
+        quote = connections[using].ops.quote_name
+        self.task_table = quote(Task._meta.db_table)
+        self.dependency_table = quote(TaskDependency._meta.db_table)
+        self.node_columns = ', '.join(f't.{quote(name)}' for name in NODE_FIELDS)
+
+    def _select(self, sql, ids):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(sql % ', '.join(['%s'] * len(ids)), ids)
+            return cursor.fetchall()
+
+    def _add_node(self, pk, duration, is_completed, before, after):
+        if pk not in self.nodes:
+            self.nodes[pk] = [0 if is_completed else duration, before, after]
+            self.stored[pk] = (before, after)
+
+    def load(self, ids):
+        missing = [pk for pk in ids if pk not in self.nodes]
+        sql = f'SELECT t.id, {self.node_columns} FROM {self.task_table} t WHERE t.id IN (%s)'
+        for batch in _batches(missing):
+            for row in self._select(sql, batch):
+                self._add_node(*row)
+
+    def load_neighbours(self, ids, direction):
+        """Load the ``'predecessor'`` or ``'successor'`` neighbours of ``ids``, with their nodes."""
+        other = 'successor' if direction == 'predecessor' else 'predecessor'
+        adjacency = self.edges[direction]
+        missing = [pk for pk in dict.fromkeys(ids) if pk not in adjacency]
+        sql = (
+            f'SELECT d.{other}_id, t.id, {self.node_columns} FROM {self.dependency_table} d '
+            f'JOIN {self.task_table} t ON t.id = d.{direction}_id WHERE d.{other}_id IN (%s)'
+        )
+        for batch in _batches(missing):
+            for pk in batch:
+                adjacency[pk] = []
+            for pk, neighbour, *values in self._select(sql, batch):
+                adjacency[pk].append(neighbour)
+                self._add_node(neighbour, *values)
+
+    def propagate(self, seeds, index):
+        """Recompute length ``index`` from ``seeds`` on, as far as it changes.
+
+        The seeds and their downstream neighbours are recomputed; a length
+        that changes sends its own downstream neighbours to the queue. The
+        queue is ordered by the stored lengths, which grow along the edges,
+        so a task is usually reached after all its changed inputs.
+        """
+        upstream, downstream = self.edges[UPSTREAM[index]], self.edges[DOWNSTREAM[index]]
+        self.load_neighbours(seeds, DOWNSTREAM[index])
+        queue = [
+            (self.nodes[pk][index], pk)
+            for pk in set(chain(seeds, *(downstream[pk] for pk in seeds)))
+        ]
+        heapify(queue)
+        while queue:
+            _, pk = heappop(queue)
+            if pk not in upstream:
+                # Load the queued tasks too, in the same queries: their inputs,
+                # and the tasks to requeue should their length change
+                waiting = (other for _, other in queue if other not in upstream)
+                batch = [pk, *islice(waiting, BATCH_SIZE - 1)]
+                self.load_neighbours(batch, UPSTREAM[index])
+                self.load_neighbours(batch, DOWNSTREAM[index])
+            node = self.nodes[pk]
+            length = max(
+                (self.nodes[other][index] + self.nodes[other][DURATION] for other in upstream[pk]),
+                default=0,
+            )
+            if length != node[index]:
+                node[index] = length
+                self.load_neighbours([pk], DOWNSTREAM[index])
+                for other in downstream[pk]:
+                    heappush(queue, (self.nodes[other][index], other))
+
+    def save(self):
+        """Write the lengths that changed; return the number of tasks changed."""
+        rows = [
+            (node[BEFORE], node[AFTER], pk)
+            for pk, node in self.nodes.items() if (node[BEFORE], node[AFTER]) != self.stored[pk]
+        ]
+        if rows:
+            with connections[self.using].cursor() as cursor:
+                cursor.executemany(
+                    f'UPDATE {self.task_table} SET before_days = %s, after_days = %s WHERE id = %s', rows,
+                )
+        return len(rows)
+
+
+def reschedule_tasks(task_ids, using=None, detached=False):
+    """Update the lengths after the dependencies, durations or completion of ``task_ids`` changed.
+
+    ``detached`` tells that some of them may have just lost their last
+    dependency. Returns the number of tasks whose lengths changed.
+    """
+    using = using or router.db_for_write(Task)
+    graph = _Graph(using)
+    task_ids = list(dict.fromkeys(task_ids))
+    graph.load_neighbours(task_ids, 'predecessor')
+    graph.load_neighbours(task_ids, 'successor')
+    # Without dependencies a task has zero lengths, whatever its duration
+    seeds = [pk for pk in task_ids if graph.edges['predecessor'][pk] or graph.edges['successor'][pk]]
+    edgeless = list(set(task_ids).difference(seeds)) if detached else []
+    if not seeds and not edgeless:
+        return 0
+    changed = 0
+    with transaction.atomic(using=using):
+        for batch in _batches(edgeless):
+            changed += Task.objects.using(using).filter(pk__in=batch).exclude(
+                before_days=0, after_days=0,
+            ).update(before_days=0, after_days=0)
+        if seeds:
+            graph.load(seeds)
+            graph.propagate(seeds, BEFORE)
+            graph.propagate(seeds, AFTER)
+            changed += graph.save()
+    return changed
+
+
+def schedule_project(project):
+    """Recompute the lengths of every task of ``project``; return the number changed.
+
+    Raises ``ValueError`` if the dependencies contain a cycle.
+    """
+    using = router.db_for_write(Task)
+    graph = _Graph(using)
+    with transaction.atomic(using=using):
+        for row in Task.objects.using(using).filter(project=project).order_by().values_list('pk', *NODE_FIELDS):
+            graph._add_node(*row)
+        predecessors, successors = graph.edges['predecessor'], graph.edges['successor']
+        for pk in graph.nodes:
+            predecessors[pk], successors[pk] = [], []
+        links = TaskDependency.objects.using(using).filter(project=project).values_list('predecessor_id', 'successor_id')
+        for predecessor, successor in links.iterator(chunk_size=10000):
+            successors[predecessor].append(successor)
+            predecessors[successor].append(predecessor)
+
+        # Kahn: each task once its predecessors are done, then in reverse for the tails
+        waiting = {pk: len(ids) for pk, ids in predecessors.items()}
+        ready = deque(pk for pk, count in waiting.items() if not count)
+        order = []
+        while ready:
+            pk = ready.popleft()
+            order.append(pk)
+            for other in successors[pk]:
+                waiting[other] -= 1
+                if not waiting[other]:
+                    ready.append(other)
+        if len(order) != len(graph.nodes):
+            raise ValueError(f'The dependencies of project {project.pk} contain a cycle')
+        for index, upstream, tasks in ((BEFORE, predecessors, order), (AFTER, successors, reversed(order))):
+            for pk in tasks:
+                graph.nodes[pk][index] = max(
+                    (graph.nodes[other][index] + graph.nodes[other][DURATION] for other in upstream[pk]),
+                    default=0,
+                )
+        return graph.save()
+
+
+# Edits -----------------------------------------------------------------------
+
+def _reaches(start, target, limit, using):
+    """True when ``target`` can be reached from ``start`` through the dependencies.
+
+    ``before_days`` never decreases along a dependency, so the walk skips
+    every task whose ``before_days`` is above ``limit``, the one of ``target``.
+    """
+    seen, frontier = {start}, [start]
+    while frontier:
+        reached = set()
+        for batch in _batches(frontier):
+            reached.update(
+                TaskDependency.objects.using(using)
+                .filter(predecessor_id__in=batch, successor__before_days__lte=limit)
+                .values_list('successor_id', flat=True)
+            )
+        if target in reached:
+            return True
+        frontier = list(reached - seen)
+        seen.update(frontier)
+    return False
+
+
+def add_dependency(predecessor, successor):
+    """Make ``successor`` wait for ``predecessor`` and reschedule; return the ``TaskDependency``.
+
+    Raises ``ValidationError`` when the tasks are in different projects or
+    the dependency would close a cycle.
+    """
+    if predecessor.project_id != successor.project_id:
+        raise ValidationError("Les deux tâches doivent appartenir au même projet.")
+    using = router.db_for_write(TaskDependency)
+    with transaction.atomic(using=using):
+        # One graph edit at a time per project
+        list(Project.all_objects.using(using).select_for_update().filter(pk=predecessor.project_id).values_list('pk'))
+        lengths = dict(
+            Task.objects.using(using).filter(pk__in=[predecessor.pk, successor.pk]).values_list('pk', 'before_days')
+        )
+        if predecessor.pk == successor.pk or (
+            lengths[successor.pk] <= lengths[predecessor.pk]
+            and _reaches(successor.pk, predecessor.pk, lengths[predecessor.pk], using)
+        ):
+            raise ValidationError("Cette dépendance créerait un cycle.")
+        dependency, created = TaskDependency.objects.using(using).get_or_create(
+            predecessor_id=predecessor.pk, successor_id=successor.pk,
+            defaults={'project_id': predecessor.project_id},
+        )
+        if created:
+            reschedule_tasks([predecessor.pk, successor.pk], using)
+    return dependency
+
+
+def remove_dependency(predecessor_id, successor_id):
+    """Remove a dependency and reschedule; ``False`` if there was none."""
+    using = router.db_for_write(TaskDependency)
+    with transaction.atomic(using=using):
+        deleted = TaskDependency.objects.using(using).filter(
+            predecessor_id=predecessor_id, successor_id=successor_id,
+        )._raw_delete(using)
+        if deleted:
+            reschedule_tasks([predecessor_id, successor_id], using, detached=True)
+    return bool(deleted)
+
+
+def detach_tasks(task_ids, using=None):
+    """Remove every dependency of ``task_ids`` (before they move or go) and reschedule their neighbours."""
+    using = using or router.db_for_write(TaskDependency)
+    touched = set()
+    with transaction.atomic(using=using):
+        for batch in _batches(task_ids):
+            for side in ('predecessor', 'successor'):
+                links = TaskDependency.objects.using(using).filter(**{f'{side}_id__in': batch})
+                touched.update(chain.from_iterable(links.values_list('predecessor_id', 'successor_id')))
+                links._raw_delete(using)
+        if touched:
+            reschedule_tasks(touched, using, detached=True)
+
+
+# Dates -----------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class TaskSchedule:
+    task_id: int
+    title: str
+    duration: int
+    earliest_start: date
+    latest_finish: date
+    is_completed: bool = False
+
+    @property
+    def earliest_finish(self):
+        return self.earliest_start + timedelta(days=self.duration)
+
+    @property
+    def latest_start(self):
+        return self.latest_finish - timedelta(days=self.duration)
+
+    @property
+    def slack(self):
+        """Days the task can slip without missing the project deadline (negative: late)."""
+        return (self.latest_start - self.earliest_start).days
+
+    def as_dict(self):
+        return {
+            'task': self.task_id,
+            'title': self.title,
+            'duration': self.duration,
+            'is_completed': self.is_completed,
+            'earliest_start': self.earliest_start.isoformat(),
+            'earliest_finish': self.earliest_finish.isoformat(),
+            'latest_start': self.latest_start.isoformat(),
+            'latest_finish': self.latest_finish.isoformat(),
+            'slack': self.slack,
+        }
+
+
+@dataclass
+class ProjectSchedule:
+    project_id: int
+    deadline: date
+    start: date
+    length: int = 0
+    tasks: list = field(default_factory=list)
+    critical_path: list = field(default_factory=list)
+
+    @property
+    def earliest_finish(self):
+        return self.start + timedelta(days=self.length)
+
+    @property
+    def slack(self):
+        return (self.deadline - self.earliest_finish).days
+
+    def as_dict(self):
+        return {
+            'project': self.project_id,
+            'deadline': self.deadline.isoformat(),
+            'earliest_finish': self.earliest_finish.isoformat(),
+            'length': self.length,
+            'slack': self.slack,
+            'critical_path': self.critical_path,
+            'tasks': [task.as_dict() for task in self.tasks],
+        }
+
+
+def project_schedule(project, today=None):
+    """Earliest and latest dates of the tasks of ``project``, remaining work starting ``today``.
+
+    The critical path lists the open tasks on the longest chains, in order.
+    """
+    start = today or date.today()
+    schedule = ProjectSchedule(project.pk, project.deadline, start)
+    rows = Task.objects.filter(project_id=project.pk).order_by().values_list('pk', 'title', *NODE_FIELDS)
+    chains = {}
+    for pk, title, duration, is_completed, before, after in rows:
+        remaining = 0 if is_completed else duration
+        schedule.tasks.append(TaskSchedule(
+            pk, title, remaining, start + timedelta(days=before),
+            project.deadline - timedelta(days=after), is_completed,
+        ))
+        chains[pk] = before + remaining + after
+    schedule.tasks.sort(key=lambda task: (task.earliest_start, task.task_id))
+    schedule.length = max(chains.values(), default=0)
+    schedule.critical_path = [
+        task.task_id for task in schedule.tasks
+        if not task.is_completed and chains[task.task_id] == schedule.length
+    ]
+    return schedule
@@ -0,0 +1,227 @@
+"""Live change events for the project pages, pushed over Server-Sent Events.
+
+Model signals, and the set-based writers that bypass them, ``publish()``
+compact events for the owner of the changed rows::
+
+    {'type': 'project.updated', 'project': 12}
+    {'type': 'task.deleted', 'task': 40, 'project': 12}
+    {'type': 'counters', 'project': 12, 'tasks': 1, 'completed': 0, 'overdue': 0}
+
+An event reaches the backend once the transaction that made the change
+commits, never for a rolled back one. ``project_events`` (an ASGI view)
+streams them to the open pages of the user with ``event_stream()``, which
+patch the affected cards.
+
+The backend is set by ``PROJECTS_EVENT_BACKEND``:
+
+* ``InProcessEventBackend`` (default) fans events out to the streams of the
+  same process: enough for a single ASGI process.
+* ``DatabaseEventBackend`` goes through the ``projects_changeevent`` table,
+  which every stream polls, so all the processes of a deployment see every
+  event. Rows are kept ``EVENT_RETENTION``.
+
+Another broker (a local socket, Redis pub/sub...) implements
+``BaseEventBackend`` and is plugged in the same way.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from functools import lru_cache, partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ChangeEvent
+
+logger = logging.getLogger(__name__)
+
+# Commentaire SSE envoyé quand rien ne se passe, pour garder la connexion ouverte
+KEEPALIVE_SECONDS = 15
+# Streams end after this long; EventSource reconnects after RETRY_MS
+STREAM_MAX_AGE = 300
+RETRY_MS = 3000
+# Events waiting for a slow stream before it is asked to reload instead
+MAX_PENDING = 100
+POLL_INTERVAL = 1.0
+EVENT_RETENTION = timedelta(minutes=5)
+PRUNE_EVERY = 100
+
+
+class BaseEventBackend:
+    """Interface every event backend implements."""
+
+    def publish(self, user_id, event):
+        """Deliver ``event`` to the subscriptions of ``user_id``; called after commit."""
+        raise NotImplementedError
+
+    def subscribe(self, user_id):
+        """Return a ``Subscription`` to the events of ``user_id``."""
+        raise NotImplementedError
+
+
+class Subscription:
+    async def get(self, timeout):
+        """Wait up to ``timeout`` seconds for events; return them (possibly none)."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class _QueueSubscription(Subscription):
+    def __init__(self, backend, user_id):
+        self.backend = backend
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=MAX_PENDING)
+
+    def push(self, event):
+        # publish() runs in a request thread, the queue belongs to the stream's loop
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # Loop closed: the stream is gone
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The page fell behind: drop what is pending and let it reload
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'resync'})
+
+    async def get(self, timeout):
+        try:
+            events = [await asyncio.wait_for(self.queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+
+    def close(self):
+        self.backend._unsubscribe(self)
+
+
+class InProcessEventBackend(BaseEventBackend):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.push(event)
+
+    def subscribe(self, user_id):
+        subscription = _QueueSubscription(self, user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+
+class _PollingSubscription(Subscription):
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.last_id = None
+
+    def _fetch(self):
+        events = ChangeEvent.objects.filter(user_id=self.user_id)
+        if self.last_id is None:
+            # Only the events published from now on
+            last = events.order_by('-pk').values_list('pk', flat=True).first()
+            self.last_id = last or 0
+            return []
+        rows = list(
+            events.filter(pk__gt=self.last_id).order_by('pk').values_list('pk', 'payload')[:MAX_PENDING]
+        )
+        if rows:
+            self.last_id = rows[-1][0]
+        return [payload for _, payload in rows]
+
+    async def get(self, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            events = await sync_to_async(self._fetch)()
+            remaining = deadline - loop.time()
+            if events or remaining <= 0:
+                return events
+            await asyncio.sleep(min(POLL_INTERVAL, remaining))
+
+
+class DatabaseEventBackend(BaseEventBackend):
+    def __init__(self):
+        self._published = 0
+
+    def publish(self, user_id, event):
+        ChangeEvent.objects.create(user_id=user_id, payload=event)
+        self._published += 1
+        if self._published % PRUNE_EVERY == 0:
+            ChangeEvent.objects.filter(created_at__lt=timezone.now() - EVENT_RETENTION).delete()
+
+    def subscribe(self, user_id):
+        return _PollingSubscription(user_id)
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_event_backend():
+    """Return the configured backend, in-process by default."""
+    path = getattr(settings, 'PROJECTS_EVENT_BACKEND', 'projects.events.InProcessEventBackend')
+    return _load_backend(path)
+
+
+def _deliver(user_id, event):
+    # A lost notification only delays a card refresh: never fail the write for it
+    try:
+        get_event_backend().publish(user_id, event)
+    except Exception:
+        logger.exception('Could not publish %s for user %s', event.get('type'), user_id)
+
+
+def publish(user_id, event, using=None):
+    """Send ``event`` to the live pages of ``user_id`` once the transaction on ``using`` commits."""
+    if user_id is not None:
+        transaction.on_commit(partial(_deliver, user_id, event), using=using)
+
+
+def _encode(event):
+    return f'data: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n'
+
+
+async def event_stream(user_id, max_age=STREAM_MAX_AGE, keepalive=KEEPALIVE_SECONDS):
+    """Yield the events of ``user_id`` in the ``text/event-stream`` format for ``max_age`` seconds."""
+    subscription = get_event_backend().subscribe(user_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_age
+    try:
+        yield f'retry: {RETRY_MS}\n' + _encode({'type': 'ready'})
+        while (remaining := deadline - loop.time()) > 0:
+            events = await subscription.get(min(keepalive, remaining))
+            if not events:
+                yield ': keepalive\n\n'
+            for event in events:
+                yield _encode(event)
+    finally:
+        subscription.close()
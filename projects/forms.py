@@ -1,5 +1,7 @@
 from django import forms
+from .bulk import MAX_BULK_TASKS
 from .models import Project, Task
+from .timetracking import MAX_ENTRY_DURATION
 from django.utils import timezone
 
 class ProjectForm(forms.ModelForm):
@@ -36,12 +38,108 @@ class TaskForm(forms.ModelForm):
         the user.
         """
         super().__init__(*args, **kwargs)
+        if 'project' not in self.fields:
+            return
         if user is not None:
             self.fields['project'].queryset = Project.objects.filter(user=user)
         else:
             # No user provided: keep queryset empty to avoid leaking other users' projects
             self.fields['project'].queryset = Project.objects.none()
 
+class TaskIdsField(forms.Field):
+    """Several task ids, from repeated form fields (checkboxes) or a JSON list."""
+    widget = forms.MultipleHiddenInput
+    
+    def __init__(self, *, max_ids, **kwargs):
+        self.max_ids = max_ids
+        super().__init__(**kwargs)
+    
+    def to_python(self, value):
+        if not value:
+            return []
+        if not isinstance(value, (list, tuple)):
+            raise forms.ValidationError("Liste de tâches invalide.")
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in value))
+        except (TypeError, ValueError):
+            raise forms.ValidationError("Identifiant de tâche invalide.")
+        if len(ids) > self.max_ids:
+            raise forms.ValidationError(f"Au plus {self.max_ids} tâches par opération.")
+        return ids
+
+class BulkTaskForm(forms.Form):
+    """One operation on a set of tasks (see projects.bulk).
+
+    The target project is a plain id: its ownership is checked by the
+    operation's own query.
+    """
+    OPERATION_CHOICES = [
+        ('complete', 'Marquer comme terminées'),
+        ('uncomplete', 'Marquer comme non terminées'),
+        ('priority', 'Changer la priorité'),
+        ('shift', 'Décaler les dates limites'),
+        ('move', 'Déplacer vers un autre projet'),
+        ('delete', 'Supprimer'),
+    ]
+    
+    tasks = TaskIdsField(max_ids=MAX_BULK_TASKS)
+    operation = forms.ChoiceField(choices=OPERATION_CHOICES)
+    priority = forms.ChoiceField(choices=Task.PRIORITY_CHOICES, required=False)
+    days = forms.IntegerField(required=False, min_value=-3650, max_value=3650)
+    project = forms.IntegerField(required=False)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        required = {'priority': 'priority', 'shift': 'days', 'move': 'project'}.get(
+            cleaned_data.get('operation')
+        )
+        if required and cleaned_data.get(required) in (None, ''):
+            self.add_error(required, "Ce champ est obligatoire pour cette opération.")
+        return cleaned_data
+
+class TimeEntryForm(forms.Form):
+    """Time entered by hand on a task (see projects.timetracking).
+
+    Like ``BulkTaskForm.project``, the task is a plain id whose ownership is
+    checked by the view.
+    """
+    task = forms.IntegerField(label="Tâche")
+    day = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}), label="Jour")
+    minutes = forms.IntegerField(min_value=1, max_value=MAX_ENTRY_DURATION // 60, label="Durée (minutes)")
+    note = forms.CharField(max_length=200, required=False, label="Note")
+    
+    def clean_day(self):
+        day = self.cleaned_data.get('day')
+        if day and day > timezone.localdate():
+            raise forms.ValidationError("Le temps passé ne peut pas être saisi dans le futur")
+        return day
+
+class ProjectImportForm(ProjectForm):
+    """ProjectForm rules for one row of a bulk import (see projects.transfer)."""
+    class Meta(ProjectForm.Meta):
+        fields = ProjectForm.Meta.fields + ['progress']
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['progress'].required = False
+    
+    def clean_progress(self):
+        progress = self.cleaned_data.get('progress')
+        return 0.0 if progress is None else progress
+    
+    def clean_deadline(self):
+        # Un export contient aussi les projets échus: leur date limite est conservée
+        return self.cleaned_data.get('deadline')
+
+class TaskImportForm(TaskForm):
+    """TaskForm rules for one row of a bulk import (see projects.transfer).
+
+    The project is resolved by the importer against the user's projects, all
+    loaded at once, rather than by a ModelChoiceField query per row.
+    """
+    class Meta(TaskForm.Meta):
+        fields = ['title', 'description', 'deadline', 'priority', 'is_completed']
+
 class ProjectUpdateForm(forms.ModelForm):
     class Meta:
         model = Project
@@ -52,8 +150,28 @@ class ProjectUpdateForm(forms.ModelForm):
             'progress': forms.NumberInput(attrs={'min': 0, 'max': 100, 'step': 1}),
         }
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Once a project has tasks its progress is derived from them
+        if self.instance.task_count:
+            self.fields['progress'].disabled = True
+            self.fields['progress'].help_text = "Calculée à partir des tâches terminées."
+    
     def clean_deadline(self):
         deadline = self.cleaned_data.get('deadline')
         if deadline and deadline < timezone.now().date():
             raise forms.ValidationError("La date limite ne peut pas être dans le passé")
-        return deadline
\ No newline at end of file
+        return deadline
+
+class TaskDependencyForm(forms.Form):
+    """A task that another one has to wait for (see projects.dependencies).
+
+    Like ``TimeEntryForm.task``, a plain id whose ownership is checked by the
+    view.
+    """
+    predecessor = forms.IntegerField(label="Tâche préalable")
+
+class TaskDurationForm(forms.ModelForm):
+    class Meta:
+        model = Task
+        fields = ['duration']
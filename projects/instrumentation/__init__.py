@@ -0,0 +1,22 @@
+"""Request-level performance instrumentation.
+
+``InstrumentationMiddleware`` (first in ``MIDDLEWARE``) and
+``ViewTimingMiddleware`` (last) record, for a sample of the requests:
+
+* the number of SQL queries and the time spent in them, through a wrapper
+  added to every database connection (``connection.execute_wrappers``);
+* the time spent rendering templates, through the template backend
+  ``projects.instrumentation.templates.DjangoTemplates``;
+* the time spent in the view and in the whole request.
+
+These timings are sent back in a ``Server-Timing`` header and aggregated per
+view in ``metrics.registry``, which the ``projects:metrics`` endpoint exposes
+in the Prometheus text format. The same SQL shape run more than
+``PROJECTS_NPLUSONE_THRESHOLD`` times in one request is logged as a likely
+N+1, and queries slower than ``PROJECTS_SLOW_QUERY_MS`` are logged with
+their ``EXPLAIN`` output (logger ``projects.instrumentation``).
+
+Every request is counted in the duration percentiles; only the sampled ones
+(``PROJECTS_METRICS_SAMPLE_RATE``) pay for the per-query recording. The
+settings and their defaults are listed in ``recorder.DEFAULTS``.
+"""
@@ -0,0 +1,88 @@
+"""Per-view aggregation of the request timings, in the Prometheus text format.
+
+The registry lives in the process: each worker exposes its own figures, as
+with the default multiprocess-less Prometheus clients. Counts and sums cover
+the life of the process; quantiles are computed over the last
+``WINDOW_SIZE`` observations of each view.
+"""
+import threading
+from collections import defaultdict, deque
+
+WINDOW_SIZE = 1024
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+SUMMARIES = {
+    'projects_request_duration_seconds': 'Time spent handling the request.',
+    'projects_request_view_seconds': 'Time spent in the view (sampled requests).',
+    'projects_request_sql_seconds': 'Time spent in SQL queries (sampled requests).',
+    'projects_request_sql_queries': 'SQL queries per request (sampled requests).',
+    'projects_request_auth_queries': 'Session and user SQL queries per request (sampled requests).',
+    'projects_request_template_seconds': 'Time spent rendering templates (sampled requests).',
+}
+COUNTERS = {
+    'projects_n_plus_one_total': 'Requests repeating one SQL shape beyond the N+1 threshold.',
+    'projects_slow_queries_total': 'SQL queries slower than PROJECTS_SLOW_QUERY_MS.',
+}
+
+
+class Summary:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.window = deque(maxlen=WINDOW_SIZE)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.window.append(value)
+
+    def quantiles(self):
+        values = sorted(self.window)
+        return [(q, values[min(int(len(values) * q), len(values) - 1)]) for q in QUANTILES]
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._summaries = defaultdict(dict)
+            self._counters = defaultdict(lambda: defaultdict(int))
+
+    def observe(self, name, view, value):
+        with self._lock:
+            summary = self._summaries[name].get(view)
+            if summary is None:
+                summary = self._summaries[name][view] = Summary()
+            summary.observe(value)
+
+    def inc(self, name, view, amount=1):
+        with self._lock:
+            self._counters[name][view] += amount
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, help_text in SUMMARIES.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} summary']
+                for view, summary in sorted(self._summaries[name].items()):
+                    label = f'view="{_label(view)}"'
+                    for quantile, value in summary.quantiles():
+                        lines.append(f'{name}{{{label},quantile="{quantile}"}} {value:.6g}')
+                    lines.append(f'{name}_sum{{{label}}} {summary.sum:.6g}')
+                    lines.append(f'{name}_count{{{label}}} {summary.count}')
+            for name, help_text in COUNTERS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for view, value in sorted(self._counters[name].items()):
+                    lines.append(f'{name}{{view="{_label(view)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
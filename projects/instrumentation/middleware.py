@@ -0,0 +1,113 @@
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import registry
+from .recorder import current_recorder, logger, setting, start_recording, stop_recording
+
+
+class _Middleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unresolved'
+
+
+class InstrumentationMiddleware(_Middleware):
+    """Time the request and, when sampled, record its queries and renders.
+
+    Goes first in ``MIDDLEWARE`` so that the total covers every middleware.
+    The ``Recorder`` of a sampled request is ``request.instrumentation``.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        token = self._start(request)
+        try:
+            response = self.get_response(request)
+            return self._finish(request, response, start)
+        finally:
+            if token is not None:
+                stop_recording(token)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        token = self._start(request)
+        try:
+            response = await self.get_response(request)
+            return self._finish(request, response, start)
+        finally:
+            if token is not None:
+                stop_recording(token)
+
+    @staticmethod
+    def _start(request):
+        rate = setting('PROJECTS_METRICS_SAMPLE_RATE')
+        if rate < 1 and random.random() >= rate:
+            request.instrumentation = None
+            return None
+        token = start_recording()
+        request.instrumentation = current_recorder()
+        return token
+
+    def _finish(self, request, response, start):
+        total = time.perf_counter() - start
+        view = _view_name(request)
+        registry.observe('projects_request_duration_seconds', view, total)
+        recorder = current_recorder()
+        if recorder is None:
+            return response
+        if recorder.view_time is not None:
+            registry.observe('projects_request_view_seconds', view, recorder.view_time)
+        registry.observe('projects_request_sql_seconds', view, recorder.sql_time)
+        registry.observe('projects_request_sql_queries', view, recorder.query_count)
+        registry.observe('projects_request_auth_queries', view, recorder.auth_queries)
+        registry.observe('projects_request_template_seconds', view, recorder.template_time)
+        repeated = recorder.repeated_queries()
+        for shape, count in repeated:
+            logger.warning('Possible N+1 in %s: %d queries like %s', view, count, shape)
+        if repeated:
+            registry.inc('projects_n_plus_one_total', view)
+        if recorder.slow_queries:
+            registry.inc('projects_slow_queries_total', view, recorder.slow_queries)
+        if setting('PROJECTS_SERVER_TIMING'):
+            response['Server-Timing'] = recorder.server_timing(total)
+        return response
+
+
+class ViewTimingMiddleware(_Middleware):
+    """Time the view of a recorded request; goes last in ``MIDDLEWARE``."""
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = current_recorder()
+        if recorder is None:
+            return self.get_response(request)
+        start = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            recorder.view_time = time.perf_counter() - start
+
+    async def __acall__(self, request):
+        recorder = current_recorder()
+        if recorder is None:
+            return await self.get_response(request)
+        start = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            recorder.view_time = time.perf_counter() - start
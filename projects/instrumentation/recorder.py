@@ -0,0 +1,153 @@
+"""Recording of the SQL queries and template renders of the current request."""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('projects.instrumentation')
+
+DEFAULTS = {
+    # Part des requêtes instrumentées en détail (0 à 1)
+    'PROJECTS_METRICS_SAMPLE_RATE': 1.0,
+    # Seuil de journalisation des requêtes SQL lentes (None: désactivé)
+    'PROJECTS_SLOW_QUERY_MS': 200,
+    'PROJECTS_EXPLAIN_SLOW_QUERIES': True,
+    # Répétitions d'une même requête au-delà desquelles on signale un N+1 (None: désactivé)
+    'PROJECTS_NPLUSONE_THRESHOLD': 10,
+    'PROJECTS_SERVER_TIMING': True,
+}
+
+# "IN (%s, %s, %s)" and inlined numbers (LIMIT 25) do not change the shape
+_PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+_NUMBER = re.compile(r'\b\d+\b')
+# Session and user lookups, counted apart to follow the auth overhead
+_AUTH_TABLES = re.compile(r'"(?:django_session|auth_[a-z_]+)"')
+
+_recorder = ContextVar('instrumentation_recorder', default=None)
+_explaining = ContextVar('instrumentation_explaining', default=False)
+
+
+def setting(name):
+    return getattr(settings, name, DEFAULTS[name])
+
+
+def sql_shape(sql):
+    return _NUMBER.sub('N', _PLACEHOLDER_LIST.sub('%s...', sql))
+
+
+class Recorder:
+    """Timings of one request.
+
+    Shared by the threads the request's queries run in (``sync_to_async``,
+    ``gather_queries``), hence the lock.
+    """
+
+    def __init__(self):
+        self.query_count = 0
+        self.auth_queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.view_time = None
+        self.slow_queries = 0
+        self.shapes = Counter()
+        self.track_shapes = setting('PROJECTS_NPLUSONE_THRESHOLD') is not None
+        slow_ms = setting('PROJECTS_SLOW_QUERY_MS')
+        self.slow_threshold = None if slow_ms is None else slow_ms / 1000
+        self._lock = threading.Lock()
+
+    def add_query(self, sql, duration):
+        with self._lock:
+            self.query_count += 1
+            self.sql_time += duration
+            if _AUTH_TABLES.search(sql):
+                self.auth_queries += 1
+            if self.track_shapes:
+                self.shapes[sql_shape(sql)] += 1
+
+    def add_slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def add_template(self, duration):
+        with self._lock:
+            self.template_time += duration
+
+    def repeated_queries(self):
+        """``(shape, count)`` of the queries repeated beyond the N+1 threshold."""
+        threshold = setting('PROJECTS_NPLUSONE_THRESHOLD')
+        if threshold is None:
+            return []
+        return [(shape, count) for shape, count in self.shapes.items() if count > threshold]
+
+    def server_timing(self, total):
+        metrics = [
+            f'db;dur={self.sql_time * 1000:.1f};desc="SQL ({self.query_count})"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+        ]
+        if self.view_time is not None:
+            metrics.append(f'view;dur={self.view_time * 1000:.1f}')
+        metrics.append(f'auth;desc="SQL ({self.auth_queries})"')
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+def current_recorder():
+    return _recorder.get()
+
+
+def start_recording():
+    """Record the current request; returns the token for ``stop_recording()``."""
+    return _recorder.set(Recorder())
+
+
+def stop_recording(token):
+    _recorder.reset(token)
+
+
+def _explain(connection, sql, params):
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    token = _explaining.set(True)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    except DatabaseError:
+        return None
+    finally:
+        _explaining.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper timing the queries of the recorded requests."""
+    recorder = _recorder.get()
+    if recorder is None or _explaining.get():
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - start
+    recorder.add_query(sql, duration)
+    if recorder.slow_threshold is not None and duration >= recorder.slow_threshold:
+        recorder.add_slow_query()
+        plan = None
+        if not many and setting('PROJECTS_EXPLAIN_SLOW_QUERIES'):
+            plan = _explain(context['connection'], sql, params)
+        logger.warning(
+            'Slow query (%.1f ms) on %s: %s\nparams: %r\nplan:\n%s',
+            duration * 1000, context['connection'].alias, sql, params, plan or '-',
+        )
+    return result
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Connections are reopened on the same wrapper object: install it once
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
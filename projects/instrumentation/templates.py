@@ -0,0 +1,31 @@
+"""Django template backend timing the renders of the recorded requests.
+
+Only templates rendered through the backend (``render()``,
+``render_to_string()``, ``get_template()``) are timed, as a whole: the
+templates they include are part of their time.
+"""
+import time
+
+from django.template.backends import django as django_backend
+
+from .recorder import current_recorder
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        recorder = current_recorder()
+        if recorder is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            recorder.add_template(time.perf_counter() - start)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
@@ -0,0 +1,314 @@
+"""Small database-backed job queue.
+
+Heavy mutations (task rescheduling, counter reconciliation, bulk imports) are
+recorded as ``Job`` rows by ``enqueue()`` and executed by the
+``manage.py run_workers`` command, so the request that triggered them can
+return immediately with a job id to poll. No external broker is needed: the
+queue is the ``projects_job`` table, and a job is claimed with a conditional
+UPDATE so several worker threads or processes never run the same job twice.
+
+Failed jobs are retried with exponential backoff until ``max_attempts``.
+While a job runs, its worker refreshes ``locked_at`` every
+``HEARTBEAT_INTERVAL``; the workers periodically hand out again the jobs
+whose heartbeat stopped for ``STALE_AFTER`` (their worker died), unless they
+used up their attempts, in which case they fail. Passing an
+``idempotency_key`` makes ``enqueue()`` return the existing job instead of
+creating a duplicate. With ``PROJECTS_JOBS_EAGER = True`` jobs run inline,
+which is convenient for tests and local development.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .auth import SESSION_CLEANUP_BATCH_SIZE, clear_expired_sessions
+from .counters import reconcile_in_batches
+from .deletion import PURGE_BATCH_SIZE, purge_deleted_projects, purge_project
+from .models import Job, Project
+from .scheduling import recalculate_task_deadlines
+from .sharding import on_each_shard, tenant
+from .timetracking import COMPACT_BATCH_SIZE, close_stale_timers, compact_time_entries
+from .transfer import import_file
+
+logger = logging.getLogger(__name__)
+
+# Seconds after which a running job whose worker died is handed out again
+STALE_AFTER = 15 * 60
+# Seconds between two refreshes of locked_at by a running job's worker, and
+# between two sweeps of the stale jobs by each worker
+HEARTBEAT_INTERVAL = 60
+SWEEP_INTERVAL = 60
+
+_registry = {}
+
+
+def job(name):
+    """Register the decorated function as the handler of jobs called ``name``.
+
+    Handlers receive the job payload as keyword arguments and return a
+    JSON-serializable result.
+    """
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, user=None, idempotency_key=None, max_attempts=3, delay=0, user_id=None):
+    """Queue a job and return it (or the existing job for ``idempotency_key``).
+
+    The job's user is ``user``, or the user with primary key ``user_id`` when
+    the caller only has the id at hand.
+    """
+    if name not in _registry:
+        raise ValueError(f'Unknown job {name!r}')
+    if idempotency_key:
+        existing = Job.objects.filter(idempotency_key=idempotency_key).first()
+        if existing:
+            return existing
+    try:
+        with transaction.atomic():
+            queued = Job.objects.create(
+                name=name,
+                payload=payload or {},
+                user_id=user.pk if user is not None else user_id,
+                idempotency_key=idempotency_key,
+                max_attempts=max_attempts,
+                run_after=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        # Lost a race against another request with the same key
+        return Job.objects.get(idempotency_key=idempotency_key)
+
+    if getattr(settings, 'PROJECTS_JOBS_EAGER', False):
+        while claim(queued):
+            execute(queued)
+            if queued.status != Job.STATUS_QUEUED:
+                break
+            # Retry immediately rather than waiting for the backoff
+            Job.objects.filter(pk=queued.pk).update(run_after=timezone.now())
+        queued.refresh_from_db()
+    return queued
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def claim(candidate, worker=None):
+    """Atomically mark ``candidate`` as running; False if another worker won."""
+    now = timezone.now()
+    claimed = Job.objects.filter(pk=candidate.pk, status=Job.STATUS_QUEUED).update(
+        status=Job.STATUS_RUNNING,
+        locked_by=worker or worker_id(),
+        locked_at=now,
+        attempts=F('attempts') + 1,
+    )
+    if claimed:
+        candidate.refresh_from_db()
+    return bool(claimed)
+
+
+def claim_next(worker=None):
+    """Claim the oldest runnable job, or return None when the queue is empty."""
+    for candidate in Job.objects.filter(
+        status=Job.STATUS_QUEUED, run_after__lte=timezone.now()
+    ).only('pk')[:10]:
+        if claim(candidate, worker):
+            return candidate
+    return None
+
+
+def keep_alive(claimed):
+    """Refresh ``locked_at`` of a running job; False once its worker lost it."""
+    return bool(Job.objects.filter(
+        pk=claimed.pk, status=Job.STATUS_RUNNING, locked_by=claimed.locked_by,
+    ).update(locked_at=timezone.now()))
+
+
+class _Heartbeat(threading.Thread):
+    """Calls ``keep_alive()`` every ``interval`` seconds while a job runs.
+
+    The thread has its own connection: a refresh lands between the
+    transactions of the job, which keep theirs short.
+    """
+
+    def __init__(self, claimed, interval=HEARTBEAT_INTERVAL):
+        super().__init__(name=f'job-{claimed.pk}-heartbeat', daemon=True)
+        self.claimed = claimed
+        self.interval = interval
+        self.done = threading.Event()
+
+    def run(self):
+        beats = 0
+        try:
+            while not self.done.wait(self.interval):
+                beats += 1
+                try:
+                    keep_alive(self.claimed)
+                except Exception:
+                    logger.exception('Heartbeat of job %s failed', self.claimed)
+        finally:
+            if beats:
+                connections.close_all()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.done.set()
+        self.join()
+
+
+def execute(claimed):
+    """Run a claimed job and record its outcome."""
+    handler = _registry.get(claimed.name)
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for {claimed.name!r}')
+        # Jobs started by a user work on that user's shard
+        with _Heartbeat(claimed), tenant(claimed.user_id) if claimed.user_id else nullcontext():
+            result = handler(**claimed.payload)
+    except Exception:
+        logger.exception('Job %s failed (attempt %s)', claimed, claimed.attempts)
+        claimed.error = traceback.format_exc()
+        if claimed.attempts < claimed.max_attempts:
+            claimed.status = Job.STATUS_QUEUED
+            claimed.run_after = timezone.now() + timedelta(seconds=2 ** claimed.attempts)
+        else:
+            claimed.status = Job.STATUS_FAILED
+            claimed.finished_at = timezone.now()
+    else:
+        claimed.status = Job.STATUS_SUCCEEDED
+        claimed.result = result
+        claimed.error = ''
+        claimed.finished_at = timezone.now()
+    claimed.locked_by = ''
+    claimed.locked_at = None
+    claimed.save(update_fields=[
+        'status', 'result', 'error', 'run_after', 'finished_at', 'locked_by', 'locked_at',
+    ])
+    return claimed
+
+
+def requeue_stale_jobs(stale_after=STALE_AFTER):
+    """Give back jobs left running by a worker that died; return ``(requeued, failed)``.
+
+    A job that already used its ``max_attempts`` (an import, which runs only
+    once) may have done part of its work: it fails instead of running again.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.STATUS_RUNNING, locked_at__lt=now - timedelta(seconds=stale_after)
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.STATUS_FAILED, locked_by='', locked_at=None, finished_at=now,
+        error=f'Worker lost: no heartbeat for {stale_after} seconds.',
+    )
+    requeued = stale.update(status=Job.STATUS_QUEUED, locked_by='', locked_at=None)
+    return requeued, failed
+
+
+def work(stop_event=None, poll_interval=1.0, burst=False):
+    """Worker loop: run jobs until ``stop_event`` is set (or the queue is empty in burst mode)."""
+    worker = worker_id()
+    processed = 0
+    next_sweep = 0
+    try:
+        while stop_event is None or not stop_event.is_set():
+            close_old_connections()
+            if time.monotonic() >= next_sweep:
+                requeue_stale_jobs()
+                next_sweep = time.monotonic() + SWEEP_INTERVAL
+            claimed = claim_next(worker)
+            if claimed is None:
+                if burst:
+                    break
+                time.sleep(poll_interval)
+                continue
+            execute(claimed)
+            processed += 1
+    finally:
+        connections.close_all()
+    return processed
+
+
+# Handlers ---------------------------------------------------------------
+
+@job('recalculate_task_deadlines')
+def recalculate_task_deadlines_job(project_id):
+    plan = recalculate_task_deadlines(Project.objects.get(pk=project_id))
+    return {'updated_count': plan.updated_count, 'overdue_count': plan.overdue_count}
+
+
+@job('reconcile_counters')
+def reconcile_counters_job(user_id=None, batch_size=5000):
+    if user_id is not None:
+        with tenant(user_id):
+            projects = Project.objects.filter(user_id=user_id)
+            return {'updated': reconcile_in_batches(projects, batch_size)}
+    return {'updated': sum(on_each_shard(reconcile_in_batches, Project.objects.all(), batch_size))}
+
+
+@job('compact_time_entries')
+def compact_time_entries_job(days=90, batch_size=COMPACT_BATCH_SIZE):
+    """Stop the abandoned timers, then fold the entries older than ``days``."""
+    before = timezone.now() - timedelta(days=days)
+    return {
+        'closed_timers': sum(on_each_shard(close_stale_timers)),
+        'removed': sum(on_each_shard(compact_time_entries, before, batch_size)),
+    }
+
+
+@job('clear_expired_sessions')
+def clear_expired_sessions_job(batch_size=SESSION_CLEANUP_BATCH_SIZE):
+    return {'removed': clear_expired_sessions(batch_size)}
+
+
+@job('purge_deleted_projects')
+def purge_deleted_projects_job(user_id=None, batch_size=PURGE_BATCH_SIZE):
+    """Purge the projects whose undo window is over (those of ``user_id`` only, when given)."""
+    if user_id is not None:
+        with tenant(user_id):
+            projects, tasks = purge_deleted_projects(user_id=user_id, batch_size=batch_size)
+    else:
+        purged = on_each_shard(purge_deleted_projects, batch_size=batch_size)
+        projects, tasks = sum(p for p, _ in purged), sum(t for _, t in purged)
+    return {'projects': projects, 'tasks': tasks}
+
+
+@job('purge_project')
+def purge_project_job(project_id, batch_size=PURGE_BATCH_SIZE):
+    """Purge one soft-deleted project without waiting for its undo window (admin deletions).
+
+    A project restored in the meantime is kept.
+    """
+    if not Project.all_objects.filter(pk=project_id, deleted_at__isnull=False).exists():
+        return {'tasks': 0}
+    return {'tasks': purge_project(project_id, batch_size)}
+
+
+@job('import_rows')
+def import_rows_job(user_id, path, kind, fmt, project_map=None):
+    """Import an uploaded file, then delete it.
+
+    Imports are not idempotent, so they are enqueued with a single attempt
+    and the file is never kept for a retry.
+    """
+    try:
+        with open(path, encoding='utf-8', newline='') as stream:
+            report = import_file(User.objects.get(pk=user_id), stream, kind, fmt, project_map)
+    finally:
+        os.remove(path)
+    return report.as_dict()
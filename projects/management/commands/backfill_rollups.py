@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from projects.rollups import backfill, backfill_users
+from projects.sharding import on_each_shard, tenant
+
+
+def _backfill_shard(start):
+    return sum(backfill(user_id, start) for user_id in backfill_users())
+
+
+class Command(BaseCommand):
+    help = "Reconstitue les relevés quotidiens (burndown, historique) à partir des dates des tâches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help="Nombre de jours reconstitués avant aujourd'hui (défaut: 365).",
+        )
+        parser.add_argument(
+            '--user', type=int,
+            help="Limiter aux projets de cet utilisateur (id).",
+        )
+
+    def handle(self, *args, days, user, **options):
+        start = timezone.localdate() - timedelta(days=days)
+        if user is not None:
+            with tenant(user):
+                total = backfill(user, start)
+        else:
+            total = sum(on_each_shard(_backfill_shard, start))
+        self.stdout.write(self.style.SUCCESS(f'{total} relevé(s) écrit(s).'))
@@ -0,0 +1,134 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.utils import timezone
+
+from projects.models import Project
+
+USERS = 50
+PROJECTS_PER_USER = 40
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le débit de SQLite avec les réglages par défaut et avec le profil "
+        "de production (WAL, pragmas, connexions persistantes) sous N clients "
+        "simultanés. Travaille sur des bases temporaires."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', default='8,32',
+                            help="Nombres de clients simultanés séparés par des virgules.")
+        parser.add_argument('--duration', type=float, default=5.0,
+                            help="Durée de chaque mesure en secondes (défaut: 5).")
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help="Part des requêtes qui modifient un projet (défaut: 0.2).")
+
+    def handle(self, *args, clients, duration, write_ratio, **options):
+        tuned = settings.DATABASES['default']
+        profiles = [
+            # Nouvelle connexion par requête, journal rollback, BEGIN DEFERRED
+            ('défaut', {}, False),
+            ('production', tuned.get('OPTIONS', {}), True),
+        ]
+        self.stdout.write(
+            f"{'profil':<12} {'clients':>7} {'req/s':>9} {'erreurs':>8} {'p95 (ms)':>9}"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for index, (name, options, persistent) in enumerate(profiles):
+                alias = self._setup(f'bench_{index}', directory, options)
+                try:
+                    for count in (int(value) for value in clients.split(',')):
+                        done, errors, p95 = self._run(alias, count, duration, write_ratio, persistent)
+                        self.stdout.write(
+                            f'{name:<12} {count:>7} {done / duration:>9.0f} {errors:>8} {p95 * 1000:>9.1f}'
+                        )
+                finally:
+                    connections[alias].close()
+                    del connections[alias]
+                    del connections.settings[alias]
+
+    def _setup(self, alias, directory, options):
+        """Register ``alias`` on a fresh database file holding synthetic projects."""
+        connections.settings[alias] = dict(
+            connections.settings['default'],
+            NAME=os.path.join(directory, f'{alias}.sqlite3'),
+            OPTIONS=options,
+            CONN_MAX_AGE=0,
+        )
+        with connections[alias].schema_editor() as editor:
+            editor.create_model(User)
+            editor.create_model(Project)
+        users = User.objects.using(alias).bulk_create(
+            User(username=f'bench-{i}') for i in range(USERS)
+        )
+        deadline = timezone.localdate()
+        Project.objects.using(alias).bulk_create(
+            Project(user=user, title=f'Projet {i}', deadline=deadline)
+            for user in users
+            for i in range(PROJECTS_PER_USER)
+        )
+        connections[alias].close()
+        return alias
+
+    def _run(self, alias, clients, duration, write_ratio, persistent):
+        user_ids = list(User.objects.using(alias).values_list('pk', flat=True))
+        project_ids = list(Project.objects.using(alias).values_list('pk', flat=True))
+        connections[alias].close()
+        stop = threading.Event()
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def request(rng):
+            if rng.random() < write_ratio:
+                # Lecture puis écriture dans la même transaction, comme project_update
+                pk = rng.choice(project_ids)
+                with transaction.atomic(using=alias):
+                    project = Project.objects.using(alias).only('progress').get(pk=pk)
+                    Project.objects.using(alias).filter(pk=pk).update(
+                        progress=(project.progress + 1) % 100, updated_at=timezone.now()
+                    )
+            else:
+                list(
+                    Project.objects.using(alias)
+                    .filter(user_id=rng.choice(user_ids))
+                    .order_by('-created_at')[:24]
+                )
+
+        def client(seed):
+            rng = random.Random(seed)
+            local_latencies, local_errors = [], 0
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    request(rng)
+                except OperationalError:
+                    local_errors += 1
+                else:
+                    local_latencies.append(time.perf_counter() - start)
+                finally:
+                    if not persistent:
+                        connections[alias].close()
+            connections[alias].close()
+            with lock:
+                latencies.extend(local_latencies)
+                errors.append(local_errors)
+
+        threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+        return len(latencies), sum(errors), p95
@@ -0,0 +1,146 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from projects.dependencies import add_dependency, remove_dependency, reschedule_tasks, schedule_project
+from projects.models import Project, Task, TaskDependency
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le recalcul du chemin critique après une seule modification (durée, "
+        "ajout ou suppression de dépendance, échéance) sur un projet synthétique, "
+        "contre le recalcul complet. Toutes les écritures sont annulées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--streams', type=int, default=200,
+                            help="Nombre de chaînes de tâches parallèles (défaut: 200).")
+        parser.add_argument('--length', type=int, default=100,
+                            help="Nombre de tâches par chaîne (défaut: 100).")
+        parser.add_argument('--cross-links', type=int, default=3,
+                            help="Dépendances de chaque tâche vers d'autres chaînes (défaut: 3).")
+        parser.add_argument('--changes', type=int, default=200,
+                            help="Modifications mesurées par type (défaut: 200).")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, streams, length, cross_links, changes, seed, **options):
+        rng = random.Random(seed)
+        with transaction.atomic():
+            project, grid = self._build(rng, streams, length, cross_links)
+            edges = TaskDependency.objects.filter(project=project).count()
+            self.stdout.write(f'{streams * length} tâches, {edges} dépendances')
+
+            start = time.perf_counter()
+            schedule_project(project)
+            full = time.perf_counter() - start
+            self.stdout.write(f'Recalcul complet: {full * 1000:.0f} ms')
+
+            self.stdout.write(
+                f"{'modification':<12} {'médiane (ms)':>13} {'p95 (ms)':>9} {'max (ms)':>9} "
+                f"{'requêtes':>9} {'tâches':>7}"
+            )
+            for name, change in (
+                ('durée', self._change_duration),
+                ('ajout', self._add_edge),
+                ('suppression', self._remove_edge),
+                ('échéance', self._move_deadline),
+            ):
+                timings, queries, touched = [], [], []
+                for _ in range(changes):
+                    apply = change(rng, project, grid)
+                    counter = QueryCounter()
+                    with connection.execute_wrapper(counter):
+                        start = time.perf_counter()
+                        changed = apply()
+                        timings.append((time.perf_counter() - start) * 1000)
+                    queries.append(counter.count)
+                    if name == 'durée':
+                        touched.append(changed)
+                timings.sort()
+                self.stdout.write(
+                    f'{name:<12} {statistics.median(timings):>13.2f} '
+                    f'{timings[int(len(timings) * 0.95)]:>9.2f} {timings[-1]:>9.2f} '
+                    f'{statistics.median(queries):>9.0f} '
+                    f"{f'{statistics.median(touched):.0f}' if touched else '-':>7}"
+                )
+            # Le calcul incrémental laisse les mêmes longueurs que le recalcul complet
+            self.stdout.write(f'Écarts avec le recalcul complet: {schedule_project(project)}')
+            transaction.set_rollback(True)
+
+    def _build(self, rng, streams, length, cross_links):
+        user = User.objects.create(username='bench-dependencies')
+        today = date.today()
+        project = Project.objects.create(user=user, title='Benchmark', deadline=today + timedelta(days=365))
+        Task.objects.bulk_create(
+            (
+                Task(project=project, title=f'Tâche {i}', deadline=today, duration=rng.randint(1, 5))
+                for i in range(streams * length)
+            ),
+            batch_size=1000,
+        )
+        ids = list(Task.objects.filter(project=project).order_by('pk').values_list('pk', flat=True))
+        # grid[s][p]: tâche de rang p de la chaîne s; les dépendances vont toujours vers un rang supérieur
+        grid = [ids[s * length:(s + 1) * length] for s in range(streams)]
+        links = set()
+        for s, chain in enumerate(grid):
+            for p, pk in enumerate(chain):
+                for step in (1, 2):
+                    if p + step < length:
+                        links.add((pk, chain[p + step]))
+                for _ in range(cross_links):
+                    target = p + rng.randint(1, 5)
+                    if target < length:
+                        links.add((pk, grid[rng.randrange(streams)][target]))
+        TaskDependency.objects.bulk_create(
+            (TaskDependency(project=project, predecessor_id=a, successor_id=b) for a, b in links),
+            batch_size=1000,
+        )
+        return project, grid
+
+    @staticmethod
+    def _task(rng, grid):
+        chain = grid[rng.randrange(len(grid))]
+        return Task.objects.get(pk=chain[rng.randrange(len(chain))])
+
+    # Each change prepares its data and returns the operation to measure
+
+    def _change_duration(self, rng, project, grid):
+        task = self._task(rng, grid)
+        Task.objects.filter(pk=task.pk).update(duration=rng.randint(1, 5))
+        return lambda: reschedule_tasks([task.pk])
+
+    def _add_edge(self, rng, project, grid):
+        chain = grid[rng.randrange(len(grid))]
+        position = rng.randrange(len(chain) - 1)
+        other = grid[rng.randrange(len(grid))]
+        predecessor = Task.objects.get(pk=chain[position])
+        successor = Task.objects.get(pk=other[rng.randrange(position + 1, len(other))])
+        # Vérification des cycles comprise
+        return lambda: add_dependency(predecessor, successor)
+
+    def _remove_edge(self, rng, project, grid):
+        predecessor_id, successor_id = (
+            TaskDependency.objects.filter(project=project, predecessor_id=self._task(rng, grid).pk)
+            .values_list('predecessor_id', 'successor_id').first() or (0, 0)
+        )
+        return lambda: remove_dependency(predecessor_id, successor_id)
+
+    def _move_deadline(self, rng, project, grid):
+        project.deadline += timedelta(days=rng.randint(-10, 10))
+        # Les longueurs ne dépendent pas de l'échéance: rien à recalculer
+        return lambda: project.save(update_fields=['deadline', 'updated_at'])
@@ -0,0 +1,81 @@
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from projects import scheduling
+from projects.models import Project, Task
+
+
+def legacy_recalculate(project):
+    """The original per-row implementation, kept as the benchmark reference."""
+    tasks = list(project.tasks.filter(is_completed=False).order_by('deadline', 'created_at'))
+    today = date.today()
+    end = max(project.deadline, today)
+    total_days = max(0, (end - today).days)
+    weights = [scheduling.PRIORITY_WEIGHTS.get(t.priority, 2) for t in tasks]
+    total_weight = sum(weights)
+    cumulative = 0
+    for task, weight in zip(tasks, weights):
+        cumulative += weight
+        new_deadline = today + timedelta(days=round(cumulative / total_weight * total_days))
+        new_deadline = min(new_deadline, project.deadline)
+        if task.deadline != new_deadline:
+            task.deadline = new_deadline
+            task.save()
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le recalcul des délais (per-row save() contre bulk_update) "
+        "sur des projets synthétiques. Toutes les écritures sont annulées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,10000,100000',
+                            help="Nombres de tâches séparés par des virgules.")
+        parser.add_argument('--legacy-max', type=int, default=10000,
+                            help="Ne pas mesurer l'ancienne version au-delà de ce nombre de tâches.")
+
+    def handle(self, *args, sizes, legacy_max, **options):
+        backend = 'numpy' if scheduling.np is not None else 'python'
+        self.stdout.write(f'Calcul des dates: {backend}')
+        self.stdout.write(f"{'tâches':>8} {'legacy (s)':>12} {'bulk (s)':>10} {'gain':>8}")
+        for size in (int(value) for value in sizes.split(',')):
+            legacy = self._measure(size, legacy_recalculate) if size <= legacy_max else None
+            bulk = self._measure(size, scheduling.recalculate_task_deadlines)
+            speedup = f'x{legacy / bulk:.1f}' if legacy else '-'
+            legacy_text = f'{legacy:.3f}' if legacy is not None else 'ignoré'
+            self.stdout.write(f'{size:>8} {legacy_text:>12} {bulk:>10.3f} {speedup:>8}')
+
+    def _measure(self, size, recalculate):
+        with transaction.atomic():
+            user = User.objects.create(username=f'bench-reschedule-{size}')
+            today = date.today()
+            project = Project.objects.create(
+                user=user, title='Benchmark', deadline=today + timedelta(days=30)
+            )
+            priorities = [choice for choice, _ in Task.PRIORITY_CHOICES]
+            Task.objects.bulk_create(
+                (
+                    Task(
+                        project=project,
+                        title=f'Tâche {i}',
+                        deadline=today + timedelta(days=i % 90),
+                        priority=priorities[i % 3],
+                    )
+                    for i in range(size)
+                ),
+                batch_size=1000,
+            )
+            # The new deadline is what triggers the recalculation in project_update
+            project.deadline = today + timedelta(days=60)
+            project.save()
+
+            start = time.perf_counter()
+            recalculate(project)
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return elapsed
@@ -0,0 +1,278 @@
+import asyncio
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import unquote
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from projects.models import Project, Task
+from projects.perf import temporary_database
+
+PROJECTS = 200
+TASKS_PER_PROJECT = 5
+# Morceaux dans lesquels un client lent envoie sa requête
+SLOW_PIECES = 4
+REQUEST_TIMEOUT = 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le débit de l'application servie en WSGI (pool de threads fixe) et "
+        "en ASGI (boucle d'événements) quand des clients lents occupent des "
+        "connexions. Travaille sur une base temporaire."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slow-clients', default='0,50',
+                            help="Nombres de clients lents simultanés séparés par des virgules.")
+        parser.add_argument('--clients', type=int, default=8,
+                            help="Clients rapides dont le débit est mesuré (défaut: 8).")
+        parser.add_argument('--threads', type=int, default=8,
+                            help="Threads du serveur WSGI (défaut: 8).")
+        parser.add_argument('--slow-delay', type=float, default=1.0,
+                            help="Durée d'envoi d'une requête par un client lent, en secondes (défaut: 1).")
+        parser.add_argument('--duration', type=float, default=5.0,
+                            help="Durée de chaque mesure en secondes (défaut: 5).")
+        parser.add_argument('--path', default='/projects/api/v1/projects/',
+                            help="URL demandée par les clients (défaut: liste de l'API).")
+
+    def handle(self, *args, slow_clients, clients, threads, slow_delay, duration, path, **options):
+        self.stdout.write(
+            f"{'serveur':<8} {'lents':>6} {'req/s':>9} {'erreurs':>8} {'p95 (ms)':>9}"
+        )
+        with tempfile.TemporaryDirectory() as directory, temporary_database(directory), \
+                override_settings(ALLOWED_HOSTS=['localhost']):
+            cookie = self._setup()
+            servers = [
+                ('wsgi', lambda: _WSGIServerThread(get_wsgi_application(), threads)),
+                ('asgi', lambda: _ASGIServerThread(get_asgi_application())),
+            ]
+            for name, server_class in servers:
+                for slow in (int(value) for value in slow_clients.split(',')):
+                    with server_class() as server:
+                        done, errors, p95 = asyncio.run(_load(
+                            server.port, path, cookie, clients, slow, slow_delay, duration
+                        ))
+                    self.stdout.write(
+                        f'{name:<8} {slow:>6} {done / duration:>9.0f} {errors:>8} {p95 * 1000:>9.1f}'
+                    )
+
+    def _setup(self):
+        """Create a user with synthetic projects; return its session cookie."""
+        user = User.objects.create_user('bench')
+        today = timezone.localdate()
+        projects = Project.objects.bulk_create(
+            Project(user=user, title=f'Projet {i}', deadline=today + timedelta(days=i))
+            for i in range(PROJECTS)
+        )
+        Task.objects.bulk_create(
+            Task(project=project, title=f'Tâche {j}', deadline=today + timedelta(days=j))
+            for project in projects
+            for j in range(TASKS_PER_PROJECT)
+        )
+        client = Client()
+        client.force_login(user)
+        return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _PooledWSGIServer(WSGIServer):
+    """wsgiref server handing connections to a fixed pool of threads.
+
+    Same model as the threaded workers of gunicorn: a thread is held for
+    the whole connection, including the time spent reading a slow request.
+    """
+
+    def __init__(self, threads):
+        super().__init__(('127.0.0.1', 0), _QuietHandler)
+        self.pool = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class _WSGIServerThread:
+    def __init__(self, application, threads):
+        self.server = _PooledWSGIServer(threads)
+        self.server.set_app(application)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.pool.shutdown(cancel_futures=True)
+        self.server.server_close()
+
+
+class _ASGIServerThread:
+    """Minimal HTTP/1.1 server running an ASGI application in its own event loop.
+
+    One request per connection, like the clients of ``_load()``; enough to
+    compare with ``_PooledWSGIServer`` without depending on uvicorn.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.handlers = set()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._serve, '127.0.0.1', 0), self.loop
+        ).result()
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    def __exit__(self, *exc_info):
+        async def stop():
+            self.server.close()
+            # Requests still in Django when the clients left
+            await asyncio.gather(*self.handlers, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    async def _serve(self, reader, writer):
+        self.handlers.add(asyncio.current_task())
+        disconnected = asyncio.Event()
+
+        async def receive():
+            if not received:
+                received.append(True)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                writer.write(
+                    f"HTTP/1.1 {message['status']} \r\n".encode()
+                    + b''.join(name + b': ' + value + b'\r\n' for name, value in message['headers'])
+                    + b'Connection: close\r\n\r\n'
+                )
+            else:
+                writer.write(message.get('body', b''))
+                await writer.drain()
+
+        received = []
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+            request_line, *lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+            method, target, _ = request_line.split(' ', 2)
+            path, _, query = target.partition('?')
+            headers = [
+                (name.strip().lower().encode('latin-1'), value.strip().encode('latin-1'))
+                for name, value in (line.split(':', 1) for line in lines)
+            ]
+            await self.application({
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': method,
+                'scheme': 'http',
+                'path': unquote(path),
+                'raw_path': path.encode('latin-1'),
+                'query_string': query.encode('latin-1'),
+                'root_path': '',
+                'headers': headers,
+                'client': writer.get_extra_info('peername')[:2],
+                'server': writer.get_extra_info('sockname')[:2],
+            }, receive, send)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            disconnected.set()
+            writer.close()
+            self.handlers.discard(asyncio.current_task())
+
+
+async def _request(port, path, cookie, slow_delay=0.0):
+    """Send one GET and return the response status; ``slow_delay`` trickles the request."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        head = (
+            f'GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n'
+            'Connection: close\r\n\r\n'
+        ).encode()
+        if slow_delay:
+            size = -(-len(head) // SLOW_PIECES)
+            for start in range(0, len(head), size):
+                writer.write(head[start:start + size])
+                await writer.drain()
+                await asyncio.sleep(slow_delay / SLOW_PIECES)
+        else:
+            writer.write(head)
+        response = await reader.read()
+        return int(response.split(b' ', 2)[1])
+    finally:
+        writer.close()
+
+
+async def _load(port, path, cookie, clients, slow_clients, slow_delay, duration):
+    """Run the clients for ``duration`` seconds; return ``(done, errors, p95)`` of the fast ones."""
+    latencies, errors = [], []
+
+    async def fast_client():
+        while (start := time.perf_counter()) < deadline:
+            try:
+                status = await asyncio.wait_for(_request(port, path, cookie), REQUEST_TIMEOUT)
+            except (OSError, ValueError, IndexError, asyncio.TimeoutError):
+                status = None
+            if status == 200 and time.perf_counter() <= deadline:
+                latencies.append(time.perf_counter() - start)
+            elif status != 200:
+                errors.append(status)
+
+    async def slow_client(seed):
+        # Décalés pour ne pas arriver tous ensemble
+        await asyncio.sleep(random.Random(seed).uniform(0, slow_delay))
+        while not stop.is_set():
+            try:
+                await _request(port, path, cookie, slow_delay)
+            except OSError:
+                pass
+
+    stop = asyncio.Event()
+    slow = [asyncio.create_task(slow_client(seed)) for seed in range(slow_clients)]
+    # Laisse les clients lents occuper leurs connexions avant de mesurer
+    await asyncio.sleep(slow_delay if slow_clients else 0)
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(fast_client() for _ in range(clients)))
+    # Requêtes en cours terminées: un envoi interrompu serait servi tronqué
+    stop.set()
+    await asyncio.gather(*slow)
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+    return len(latencies), len(errors), p95
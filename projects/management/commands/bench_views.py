@@ -0,0 +1,76 @@
+import json
+import tempfile
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.perf import find_regressions, run_suite, seed, temporary_database
+
+from .seed_perf import SCALES
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure les vues (liste avec chaque tri, filtre et recherche, détail, "
+        "modification avec changement de deadline, suppression) via le client de "
+        "test: latences p50/p95/p99, requêtes SQL et mémoire maximale, en JSON. "
+        "Avec --baseline, échoue si une mesure régresse au-delà du seuil."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='1k',
+                            help="Volume généré dans la base temporaire (défaut: 1k).")
+        parser.add_argument('--current-database', action='store_true',
+                            help="Mesurer la base configurée (peuplée par seed_perf) au lieu "
+                                 "d'une base temporaire. Attention: des projets y sont modifiés "
+                                 "et supprimés.")
+        parser.add_argument('--repeat', type=int, default=20,
+                            help="Requêtes mesurées par scénario (défaut: 20).")
+        parser.add_argument('--only', help="Ne lancer que les scénarios commençant par ce préfixe.")
+        parser.add_argument('-o', '--output', help="Fichier du rapport JSON (défaut: sortie standard).")
+        parser.add_argument('--baseline', help="Rapport JSON de référence à comparer.")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Régression tolérée, en fraction de la référence (défaut: 0.2).")
+        parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                            help="Écart de latence médiane ignoré en dessous de cette valeur "
+                                 "(défaut: 1 ms).")
+        parser.add_argument('--min-delta-kb', type=float, default=64,
+                            help="Écart de mémoire ignoré en dessous de cette valeur (défaut: 64 Ko).")
+
+    def handle(self, *args, scale, current_database, repeat, only, output, baseline, threshold,
+               min_delta_ms, min_delta_kb, verbosity, **options):
+        if repeat < 1:
+            raise CommandError('--repeat doit valoir au moins 1.')
+        if baseline:
+            with open(baseline, encoding='utf-8') as stream:
+                baseline = json.load(stream)
+
+        def log(name, result):
+            if verbosity > 1:
+                self.stderr.write(
+                    f'{name:<60} p50 {result.p50_ms:>8.1f} ms  p95 {result.p95_ms:>8.1f} ms  '
+                    f'{result.queries:>3} requêtes'
+                )
+
+        with tempfile.TemporaryDirectory() as directory:
+            with nullcontext() if current_database else temporary_database(directory):
+                if not current_database:
+                    users, projects, tasks = SCALES[scale]
+                    seed(users, projects, tasks)
+                report = run_suite(repeat=repeat, only=only, log=log)
+
+        text = json.dumps(report, indent=2, ensure_ascii=False)
+        if output:
+            with open(output, 'w', encoding='utf-8') as stream:
+                stream.write(text + '\n')
+        else:
+            self.stdout.write(text)
+
+        if baseline:
+            regressions = find_regressions(baseline, report, threshold, min_delta_ms, min_delta_kb)
+            if regressions:
+                raise CommandError(
+                    f'{len(regressions)} régression(s) par rapport à la référence :\n'
+                    + '\n'.join(regressions)
+                )
+            self.stderr.write(self.style.SUCCESS('Aucune régression par rapport à la référence.'))
@@ -0,0 +1,37 @@
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.staticfiles import build_icon_sprite, build_stylesheet, used_icons
+
+
+class Command(BaseCommand):
+    help = (
+        "Compile la feuille de style Tailwind (classes utilisées uniquement) et le sprite "
+        "des icônes Lucide utilisées par les gabarits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tailwind',
+            help="Commande du CLI Tailwind (défaut: réglage PROJECTS_TAILWIND_CLI, sinon tailwindcss).",
+        )
+
+    def handle(self, *args, tailwind, **options):
+        names = used_icons()
+        try:
+            sprite = build_icon_sprite(names)
+        except ImportError:
+            raise CommandError("Le paquet lucide est requis: pip install lucide")
+        except KeyError as error:
+            raise CommandError(f"Icône Lucide inconnue: {error}")
+        self.stdout.write(f'{sprite.name}: {len(names)} icône(s) ({", ".join(names)}).')
+
+        try:
+            stylesheet = build_stylesheet(tailwind)
+        except FileNotFoundError:
+            raise CommandError("CLI Tailwind introuvable: pip install tailwindcss-bin, ou --tailwind.")
+        except subprocess.CalledProcessError as error:
+            raise CommandError(f"Échec de la compilation Tailwind:\n{error.stderr.decode()}")
+        size = stylesheet.stat().st_size
+        self.stdout.write(self.style.SUCCESS(f'{stylesheet.name}: {size / 1024:.1f} Kio.'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from projects import jobs
+from projects.auth import SESSION_CLEANUP_BATCH_SIZE, clear_expired_sessions
+
+
+class Command(BaseCommand):
+    help = "Supprime les sessions expirées de la base, par lots (à planifier, par exemple chaque nuit)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=SESSION_CLEANUP_BATCH_SIZE,
+            help=f"Nombre de sessions supprimées par transaction (défaut: {SESSION_CLEANUP_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help="Confier le nettoyage aux workers (run_workers) au lieu de l'exécuter ici.",
+        )
+
+    def handle(self, *args, batch_size, enqueue, **options):
+        if enqueue:
+            queued = jobs.enqueue('clear_expired_sessions', {'batch_size': batch_size})
+            self.stdout.write(self.style.SUCCESS(f'Tâche de fond n°{queued.pk} ajoutée à la file.'))
+            return
+
+        removed = clear_expired_sessions(batch_size)
+        self.stdout.write(self.style.SUCCESS(f'{removed} session(s) expirée(s) supprimée(s).'))
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from projects import jobs
+from projects.sharding import on_each_shard
+from projects.timetracking import COMPACT_BATCH_SIZE, close_stale_timers, compact_time_entries
+
+
+class Command(BaseCommand):
+    help = "Arrête les chronomètres abandonnés et regroupe les anciens temps passés par tâche et par jour."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=90,
+            help="Regrouper les saisies de plus de N jours (défaut: 90).",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=COMPACT_BATCH_SIZE,
+            help=f"Nombre de saisies lues par transaction (défaut: {COMPACT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help="Confier le regroupement aux workers (run_workers) au lieu de l'exécuter ici.",
+        )
+
+    def handle(self, *args, days, batch_size, enqueue, **options):
+        if enqueue:
+            queued = jobs.enqueue('compact_time_entries', {'days': days, 'batch_size': batch_size})
+            self.stdout.write(self.style.SUCCESS(f'Tâche de fond n°{queued.pk} ajoutée à la file.'))
+            return
+
+        closed = sum(on_each_shard(close_stale_timers))
+        before = timezone.now() - timedelta(days=days)
+        removed = sum(on_each_shard(compact_time_entries, before, batch_size))
+        self.stdout.write(self.style.SUCCESS(
+            f'{closed} chronomètre(s) arrêté(s), {removed} saisie(s) regroupée(s).'
+        ))
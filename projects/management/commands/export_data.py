@@ -0,0 +1,36 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.sharding import tenant
+from projects.transfer import FORMATS, KINDS, export_rows
+
+
+class Command(BaseCommand):
+    help = "Exporte les projets ou les tâches d'un utilisateur en CSV ou NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, required=True,
+                            help="Utilisateur dont les données sont exportées (id).")
+        parser.add_argument('--kind', choices=KINDS, default='projects',
+                            help="Projets ou tâches (défaut: projects).")
+        parser.add_argument('--format', choices=FORMATS, default='csv', dest='fmt',
+                            help="Format de sortie (défaut: csv).")
+        parser.add_argument('--output', '-o',
+                            help="Fichier de sortie (défaut: sortie standard).")
+
+    def handle(self, *args, user, kind, fmt, output, **options):
+        try:
+            owner = User.objects.get(pk=user)
+        except User.DoesNotExist:
+            raise CommandError(f"L'utilisateur {user} n'existe pas.")
+
+        stream = open(output, 'w', encoding='utf-8', newline='') if output else sys.stdout
+        try:
+            with tenant(owner.pk):
+                for chunk in export_rows(owner, kind, fmt):
+                    stream.write(chunk)
+        finally:
+            if output:
+                stream.close()
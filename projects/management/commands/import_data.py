@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import jobs
+from projects.sharding import tenant
+from projects.transfer import FORMATS, IMPORT_BATCH_SIZE, KINDS, import_file
+
+
+class Command(BaseCommand):
+    help = "Importe des projets ou des tâches depuis un fichier CSV ou NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier à importer.")
+        parser.add_argument('--user', type=int, required=True,
+                            help="Utilisateur propriétaire des lignes importées (id).")
+        parser.add_argument('--kind', choices=KINDS, default='projects',
+                            help="Projets ou tâches (défaut: projects).")
+        parser.add_argument('--format', choices=FORMATS, dest='fmt',
+                            help="Format du fichier (défaut: d'après l'extension).")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help=f"Lignes insérées par transaction (défaut: {IMPORT_BATCH_SIZE}).")
+        parser.add_argument('--id-map',
+                            help="Fichier JSON des correspondances d'identifiants de projets: "
+                                 "écrit par un import de projets, lu par un import de tâches.")
+        parser.add_argument('--enqueue', action='store_true',
+                            help="Confier l'import aux workers (run_workers) au lieu de l'exécuter ici.")
+
+    def handle(self, *args, path, user, kind, fmt, batch_size, id_map, enqueue, **options):
+        fmt = fmt or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        try:
+            owner = User.objects.get(pk=user)
+        except User.DoesNotExist:
+            raise CommandError(f"L'utilisateur {user} n'existe pas.")
+
+        project_map = None
+        if kind == 'tasks' and id_map:
+            with open(id_map, encoding='utf-8') as stream:
+                project_map = json.load(stream)
+
+        if enqueue:
+            # The worker deletes the file it imports: hand it a copy
+            fd, copy = tempfile.mkstemp(dir=getattr(settings, 'PROJECTS_IMPORT_DIR', None))
+            with os.fdopen(fd, 'wb') as target, open(path, 'rb') as source:
+                shutil.copyfileobj(source, target)
+            queued = jobs.enqueue('import_rows', {
+                'user_id': owner.pk, 'path': copy, 'kind': kind, 'fmt': fmt,
+                'project_map': project_map,
+            }, user=owner, max_attempts=1)
+            self.stdout.write(self.style.SUCCESS(f'Tâche de fond n°{queued.pk} ajoutée à la file.'))
+            return
+
+        with open(path, encoding='utf-8', newline='') as stream, tenant(owner.pk):
+            report = import_file(owner, stream, kind, fmt, project_map, batch_size)
+
+        for error in report.errors:
+            details = '; '.join(
+                f"{name}: {' '.join(messages)}" for name, messages in error['errors'].items()
+            )
+            self.stderr.write(f"Ligne {error['line']}: {details}")
+        if report.error_count > len(report.errors):
+            self.stderr.write(f'... {report.error_count - len(report.errors)} autre(s) erreur(s).')
+        if kind == 'projects' and id_map:
+            with open(id_map, 'w', encoding='utf-8') as stream:
+                json.dump(report.id_map, stream)
+        self.stdout.write(self.style.SUCCESS(
+            f'{report.created} ligne(s) importée(s), {report.error_count} rejetée(s).'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from projects import jobs
+from projects.deletion import PURGE_BATCH_SIZE, purge_deleted_projects
+from projects.sharding import on_each_shard
+
+
+class Command(BaseCommand):
+    help = "Supprime définitivement les projets supprimés dont le délai d'annulation est écoulé, par lots."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=PURGE_BATCH_SIZE,
+            help=f"Nombre de tâches supprimées par transaction (défaut: {PURGE_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help="Confier la purge aux workers (run_workers) au lieu de l'exécuter ici.",
+        )
+
+    def handle(self, *args, batch_size, enqueue, **options):
+        if enqueue:
+            queued = jobs.enqueue('purge_deleted_projects', {'batch_size': batch_size})
+            self.stdout.write(self.style.SUCCESS(f'Tâche de fond n°{queued.pk} ajoutée à la file.'))
+            return
+
+        purged = on_each_shard(purge_deleted_projects, batch_size=batch_size)
+        projects, tasks = sum(p for p, _ in purged), sum(t for _, t in purged)
+        self.stdout.write(self.style.SUCCESS(
+            f'{projects} projet(s) et {tasks} tâche(s) supprimé(s) définitivement.'
+        ))
@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from projects.sharding import misplaced_tenants, move_tenant, sharding_enabled
+
+
+class Command(BaseCommand):
+    help = (
+        "Déplace les utilisateurs dont le shard attribué par hachage a changé "
+        "(après l'ajout ou le retrait d'un shard), un utilisateur à la fois."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="Ne traiter que cet utilisateur (id, répétable).")
+        parser.add_argument('--limit', type=int,
+                            help="Nombre maximal d'utilisateurs déplacés.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Lister les déplacements sans les effectuer.")
+
+    def handle(self, *args, users, limit, dry_run, **options):
+        if not sharding_enabled():
+            raise CommandError("Le sharding n'est pas activé (PROJECTS_SHARDS).")
+
+        user_ids = users or User.objects.order_by('pk').values_list('pk', flat=True).iterator()
+        moved = failed = 0
+        for user_id, source, target in misplaced_tenants(user_ids):
+            if limit is not None and moved + failed >= limit:
+                break
+            if dry_run:
+                self.stdout.write(f'{user_id}: {source} -> {target}')
+                moved += 1
+                continue
+            try:
+                rows = move_tenant(user_id, target)
+            except IntegrityError as error:
+                failed += 1
+                self.stderr.write(f'{user_id}: {source} -> {target} impossible ({error}).')
+            else:
+                moved += 1
+                self.stdout.write(f'{user_id}: {source} -> {target} ({rows} ligne(s)).')
+
+        verb = 'à déplacer' if dry_run else 'déplacé(s)'
+        self.stdout.write(self.style.SUCCESS(f'{moved} utilisateur(s) {verb}, {failed} échec(s).'))
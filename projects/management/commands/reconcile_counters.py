@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from projects import jobs
+from projects.counters import reconcile_in_batches
+from projects.models import Project
+from projects.sharding import on_each_shard, tenant
+
+
+class Command(BaseCommand):
+    help = "Recompte les compteurs de tâches dénormalisés de chaque projet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="Nombre de projets recomptés par transaction (défaut: 5000).",
+        )
+        parser.add_argument(
+            '--user', type=int,
+            help="Limiter aux projets de cet utilisateur (id).",
+        )
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help="Confier le recomptage aux workers (run_workers) au lieu de l'exécuter ici.",
+        )
+
+    def handle(self, *args, batch_size, user, enqueue, **options):
+        if enqueue:
+            queued = jobs.enqueue('reconcile_counters', {'user_id': user, 'batch_size': batch_size})
+            self.stdout.write(self.style.SUCCESS(f'Tâche de fond n°{queued.pk} ajoutée à la file.'))
+            return
+
+        if user is not None:
+            with tenant(user):
+                total = reconcile_in_batches(Project.objects.filter(user_id=user), batch_size)
+        else:
+            total = sum(on_each_shard(reconcile_in_batches, Project.objects.all(), batch_size))
+        self.stdout.write(self.style.SUCCESS(f'{total} projet(s) recompté(s).'))
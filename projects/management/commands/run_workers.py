@@ -0,0 +1,58 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from projects import jobs
+
+
+class Command(BaseCommand):
+    help = "Exécute les tâches de fond de la file projects_job."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help="Nombre de workers (défaut: 2).")
+        parser.add_argument('--mode', choices=['thread', 'process'], default='thread',
+                            help="Pool de threads ou de processus (défaut: thread).")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Attente en secondes quand la file est vide.")
+        parser.add_argument('--burst', action='store_true',
+                            help="S'arrêter dès que la file est vide.")
+
+    def handle(self, *args, workers, mode, poll_interval, burst, **options):
+        requeued, failed = jobs.requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f'{requeued} tâche(s) abandonnée(s) remise(s) en file.')
+        if failed:
+            self.stdout.write(f'{failed} tâche(s) abandonnée(s) sans nouvelle tentative possible: échouée(s).')
+
+        if mode == 'process':
+            # Connections must not be shared with forked children
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            stop = context.Event()
+            pool = [
+                context.Process(target=jobs.work, args=(stop, poll_interval, burst))
+                for _ in range(workers)
+            ]
+        else:
+            stop = threading.Event()
+            pool = [
+                threading.Thread(target=jobs.work, args=(stop, poll_interval, burst))
+                for _ in range(workers)
+            ]
+
+        def shutdown(signum, frame):
+            stop.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        self.stdout.write(f'{workers} worker(s) ({mode}) démarré(s).')
+        for worker in pool:
+            worker.start()
+        for worker in pool:
+            worker.join()
+        self.stdout.write('Workers arrêtés.')
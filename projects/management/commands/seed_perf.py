@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.perf import SEED_BATCH_SIZE, seed
+
+SCALES = {
+    # volume: (utilisateurs, projets, tâches)
+    '1k': (10, 100, 1_000),
+    '100k': (200, 5_000, 100_000),
+    '1m': (1_000, 50_000, 1_000_000),
+    '10m': (5_000, 500_000, 10_000_000),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère des utilisateurs, projets et tâches synthétiques (distributions "
+        "asymétriques de statut, priorité et échéance) pour les mesures de performance."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='1k',
+                            help="Volume prédéfini: 1k, 100k, 1m ou 10m tâches (défaut: 1k).")
+        parser.add_argument('--users', type=int, help="Nombre d'utilisateurs (remplace --scale).")
+        parser.add_argument('--projects', type=int, help="Nombre de projets (remplace --scale).")
+        parser.add_argument('--tasks', type=int, help="Nombre approximatif de tâches (remplace --scale).")
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Graine aléatoire: même graine, mêmes données (défaut: 0).")
+        parser.add_argument('--batch-size', type=int, default=SEED_BATCH_SIZE,
+                            help=f'Lignes par insertion (défaut: {SEED_BATCH_SIZE}).')
+
+    def handle(self, *args, scale, users, projects, tasks, seed, batch_size, verbosity, **options):
+        default_users, default_projects, default_tasks = SCALES[scale]
+        users = default_users if users is None else users
+        projects = default_projects if projects is None else projects
+        tasks = default_tasks if tasks is None else tasks
+        if users < 1 or projects < 0 or tasks < 0:
+            raise CommandError("Il faut au moins un utilisateur et des volumes positifs.")
+        log = self.stdout.write if verbosity > 1 else None
+        report = seed(users, projects, tasks, seed=seed, batch_size=batch_size, log=log)
+        self.stdout.write(self.style.SUCCESS(
+            f'{report.users} utilisateurs, {report.projects} projets et {report.tasks} tâches '
+            f'créés en {report.seconds:.1f} s.'
+        ))
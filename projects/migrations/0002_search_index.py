@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS projects_search USING fts5('
+        'title, body, owner, project_id UNINDEXED, '
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        'INSERT INTO projects_search (rowid, title, body, owner, project_id) '
+        "SELECT id * 2, title, description, 'u' || user_id, id FROM projects_project"
+    )
+    schema_editor.execute(
+        'INSERT INTO projects_search (rowid, title, body, owner, project_id) '
+        "SELECT t.id * 2 + 1, t.title, t.description, 'u' || p.user_id, t.project_id "
+        'FROM projects_task t JOIN projects_project p ON p.id = t.project_id'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS projects_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
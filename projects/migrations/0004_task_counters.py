@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:41
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, FloatField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Round
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+
+def backfill_counters(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    Task = apps.get_model('projects', 'Task')
+    db = schema_editor.connection.alias
+    tasks = Task.objects.using(db).filter(project=OuterRef('pk')).order_by().values('project')
+
+    def count(**filters):
+        counted = tasks.filter(**filters).annotate(n=Count('pk')).values('n')
+        return Coalesce(Subquery(counted), 0)
+
+    Project.objects.using(db).update(
+        task_count=count(),
+        completed_count=count(is_completed=True),
+        overdue_count=count(is_completed=False, deadline__lt=timezone.now().date()),
+    )
+    Project.objects.using(db).update(progress=Case(
+        When(
+            GreaterThan(F('task_count'), 0),
+            then=Round(F('completed_count') * Value(100.0) / F('task_count'), 1),
+        ),
+        default=F('progress'),
+        output_field=FloatField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='overdue_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='task_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_sharding'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='is_closed',
+            field=models.GeneratedField(db_persist=True, expression=models.Q(('status', 'completed')), output_field=models.BooleanField()),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['user', 'is_closed', 'deadline'], name='project_user_urgency_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(condition=models.Q(('is_closed', False)), fields=['user', 'deadline'], name='project_user_open_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_timeline'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('task_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('overdue_count', models.PositiveIntegerField(default=0)),
+                ('progress', models.FloatField(default=0.0)),
+                ('total_time', models.FloatField(default=0.0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='projects.project')),
+            ],
+            options={
+                'verbose_name': 'Relevé de projet',
+                'verbose_name_plural': 'Relevés de projets',
+                'constraints': [models.UniqueConstraint(fields=('project', 'day'), name='projectsnapshot_project_day_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('project_count', models.PositiveIntegerField(default=0)),
+                ('task_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('overdue_count', models.PositiveIntegerField(default=0)),
+                ('total_time', models.FloatField(default=0.0)),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': "Relevé d'utilisateur",
+                'verbose_name_plural': "Relevés d'utilisateurs",
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='usersnapshot_user_day_uniq')],
+            },
+        ),
+    ]
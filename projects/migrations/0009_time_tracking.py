@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:38
+
+import django.db.models.deletion
+import django.db.models.expressions
+import django.db.models.functions.math
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='time_spent',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='time_spent',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        # A regular column cannot become a generated one in place
+        migrations.RemoveField(
+            model_name='project',
+            name='total_time',
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='total_time',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('time_spent'), '/', models.Value(3600.0)), 2), output_field=models.FloatField(verbose_name='Temps total (heures)')),
+        ),
+        migrations.CreateModel(
+            name='TimeEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(verbose_name='Début')),
+                ('duration', models.PositiveIntegerField(verbose_name='Durée (secondes)')),
+                ('source', models.CharField(choices=[('timer', 'Chronomètre'), ('manual', 'Saisie manuelle'), ('daily', 'Cumul journalier')], default='manual', max_length=10)),
+                ('note', models.CharField(blank=True, max_length=200, verbose_name='Note')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='time_entries', to='projects.task')),
+            ],
+            options={
+                'verbose_name': 'Temps passé',
+                'verbose_name_plural': 'Temps passés',
+                'ordering': ['started_at'],
+                'indexes': [models.Index(fields=['task', 'started_at'], name='timeentry_task_started_idx'), models.Index(fields=['started_at'], name='timeentry_started_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Timer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('last_seen_at', models.DateTimeField()),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timers', to='projects.task')),
+                ('user', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='timer', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Chronomètre',
+                'verbose_name_plural': 'Chronomètres',
+                'indexes': [models.Index(fields=['last_seen_at'], name='timer_last_seen_idx')],
+            },
+        ),
+    ]
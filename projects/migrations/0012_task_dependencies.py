@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0011_project_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='after_days',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='before_days',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='duration',
+            field=models.PositiveSmallIntegerField(default=1, verbose_name='Durée (jours)'),
+        ),
+        migrations.CreateModel(
+            name='TaskDependency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('predecessor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='successor_links', to='projects.task')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dependencies', to='projects.project')),
+                ('successor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='predecessor_links', to='projects.task')),
+            ],
+            options={
+                'verbose_name': 'Dépendance',
+                'verbose_name_plural': 'Dépendances',
+                'indexes': [models.Index(fields=['successor', 'predecessor'], name='taskdependency_successor_idx')],
+                'constraints': [models.UniqueConstraint(fields=('predecessor', 'successor'), name='taskdependency_uniq'), models.CheckConstraint(condition=models.Q(('predecessor', models.F('successor')), _negated=True), name='taskdependency_not_self')],
+            },
+        ),
+    ]
@@ -1,7 +1,136 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, router, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Round
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+def _task_statistics(prefix=''):
+    """Conditional aggregates computing every task counter in a single pass.
+
+    ``prefix`` is the lookup path from the queried model to ``Task``
+    (``'tasks__'`` when aggregating from ``Project``).
+    """
+    today = timezone.now().date()
+
+    def count(**conditions):
+        condition = Q(**{f'{prefix}{key}': value for key, value in conditions.items()})
+        return Count(f'{prefix}pk', filter=condition)
+
+    return {
+        'total_tasks': Count(f'{prefix}pk'),
+        'completed_tasks': count(is_completed=True),
+        'pending_tasks': count(is_completed=False),
+        'overdue_tasks': count(is_completed=False, deadline__lt=today),
+        'high_priority_tasks': count(priority='high'),
+        'medium_priority_tasks': count(priority='medium'),
+        'low_priority_tasks': count(priority='low'),
+    }
+
+
+# Échéances, du plus urgent au moins urgent
+URGENCY_OVERDUE = 0
+URGENCY_WEEK = 1
+URGENCY_MONTH = 2
+URGENCY_LATER = 3
+URGENCY_DONE = 4
+DUE_WINDOWS = {'week': 7, 'month': 30}
+
+
+class DaysUntil(models.Func):
+    """Whole days from ``today`` to a date expression, negative once it has passed."""
+    output_field = models.IntegerField()
+    template = '(%(expressions)s)'
+    arg_joiner = ' - '
+
+    def __init__(self, expression, today, **extra):
+        super().__init__(expression, models.Value(today, output_field=models.DateField()), **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)', arg_joiner=') - julianday(',
+            **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='DATEDIFF', template=None, arg_joiner=', ',
+                           **extra_context)
+
+
+def _timeline(closed, today):
+    """``overdue``, ``days_left`` and ``urgency`` of rows whose ``closed`` condition is false."""
+    return {
+        'overdue': models.ExpressionWrapper(
+            ~closed & Q(deadline__lt=today), output_field=models.BooleanField()
+        ),
+        'days_left': DaysUntil('deadline', today),
+        'urgency': models.Case(
+            models.When(closed, then=models.Value(URGENCY_DONE)),
+            models.When(deadline__lt=today, then=models.Value(URGENCY_OVERDUE)),
+            models.When(deadline__lte=today + timedelta(days=DUE_WINDOWS['week']),
+                        then=models.Value(URGENCY_WEEK)),
+            models.When(deadline__lte=today + timedelta(days=DUE_WINDOWS['month']),
+                        then=models.Value(URGENCY_MONTH)),
+            default=models.Value(URGENCY_LATER),
+            output_field=models.IntegerField(),
+        ),
+    }
+
+
+class ProjectQuerySet(models.QuerySet):
+    def with_task_statistics(self):
+        """Annotate every project with its task counters (one GROUP BY query)."""
+        return self.annotate(**_task_statistics('tasks__'))
+
+    def with_timeline(self, today=None):
+        """Annotate ``overdue``, ``days_left`` and ``urgency`` (``URGENCY_*``), computed in SQL.
+
+        Completed projects are never overdue and rank last.
+        """
+        return self.annotate(**_timeline(Q(is_closed=True), today or timezone.localdate()))
+
+    def due(self, window, today=None):
+        """Open projects ``'overdue'``, or due within the ``'week'`` or ``'month'``.
+
+        Served by the partial index on the open projects' deadlines.
+        """
+        today = today or timezone.localdate()
+        projects = self.filter(is_closed=False)
+        if window == 'overdue':
+            return projects.filter(deadline__lt=today)
+        return projects.filter(
+            deadline__gte=today, deadline__lte=today + timedelta(days=DUE_WINDOWS[window])
+        )
+
+
+class ProjectManager(models.Manager.from_queryset(ProjectQuerySet)):
+    """Default manager: hides the soft-deleted projects (see ``projects.deletion``)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class TaskQuerySet(models.QuerySet):
+    def visible(self):
+        """Only the tasks whose project is not soft-deleted."""
+        return self.filter(project__deleted_at__isnull=True)
+
+    def with_timeline(self, today=None):
+        """Same annotations as ``ProjectQuerySet.with_timeline()``, completed tasks last."""
+        return self.annotate(**_timeline(Q(is_completed=True), today or timezone.localdate()))
+
+    def statistics(self):
+        """Return the task counters of this queryset as a dict, in one query."""
+        return self.order_by().aggregate(**_task_statistics())
+
+    def statistics_by_project(self):
+        """Return ``{project_id: counters}`` for the tasks of this queryset."""
+        rows = self.order_by().values('project').annotate(**_task_statistics())
+        return {row.pop('project'): row for row in rows}
+
+
 class Project(models.Model):
     STATUS_CHOICES = [
         ('not_started', 'Non commencé'),
@@ -10,7 +139,9 @@ class Project(models.Model):
         ('on_hold', 'En pause'),
     ]
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Sans contrainte en base: le projet peut vivre sur un autre shard que
+    # l'utilisateur (voir projects.sharding)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
     title = models.CharField(max_length=200, verbose_name="Titre")
     description = models.TextField(blank=True, verbose_name="Description")
     deadline = models.DateField(verbose_name="Date limite")
@@ -19,19 +150,67 @@ class Project(models.Model):
         choices=STATUS_CHOICES, 
         default='not_started'
     )
+    # Calculé par la base, pour indexer le tri par urgence et les filtres d'échéance
+    is_closed = models.GeneratedField(
+        expression=Q(status='completed'),
+        output_field=models.BooleanField(),
+        db_persist=True,
+    )
     progress = models.FloatField(default=0.0, verbose_name="Progression (%)")
-    total_time = models.FloatField(default=0.0, verbose_name="Temps total (heures)")
+    # Secondes saisies sur les tâches du projet, maintenues par projects.timetracking
+    time_spent = models.PositiveBigIntegerField(default=0, editable=False)
+    total_time = models.GeneratedField(
+        expression=Round(F('time_spent') / 3600.0, 2),
+        output_field=models.FloatField(verbose_name="Temps total (heures)"),
+        db_persist=True,
+    )
+    # Compteurs dénormalisés, maintenus par projects.counters
+    task_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_count = models.PositiveIntegerField(default=0, editable=False)
+    overdue_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Suppression logique: le projet est masqué, puis purgé par projects.deletion
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Supprimé le")
+    
+    objects = ProjectManager()
+    # Projets supprimés logiquement compris (purge, admin, déplacements de shard)
+    all_objects = ProjectQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Projet"
         verbose_name_plural = "Projets"
+        # Un index par clé de tri de project_list, toujours préfixé par le
+        # propriétaire: la liste n'a jamais besoin d'un B-tree temporaire pour trier
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='project_user_created_idx'),
+            models.Index(fields=['user', 'deadline'], name='project_user_deadline_idx'),
+            models.Index(fields=['user', 'status'], name='project_user_status_idx'),
+            models.Index(fields=['user', 'progress'], name='project_user_progress_idx'),
+            models.Index(fields=['user', 'title'], name='project_user_title_idx'),
+            models.Index(fields=['user', 'is_closed', 'deadline'], name='project_user_urgency_idx'),
+            # Les filtres ?due= ne lisent que les projets ouverts
+            models.Index(
+                fields=['user', 'deadline'],
+                condition=Q(is_closed=False),
+                name='project_user_open_idx',
+            ),
+            # Candidats à la purge: seuls les rares projets supprimés sont indexés
+            models.Index(
+                fields=['deleted_at'],
+                condition=Q(deleted_at__isnull=False),
+                name='project_deleted_idx',
+            ),
+        ]
     
     def __str__(self):
         return self.title
     
+    @property
+    def pending_count(self):
+        return self.task_count - self.completed_count
+    
     @property
     def is_overdue(self):
         return self.deadline < timezone.now().date() and self.status != 'completed'
@@ -58,13 +237,294 @@ class Task(models.Model):
         default='medium'
     )
     is_completed = models.BooleanField(default=False, verbose_name="Terminée")
+    # Secondes du registre de temps (projects.timetracking)
+    time_spent = models.PositiveIntegerField(default=0, editable=False)
+    # Ordonnancement (projects.dependencies): durée prévue, puis les plus longues
+    # chaînes de travail restant avant et après la tâche, en jours
+    duration = models.PositiveSmallIntegerField(default=1, verbose_name="Durée (jours)")
+    before_days = models.PositiveIntegerField(default=0, editable=False)
+    after_days = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TaskQuerySet.as_manager()
+    
     class Meta:
         ordering = ['deadline', 'priority']
         verbose_name = "Tâche"
         verbose_name_plural = "Tâches"
+        indexes = [
+            models.Index(fields=['project', 'deadline', 'priority'], name='task_project_deadline_idx'),
+            # La replanification ne lit que les tâches ouvertes d'un projet
+            models.Index(
+                fields=['project', 'deadline', 'created_at'],
+                condition=models.Q(is_completed=False),
+                name='task_project_open_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return self.title
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Ce que les compteurs comptent actuellement, pour que le receveur
+        # post_save n'applique que la différence. Le retard n'est évalué qu'à la
+        # sauvegarde, pas pour chaque ligne lue.
+        instance._counted_fields = instance.counted_fields()
+        instance._scheduled_state = instance.scheduled_state()
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # La tâche et ses compteurs (receveurs post_save) dans la même transaction
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+    
+    def counted_fields(self):
+        """Return ``(project_id, is_completed, deadline)``, ``None`` if deferred."""
+        deadline = self.__dict__.get('deadline')
+        is_completed = self.__dict__.get('is_completed')
+        if deadline is None or is_completed is None:
+            # Champs différés: état inconnu, les compteurs le reliront
+            return None
+        return self.project_id, is_completed, deadline
+    
+    def counted_state(self, today=None):
+        """Return ``(project_id, is_completed, is_overdue)`` as seen by the counters."""
+        return self._counted_state(self.counted_fields(), today)
+    
+    def loaded_counted_state(self, today=None):
+        """``counted_state()`` of the task as loaded or last saved, ``None`` if unknown."""
+        return self._counted_state(getattr(self, '_counted_fields', None), today)
+    
+    def _counted_state(self, fields, today):
+        if fields is None:
+            return None
+        project_id, is_completed, deadline = fields
+        deadline = self._meta.get_field('deadline').to_python(deadline)
+        overdue = not is_completed and deadline < (today or timezone.now().date())
+        return project_id, is_completed, overdue
+    
+    def scheduled_state(self):
+        """Return ``(project_id, remaining_days)`` as seen by the scheduler, ``None`` if deferred."""
+        duration = self.__dict__.get('duration')
+        is_completed = self.__dict__.get('is_completed')
+        if duration is None or is_completed is None:
+            return None
+        return self.project_id, 0 if is_completed else duration
+    
+    @property
+    def hours_spent(self):
+        return round(self.time_spent / 3600, 2)
+
+
+class TaskDependency(models.Model):
+    """``successor`` cannot start before ``predecessor`` is done (see projects.dependencies).
+
+    Both tasks belong to ``project``; the dependencies of a project form a
+    directed acyclic graph.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='dependencies')
+    # Indexés par les index composites ci-dessous, chacun en tête de l'un d'eux
+    predecessor = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='successor_links', db_index=False)
+    successor = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='predecessor_links', db_index=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Dépendance"
+        verbose_name_plural = "Dépendances"
+        constraints = [
+            # Sert aussi au parcours vers les successeurs
+            models.UniqueConstraint(fields=['predecessor', 'successor'], name='taskdependency_uniq'),
+            models.CheckConstraint(condition=~Q(predecessor=F('successor')), name='taskdependency_not_self'),
+        ]
+        indexes = [
+            models.Index(fields=['successor', 'predecessor'], name='taskdependency_successor_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.predecessor_id} -> {self.successor_id}'
+
+
+class TimeEntry(models.Model):
+    """Time spent on a task, appended by timers and manual entries (see projects.timetracking).
+
+    Entries are never updated; compaction replaces the old entries of a task
+    and day by a single ``SOURCE_DAILY`` entry with the same total.
+    """
+    SOURCE_TIMER = 'timer'
+    SOURCE_MANUAL = 'manual'
+    SOURCE_DAILY = 'daily'
+    SOURCE_CHOICES = [
+        (SOURCE_TIMER, 'Chronomètre'),
+        (SOURCE_MANUAL, 'Saisie manuelle'),
+        (SOURCE_DAILY, 'Cumul journalier'),
+    ]
+    
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='time_entries')
+    started_at = models.DateTimeField(verbose_name="Début")
+    duration = models.PositiveIntegerField(verbose_name="Durée (secondes)")
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default=SOURCE_MANUAL)
+    note = models.CharField(max_length=200, blank=True, verbose_name="Note")
+    
+    class Meta:
+        ordering = ['started_at']
+        verbose_name = "Temps passé"
+        verbose_name_plural = "Temps passés"
+        indexes = [
+            models.Index(fields=['task', 'started_at'], name='timeentry_task_started_idx'),
+            # Le compactage lit d'abord les saisies les plus anciennes
+            models.Index(fields=['started_at'], name='timeentry_started_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.task_id}: {self.duration}s @ {self.started_at}'
+
+
+class Timer(models.Model):
+    """Running timer of a user, kept alive by heartbeats (see projects.timetracking)."""
+    # Sur le shard de l'utilisateur, comme ses tâches
+    user = models.OneToOneField(User, on_delete=models.CASCADE, db_constraint=False, related_name='timer')
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='timers')
+    started_at = models.DateTimeField()
+    last_seen_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = "Chronomètre"
+        verbose_name_plural = "Chronomètres"
+        indexes = [
+            models.Index(fields=['last_seen_at'], name='timer_last_seen_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.user_id} -> {self.task_id}'
+
+class Job(models.Model):
+    """Unit of background work stored in the database (see projects.jobs)."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'En attente'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_SUCCEEDED, 'Terminée'),
+        (STATUS_FAILED, 'Échouée'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    idempotency_key = models.CharField(max_length=200, null=True, blank=True, unique=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['run_after', 'pk']
+        verbose_name = "Tâche de fond"
+        verbose_name_plural = "Tâches de fond"
+        indexes = [
+            # Les workers cherchent la plus ancienne tâche exécutable
+            models.Index(
+                fields=['run_after'],
+                condition=models.Q(status='queued'),
+                name='job_queued_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+    
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+
+class ProjectSnapshot(models.Model):
+    """Counters of a project at the end of a day (see projects.rollups).
+
+    Rows are only written on the days the project changed; a missing day
+    carries the previous row over.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='snapshots')
+    day = models.DateField()
+    task_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    overdue_count = models.PositiveIntegerField(default=0)
+    progress = models.FloatField(default=0.0)
+    total_time = models.FloatField(default=0.0)
+    
+    class Meta:
+        verbose_name = "Relevé de projet"
+        verbose_name_plural = "Relevés de projets"
+        constraints = [
+            # Sert aussi au parcours par plage du burndown
+            models.UniqueConstraint(fields=['project', 'day'], name='projectsnapshot_project_day_uniq'),
+        ]
+    
+    def __str__(self):
+        return f'{self.project_id} @ {self.day}'
+
+
+class UserSnapshot(models.Model):
+    """Totals over every project of a user at the end of a day (see projects.rollups)."""
+    # Sur le shard de l'utilisateur, comme ses projets
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False, related_name='snapshots')
+    day = models.DateField()
+    project_count = models.PositiveIntegerField(default=0)
+    task_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    overdue_count = models.PositiveIntegerField(default=0)
+    total_time = models.FloatField(default=0.0)
+    
+    class Meta:
+        verbose_name = "Relevé d'utilisateur"
+        verbose_name_plural = "Relevés d'utilisateurs"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='usersnapshot_user_day_uniq'),
+        ]
+    
+    def __str__(self):
+        return f'{self.user_id} @ {self.day}'
+    
+    @property
+    def progress(self):
+        return round(self.completed_count * 100 / self.task_count, 1) if self.task_count else 0.0
+
+
+class ChangeEvent(models.Model):
+    """Change published to the live pages of a user by ``DatabaseEventBackend`` (see projects.events)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name = "Événement"
+        verbose_name_plural = "Événements"
+    
+    def __str__(self):
+        return f'{self.user_id}: {self.payload.get("type")}'
+
+
+class ShardPlacement(models.Model):
+    """Database alias holding the projects of a user (see projects.sharding)."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='shard_placement')
+    alias = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Placement"
+        verbose_name_plural = "Placements"
     
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f'{self.user_id} -> {self.alias}'
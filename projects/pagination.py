@@ -0,0 +1,121 @@
+"""Keyset (cursor) pagination for the projects app.
+
+Offset pagination (``LIMIT n OFFSET m``) makes the database walk and discard
+``m`` rows, so deep pages get slower the further the user scrolls. Keyset
+pagination instead remembers the sort value and primary key of the last row
+served and asks for the rows strictly after it, so every page costs the same
+index range scan no matter how deep it is.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def _isoformat(value):
+    # DjangoJSONEncoder truncates datetimes to milliseconds, which would make
+    # the cursor land between two rows created within the same millisecond.
+    return value.isoformat()
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    next_cursor: str | None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Paginate ``queryset`` on one or more model fields with the pk as tie-breaker.
+
+    ``ordering`` uses the usual Django syntax, either a single field
+    (``'deadline'`` or ``'-deadline'``) or a sequence of fields sorted in the
+    same direction (``['deadline', 'priority']``). The queryset is re-ordered
+    on ``(*fields, pk)`` so that the ordering is total and a cursor always
+    designates a single position.
+    """
+
+    def __init__(self, queryset, ordering, per_page=24):
+        if isinstance(ordering, str):
+            ordering = [ordering]
+        self.queryset = queryset
+        self.per_page = per_page
+        self.descending = ordering[0].startswith('-')
+        if any(name.startswith('-') != self.descending for name in ordering):
+            raise ValueError('Keyset pagination needs every field sorted in the same direction.')
+        self.field_names = [name.lstrip('-') for name in ordering]
+        self.fields = [queryset.model._meta.get_field(name) for name in self.field_names]
+
+    def ordered_queryset(self):
+        prefix = '-' if self.descending else ''
+        return self.queryset.order_by(
+            *(f'{prefix}{name}' for name in self.field_names), f'{prefix}pk'
+        )
+
+    def encode_cursor(self, obj):
+        payload = [getattr(obj, field.attname) for field in self.fields] + [obj.pk]
+        raw = json.dumps(payload, default=_isoformat).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Return ``(values, pk)`` for ``cursor`` or ``None`` if it is invalid."""
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            *values, pk = json.loads(raw)
+            if len(values) != len(self.fields):
+                return None
+            values = [field.to_python(value) for field, value in zip(self.fields, values)]
+            return values, int(pk)
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            return None
+
+    def _after(self, values, pk):
+        op = 'lt' if self.descending else 'gt'
+        keys = list(zip(self.field_names, values)) + [('pk', pk)]
+        # Lexicographic "strictly after": (a > x) OR (a = x AND b > y) OR ...
+        after = Q()
+        for i, (name, value) in enumerate(keys):
+            term = Q(**dict(keys[:i]), **{f'{name}__{op}': value})
+            after = term if i == 0 else after | term
+        # The redundant inclusive bound on the first field gives the planner
+        # a range it can seek to on a (user, field) index; the OR alone would
+        # be a filtered scan from the start of the range, i.e. slower the
+        # deeper the page.
+        first_name, first_value = keys[0]
+        return Q(**{f'{first_name}__{op}e': first_value}) & after
+
+    def _queryset_after(self, cursor):
+        queryset = self.ordered_queryset()
+        position = self.decode_cursor(cursor)
+        if position is not None:
+            queryset = queryset.filter(self._after(*position))
+        # One extra row tells us whether another page exists without a COUNT(*)
+        return queryset[:self.per_page + 1]
+
+    def _page(self, rows):
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return KeysetPage(rows, next_cursor)
+
+    def get_page(self, cursor=None):
+        return self._page(list(self._queryset_after(cursor)))
+
+    async def aget_page(self, cursor=None):
+        """Async version of ``get_page()`` for the async views."""
+        return self._page([obj async for obj in self._queryset_after(cursor).aiterator()])
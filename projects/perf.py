@@ -0,0 +1,372 @@
+"""Synthetic data and benchmark suite for the views of the projects app.
+
+``seed()`` (``manage.py seed_perf``) fills the database with users, projects
+and tasks drawn from skewed distributions: a few users own most projects
+(Zipf), a few projects hold most tasks (Pareto), statuses, priorities and
+deadlines follow realistic weights. Rows are inserted with ``bulk_create()``
+in batches, indexed for search, and the task counters reconciled at the end.
+
+``run_suite()`` (``manage.py bench_views``) drives the views through the
+test client as the user owning the most projects, and reports for every
+scenario the p50/p95/p99 latency, the number of SQL queries and the peak
+memory. ``find_regressions()`` compares such a report with a baseline.
+"""
+import gc
+import os
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from itertools import accumulate, islice
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .counters import reconcile_in_batches
+from .models import Project, Task
+from .search import get_search_backend
+from .sharding import on_each_shard, place_user, sharding_enabled, tenant
+
+SEED_BATCH_SIZE = 5000
+USER_SKEW = 1.1
+TASK_SKEW = 1.3
+
+STATUS_WEIGHTS = {'in_progress': 45, 'not_started': 25, 'completed': 20, 'on_hold': 10}
+PRIORITY_WEIGHTS = {'medium': 50, 'low': 30, 'high': 20}
+# Part des tâches terminées selon le statut du projet
+COMPLETED_TASK_RATE = {'completed': 0.95, 'in_progress': 0.5, 'on_hold': 0.3, 'not_started': 0.05}
+
+PROJECT_NOUNS = (
+    'Refonte', 'Migration', 'Audit', 'Lancement', 'Rapport', 'Formation', 'Déploiement',
+    'Inventaire', 'Campagne', 'Étude', 'Maintenance', 'Recrutement',
+)
+QUALIFIERS = (
+    'du site', 'client', 'annuel', 'de stage', 'interne', 'sécurité', 'mobile',
+    'trimestriel', 'des serveurs', 'marketing', 'qualité', 'comptable',
+)
+WORDS = (
+    'rapport', 'réunion', 'analyse', 'budget', 'planning', 'client', 'serveur', 'maquette',
+    'validation', 'test', 'livraison', 'documentation', 'facture', 'contrat', 'revue',
+    'données', 'équipe', 'objectif', 'priorité', 'correction', 'version', 'export',
+)
+
+
+def _choices(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _text(rng, words):
+    return ' '.join(rng.choices(WORDS, k=words))
+
+
+@dataclass
+class SeedReport:
+    users: int = 0
+    projects: int = 0
+    tasks: int = 0
+    seconds: float = 0.0
+
+
+def seed(users=100, projects=2000, tasks=20000, seed=0, batch_size=SEED_BATCH_SIZE, log=None):
+    """Create ``users`` users owning ``projects`` projects and about ``tasks`` tasks.
+
+    The same ``seed`` always generates the same data. ``log`` is called with
+    a progress message after each user.
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    report = SeedReport()
+    today = timezone.localdate()
+
+    first = User.objects.filter(username__startswith='perf-').count()
+    owners = User.objects.bulk_create(
+        # Pas de hachage de mot de passe: comptes sans connexion possible
+        User(username=f'perf-{first + i}', password=make_password(None))
+        for i in range(users)
+    )
+    report.users = len(owners)
+    if sharding_enabled():
+        for owner in owners:
+            place_user(owner.pk)
+
+    # Zipf: the user of rank r owns a share of the projects in 1 / r ** USER_SKEW
+    cum_weights = list(accumulate(1 / (rank + 1) ** USER_SKEW for rank in range(users)))
+    per_user = [0] * users
+    for index in rng.choices(range(users), cum_weights=cum_weights, k=projects):
+        per_user[index] += 1
+    # Pareto: most projects have a few tasks, some have hundreds
+    task_weights = [rng.paretovariate(TASK_SKEW) for _ in range(projects)]
+    tasks_per_weight = tasks / sum(task_weights) if projects else 0
+    weights = iter(task_weights)
+
+    for owner, count in zip(owners, per_user):
+        with tenant(owner.pk):
+            for start in range(0, count, batch_size):
+                batch = _seed_projects(
+                    rng, owner, min(batch_size, count - start), today, weights, tasks_per_weight,
+                    batch_size, report,
+                )
+                report.projects += batch
+        if log:
+            log(f'{owner.username}: {count} projets')
+
+    user_ids = [owner.pk for owner in owners]
+    if user_ids:
+        on_each_shard(
+            reconcile_in_batches,
+            Project.objects.filter(user_id__gte=min(user_ids), user_id__lte=max(user_ids)),
+        )
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def _seed_projects(rng, owner, count, today, weights, tasks_per_weight, batch_size, report):
+    projects = []
+    for _ in range(count):
+        status = _choices(rng, STATUS_WEIGHTS)
+        progress = {'completed': 100.0, 'not_started': 0.0}.get(status, round(rng.uniform(5, 95), 1))
+        projects.append(Project(
+            user=owner,
+            title=f'{rng.choice(PROJECT_NOUNS)} {rng.choice(QUALIFIERS)}',
+            description=_text(rng, rng.randint(0, 25)),
+            # Surtout des échéances à venir, une partie déjà dépassée
+            deadline=today + timedelta(days=int(rng.gauss(20, 45))),
+            status=status,
+            progress=progress,
+        ))
+    backend = get_search_backend()
+    with transaction.atomic(using=router.db_for_write(Project)):
+        Project.objects.bulk_create(projects)
+        backend.index_bulk(owner.pk, projects=projects)
+
+    def generate():
+        for project in projects:
+            expected = next(weights) * tasks_per_weight
+            count = int(expected) + (rng.random() < expected % 1)
+            completed_rate = COMPLETED_TASK_RATE[project.status]
+            for _ in range(count):
+                yield Task(
+                    project=project,
+                    title=_text(rng, rng.randint(2, 5)).capitalize(),
+                    description=_text(rng, rng.randint(0, 15)),
+                    deadline=project.deadline - timedelta(days=rng.randint(0, 45)),
+                    priority=_choices(rng, PRIORITY_WEIGHTS),
+                    is_completed=rng.random() < completed_rate,
+                    # Temps saisi: 1 h 30 en moyenne
+                    time_spent=int(rng.expovariate(1 / 5400)),
+                )
+
+    tasks = generate()
+    while batch := list(islice(tasks, batch_size)):
+        with transaction.atomic(using=router.db_for_write(Task)):
+            Task.objects.bulk_create(batch)
+            backend.index_bulk(owner.pk, tasks=batch)
+        report.tasks += len(batch)
+    return len(projects)
+
+
+@contextmanager
+def temporary_database(directory):
+    """Point default (and the replica) at a fresh, migrated database file in ``directory``."""
+    aliases = [alias for alias in (DEFAULT_DB_ALIAS, 'replica') if alias in connections]
+    names = {alias: connections[alias].settings_dict['NAME'] for alias in aliases}
+    for alias in aliases:
+        connections[alias].close()
+        connections[alias].settings_dict['NAME'] = os.path.join(directory, 'perf.sqlite3')
+    try:
+        with override_settings(PROJECTS_SHARDS=[DEFAULT_DB_ALIAS]):
+            call_command('migrate', verbosity=0, interactive=False)
+            yield
+    finally:
+        for alias in aliases:
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = names[alias]
+
+
+# Benchmark suite ------------------------------------------------------------
+
+LIST_SORTS = (
+    'title', '-title', 'deadline', '-deadline', 'status', '-status',
+    'progress', '-progress', 'created_at', '-created_at',
+)
+SEARCH_TERM = 'rapport'
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def scenarios(user):
+    """Yield ``(name, method, request)``; ``request(i)`` returns the ``(url, data)`` of run ``i``."""
+    list_url = reverse('projects:project_list')
+    statuses = [''] + [value for value, _ in Project.STATUS_CHOICES]
+    for search in ('', SEARCH_TERM):
+        for status in statuses:
+            for sort in LIST_SORTS + (('relevance',) if search else ()):
+                data = {'sort': sort, 'status': status, 'search': search}
+                name = 'project_list?' + '&'.join(f'{key}={value}' for key, value in data.items() if value)
+                yield name, 'get', lambda i, data=data: (list_url, data)
+
+    project_ids = list(
+        Project.objects.filter(user=user).order_by('-task_count').values_list('pk', flat=True)
+    )
+    yield 'project_detail', 'get', lambda i: (
+        reverse('projects:project_detail', args=[project_ids[i % len(project_ids)]]), {}
+    )
+
+    def update(i):
+        project = Project.objects.get(pk=project_ids[i % len(project_ids)])
+        # Alterner les sens garantit un changement de deadline à chaque passe
+        shift = 1 if i % 2 == 0 else -1
+        return reverse('projects:project_update', args=[project.pk]), {
+            'title': project.title,
+            'description': project.description,
+            'deadline': project.deadline + timedelta(days=shift),
+            'status': project.status,
+            'progress': project.progress,
+        }
+
+    yield 'project_update', 'post', update
+    # Deletes last, from the lightest projects: the other scenarios keep their data
+    yield 'project_delete', 'post', lambda i: (
+        reverse('projects:project_delete', args=[project_ids[-1 - i]]), {}
+    )
+
+
+@dataclass
+class ScenarioResult:
+    requests: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    queries: int
+    peak_memory_kb: float
+
+
+def _clear_caches():
+    # Mesure à froid: ni liste en cache ni fragments de cartes
+    for cache in caches.all():
+        cache.clear()
+
+
+def run_scenario(client, method, request, repeat):
+    """Run one scenario: a warm-up, a traced run for memory, then ``repeat`` timed runs.
+
+    The garbage collector is paused during the timed runs, as ``timeit``
+    does: a collection landing in one of them would weigh more on the
+    percentiles than any regression.
+    """
+    def send(i):
+        url, data = request(i)
+        _clear_caches()
+        start = time.perf_counter()
+        response = getattr(client, method)(url, data)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise AssertionError(f'{method.upper()} {url}: {response.status_code}')
+        return elapsed, response.wsgi_request.instrumentation.query_count
+
+    send(0)
+    tracemalloc.start()
+    try:
+        send(1)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    timings, queries = [], []
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(2, repeat + 2):
+            elapsed, count = send(i)
+            timings.append(elapsed * 1000)
+            queries.append(count)
+    finally:
+        gc.enable()
+    return ScenarioResult(
+        requests=repeat,
+        p50_ms=round(_percentile(timings, 0.50), 3),
+        p95_ms=round(_percentile(timings, 0.95), 3),
+        p99_ms=round(_percentile(timings, 0.99), 3),
+        queries=max(queries),
+        peak_memory_kb=round(peak / 1024, 1),
+    )
+
+
+def run_suite(repeat=20, only=None, log=None):
+    """Benchmark every scenario as the user owning the most projects; return the report."""
+    user = User.objects.filter(
+        pk=Project.objects.order_by().values('user').annotate(n=Count('pk'))
+        .order_by('-n').values('user')[:1]
+    ).get()
+    client = Client()
+    client.force_login(user)
+    report = {
+        'meta': {
+            'user': user.username,
+            'projects': Project.objects.filter(user=user).count(),
+            'tasks': Task.objects.filter(project__user=user).count(),
+            'repeat': repeat,
+            'django': django.get_version(),
+        },
+        'scenarios': {},
+    }
+    # Query counts come from the instrumentation, which must see every request;
+    # EXPLAIN of slow queries would add to the timings
+    with override_settings(
+        PROJECTS_METRICS_SAMPLE_RATE=1.0, PROJECTS_SLOW_QUERY_MS=None, PROJECTS_JOBS_EAGER=False,
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+    ):
+        for name, method, request in scenarios(user):
+            if only and not name.startswith(only):
+                continue
+            result = run_scenario(client, method, request, repeat)
+            report['scenarios'][name] = asdict(result)
+            if log:
+                log(name, result)
+    return report
+
+
+def find_regressions(baseline, report, threshold=0.2, min_delta_ms=1.0, min_delta_kb=64):
+    """Describe the scenarios of ``report`` that regressed against ``baseline``.
+
+    A regression is a median latency or peak memory more than ``threshold``
+    (a fraction) above the baseline, ignoring differences under
+    ``min_delta_ms`` and ``min_delta_kb``, or any additional SQL query. The
+    p95 and p99 are reported but too noisy over a few runs to fail on.
+    """
+    regressions = []
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        if (
+            current['p50_ms'] > previous['p50_ms'] * (1 + threshold)
+            and current['p50_ms'] - previous['p50_ms'] >= min_delta_ms
+        ):
+            regressions.append(f"{name}: p50 {previous['p50_ms']} → {current['p50_ms']} ms")
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: {previous['queries']} → {current['queries']} requêtes SQL")
+        if (
+            current['peak_memory_kb'] > previous['peak_memory_kb'] * (1 + threshold)
+            and current['peak_memory_kb'] - previous['peak_memory_kb'] >= min_delta_kb
+        ):
+            regressions.append(
+                f"{name}: mémoire {previous['peak_memory_kb']} → {current['peak_memory_kb']} Ko"
+            )
+    return regressions
@@ -0,0 +1,301 @@
+"""Daily rollups of the project counters, for burndown and velocity charts.
+
+``ProjectSnapshot`` keeps, per project and per day, the counters that
+``projects.counters`` maintains on ``Project`` (tasks, completed, overdue,
+progress, total time); ``UserSnapshot`` keeps their sum over the projects of
+a user. Charts read a period with one range scan on the ``(project, day)``
+or ``(user, day)`` unique index instead of replaying the task history.
+
+* Today's rows follow the live counters: every counter change upserts the
+  project's row from its ``Project`` row, and moves the user's row by the
+  same deltas (or recomputes it, for its first change of the day). A write
+  costs a couple of statements whatever the size of the history.
+* Rows are only written on days something changed; readers carry the last
+  row over the days in between. Overdue counts also move on quiet days: the
+  daily ``reconcile_counters`` run updates the drifted projects, and with
+  them their snapshots.
+* ``backfill()`` (``manage.py backfill_rollups``) rebuilds the days before
+  the rollups existed from the dates of the tasks themselves.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Project, ProjectSnapshot, Task, UserSnapshot
+
+COUNTERS = ('task_count', 'completed_count', 'overdue_count', 'progress', 'total_time')
+USER_COUNTERS = ('project_count', 'task_count', 'completed_count', 'overdue_count', 'total_time')
+BACKFILL_BATCH_SIZE = 5000
+
+
+def _tables(connection):
+    quote = connection.ops.quote_name
+    return (
+        quote(Project._meta.db_table),
+        quote(ProjectSnapshot._meta.db_table),
+        quote(UserSnapshot._meta.db_table),
+    )
+
+
+def _excluded(columns):
+    return ', '.join(f'{column} = excluded.{column}' for column in columns)
+
+
+def _refresh_users(cursor, connection, day, where, params):
+    """Recompute the ``day`` rows of the users matching ``where`` (over the project table).
+
+    Soft-deleted projects no longer count.
+    """
+    project_table, _, user_table = _tables(connection)
+    cursor.execute(
+        f'INSERT INTO {user_table} (user_id, day, {", ".join(USER_COUNTERS)}) '
+        f'SELECT user_id, %s, COUNT(*), SUM(task_count), SUM(completed_count), '
+        f'SUM(overdue_count), SUM(total_time) FROM {project_table} '
+        f'WHERE ({where}) AND deleted_at IS NULL GROUP BY user_id '
+        f'ON CONFLICT (user_id, day) DO UPDATE SET {_excluded(USER_COUNTERS)}',
+        [connection.ops.adapt_datefield_value(day), *params],
+    )
+
+
+def refresh_project_snapshots(project_ids, day=None, batch_size=500):
+    """Upsert the ``day`` (default today) rows of ``project_ids`` and of their users."""
+    project_ids = list(project_ids)
+    day = day or timezone.localdate()
+    using = router.db_for_write(ProjectSnapshot)
+    connection = connections[using]
+    project_table, snapshot_table, _ = _tables(connection)
+    day_value = connection.ops.adapt_datefield_value(day)
+    with transaction.atomic(using=using, savepoint=False), connection.cursor() as cursor:
+        for index in range(0, len(project_ids), batch_size):
+            batch = project_ids[index:index + batch_size]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'INSERT INTO {snapshot_table} (project_id, day, {", ".join(COUNTERS)}) '
+                f'SELECT id, %s, {", ".join(COUNTERS)} FROM {project_table} '
+                f'WHERE id IN ({placeholders}) '
+                f'ON CONFLICT (project_id, day) DO UPDATE SET {_excluded(COUNTERS)}',
+                [day_value, *batch],
+            )
+            _refresh_users(
+                cursor, connection, day,
+                f'user_id IN (SELECT user_id FROM {project_table} WHERE id IN ({placeholders}))',
+                batch,
+            )
+
+
+def refresh_user_snapshots(user_ids, day=None):
+    """Recompute the ``day`` (default today) rows of ``user_ids``, even without projects left."""
+    day = day or timezone.localdate()
+    for user_id in user_ids:
+        if not Project.objects.filter(user_id=user_id).exists():
+            UserSnapshot.objects.update_or_create(
+                user_id=user_id, day=day, defaults=dict.fromkeys(USER_COUNTERS, 0),
+            )
+            continue
+        using = router.db_for_write(UserSnapshot)
+        with connections[using].cursor() as cursor:
+            _refresh_users(cursor, connections[using], day, 'user_id = %s', [user_id])
+
+
+def apply_snapshot_delta(project_id, tasks, completed, overdue):
+    """Follow one counter change of ``projects.counters._bump()`` in today's rows.
+
+    Must run in the transaction of the change: the user's row is moved by
+    the deltas, and a concurrent first change of the day could otherwise
+    count them twice.
+    """
+    day = timezone.localdate()
+    using = router.db_for_write(ProjectSnapshot)
+    connection = connections[using]
+    project_table, snapshot_table, user_table = _tables(connection)
+    day_value = connection.ops.adapt_datefield_value(day)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {snapshot_table} (project_id, day, {", ".join(COUNTERS)}) '
+            f'SELECT id, %s, {", ".join(COUNTERS)} FROM {project_table} WHERE id = %s '
+            f'ON CONFLICT (project_id, day) DO UPDATE SET {_excluded(COUNTERS)}',
+            [day_value, project_id],
+        )
+        cursor.execute(
+            f'UPDATE {user_table} SET task_count = task_count + %s, '
+            'completed_count = completed_count + %s, overdue_count = overdue_count + %s '
+            f'WHERE day = %s AND user_id = (SELECT user_id FROM {project_table} WHERE id = %s)',
+            [tasks, completed, overdue, day_value, project_id],
+        )
+        if not cursor.rowcount:
+            _refresh_users(
+                cursor, connection, day,
+                f'user_id = (SELECT user_id FROM {project_table} WHERE id = %s)', [project_id],
+            )
+
+
+# Reading ---------------------------------------------------------------------
+
+def _period(snapshots, start, end):
+    """Snapshots of ``start``..``end``, plus the last one before ``start``: one range scan."""
+    before = snapshots.filter(day__lt=start).order_by('-day').values('day')[:1]
+    return snapshots.filter(day__gte=Coalesce(Subquery(before), start), day__lte=end).order_by('day')
+
+
+def _daily(snapshots, start, end, fields):
+    """One dict per day from ``start`` to ``end``, carrying the last snapshot over."""
+    rows = iter(snapshots)
+    pending = next(rows, None)
+    current = dict.fromkeys(fields, 0)
+    day = start
+    while day <= end:
+        while pending is not None and pending.day <= day:
+            current = {name: getattr(pending, name) for name in fields}
+            pending = next(rows, None)
+        yield {'day': day, **current}
+        day += timedelta(days=1)
+
+
+def burndown(project, start, end=None):
+    """Open, completed and overdue tasks of ``project`` per day, with the ideal line.
+
+    The ideal line goes from the open tasks at ``start`` to zero at the
+    project's deadline.
+    """
+    end = end or timezone.localdate()
+    days = list(_daily(
+        _period(ProjectSnapshot.objects.filter(project=project), start, end),
+        start, end, COUNTERS,
+    ))
+    initial = days[0]['task_count'] - days[0]['completed_count'] if days else 0
+    span = (project.deadline - start).days
+    for row in days:
+        row['open'] = row['task_count'] - row['completed_count']
+        remaining = (project.deadline - row['day']).days
+        row['ideal'] = round(initial * min(max(remaining / span, 0), 1), 1) if span > 0 else 0
+    return days
+
+
+def history(user, start, end=None):
+    """Totals of every project of ``user`` per day."""
+    end = end or timezone.localdate()
+    days = list(_daily(
+        _period(UserSnapshot.objects.filter(user=user), start, end),
+        start, end, USER_COUNTERS,
+    ))
+    for row in days:
+        row['open'] = row['task_count'] - row['completed_count']
+        row['progress'] = (
+            round(row['completed_count'] * 100 / row['task_count'], 1) if row['task_count'] else 0.0
+        )
+    return days
+
+
+def velocity(days):
+    """Tasks completed per ISO week in ``days`` (from ``history()``), net of reopened ones."""
+    weeks = {}
+    previous = None
+    for row in days:
+        year, week, _ = row['day'].isocalendar()
+        done = 0 if previous is None else max(row['completed_count'] - previous, 0)
+        weeks[f'{year}-W{week:02d}'] = weeks.get(f'{year}-W{week:02d}', 0) + done
+        previous = row['completed_count']
+    return [{'week': week, 'completed': completed} for week, completed in weeks.items()]
+
+
+# Backfill --------------------------------------------------------------------
+
+def _task_events(user_id, start, end):
+    """``{(project_id, day): [tasks, completed, overdue]}`` changes, from the task dates.
+
+    A task counts from the day it was created and, when completed, as
+    completed from the day of its last update. It is overdue from the day
+    after its deadline until it was completed. Changes before ``start`` are
+    folded into ``start``.
+    """
+    events = defaultdict(lambda: [0, 0, 0])
+
+    def add(project_id, day, index, value):
+        if day <= end:
+            events[project_id, max(day, start)][index] += value
+
+    tasks = Task.objects.filter(project__user_id=user_id).values_list(
+        'project_id', 'created_at', 'updated_at', 'deadline', 'is_completed'
+    )
+    for project_id, created_at, updated_at, deadline, is_completed in tasks.iterator(
+        chunk_size=BACKFILL_BATCH_SIZE
+    ):
+        created = timezone.localdate(created_at)
+        add(project_id, created, 0, 1)
+        completed = timezone.localdate(updated_at) if is_completed else None
+        if completed:
+            add(project_id, completed, 1, 1)
+        overdue_from = max(created, deadline + timedelta(days=1))
+        if completed is None or completed > overdue_from:
+            add(project_id, overdue_from, 2, 1)
+            if completed:
+                add(project_id, completed, 2, -1)
+    return events
+
+
+def backfill(user_id, start, end=None, batch_size=BACKFILL_BATCH_SIZE):
+    """Rebuild the snapshots of ``user_id`` from ``start`` to ``end`` (default yesterday).
+
+    Past states are reconstructed from the task dates (see ``_task_events()``);
+    progress without tasks and total time are only known as they are now.
+    Days already recorded are kept, so the backfill is meant to run once,
+    when the rollups are introduced. Today's rows are then refreshed from
+    the live counters. Returns the number of rows written.
+    """
+    end = end or timezone.localdate() - timedelta(days=1)
+    projects = {
+        pk: (timezone.localdate(created_at), progress, total_time)
+        for pk, created_at, progress, total_time in Project.objects.filter(user_id=user_id)
+        .values_list('pk', 'created_at', 'progress', 'total_time').iterator(chunk_size=batch_size)
+    }
+    events = _task_events(user_id, start, end)
+    for pk, (created, _, _) in projects.items():
+        if created <= end:
+            # The project counts from its creation, even without tasks yet
+            events[pk, max(created, start)]
+    by_project = defaultdict(list)
+    for (pk, day), delta in events.items():
+        if pk in projects:
+            by_project[pk].append((day, delta))
+
+    project_rows = []
+    user_deltas = defaultdict(lambda: [0, 0, 0, 0, 0.0])
+    for pk, changes in by_project.items():
+        created, progress, total_time = projects[pk]
+        user_delta = user_deltas[max(created, start)]
+        user_delta[0] += 1
+        user_delta[4] += total_time
+        totals = [0, 0, 0]
+        for day, delta in sorted(changes):
+            totals = [total + change for total, change in zip(totals, delta)]
+            for i, change in enumerate(delta, start=1):
+                user_deltas[day][i] += change
+            project_rows.append(ProjectSnapshot(
+                project_id=pk, day=day, task_count=totals[0], completed_count=totals[1],
+                overdue_count=totals[2], total_time=total_time,
+                progress=round(totals[1] * 100 / totals[0], 1) if totals[0] else progress,
+            ))
+
+    user_rows = []
+    totals = [0, 0, 0, 0, 0.0]
+    for day in sorted(user_deltas):
+        totals = [total + change for total, change in zip(totals, user_deltas[day])]
+        user_rows.append(UserSnapshot(
+            user_id=user_id, day=day, **dict(zip(USER_COUNTERS, totals)),
+        ))
+
+    with transaction.atomic(using=router.db_for_write(ProjectSnapshot)):
+        ProjectSnapshot.objects.bulk_create(project_rows, batch_size=batch_size, ignore_conflicts=True)
+        UserSnapshot.objects.bulk_create(user_rows, batch_size=batch_size, ignore_conflicts=True)
+    refresh_project_snapshots(projects)
+    refresh_user_snapshots([user_id])
+    return len(project_rows) + len(user_rows)
+
+
+def backfill_users():
+    """Ids of the users with projects on the current shard."""
+    return list(Project.objects.order_by('user_id').values_list('user_id', flat=True).distinct())
@@ -0,0 +1,108 @@
+"""Database routing: tenant shards and the read connection of read-only views.
+
+``ShardRouter`` sends ``Project`` and ``Task`` queries to the shard of the
+current tenant when sharding is enabled (see ``projects.sharding``). It
+comes first in ``DATABASE_ROUTERS`` and leaves the tenants of ``default``
+to ``ReadOnlyViewRouter``.
+
+Views wrapped in ``read_only_view`` run their reads on the ``replica``
+database alias: a second connection to the same SQLite file, opened with
+``query_only`` (see ``DATABASES`` in the settings). In WAL mode readers never
+wait for the writer, so list and detail pages keep being served while
+``project_update`` or a worker holds the write lock. Everything else,
+including every write, stays on ``default``.
+
+Reads made while ``default`` has a transaction open stay on ``default`` too,
+since they must see that transaction's own changes. This also keeps
+``TestCase``, which wraps every test in a transaction, on a single
+connection.
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .sharding import SHARDED_MODELS, current_shard, shard_aliases, shard_for_user, sharding_enabled
+
+# Shared with default; never holds tenants
+CENTRAL_MODELS = {'job', 'shardplacement', 'changeevent'}
+READ_ALIAS = 'replica'
+
+_read_only = ContextVar('read_only', default=False)
+
+
+def read_only_view(view):
+    """Route the ORM reads made while ``view`` runs to the read connection."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _read_only.set(True)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_only.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
+
+
+class ShardRouter:
+    def _shard(self, model, hints):
+        if not sharding_enabled() or model._meta.label_lower not in SHARDED_MODELS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None:
+            if instance._meta.label_lower not in SHARDED_MODELS:
+                # Related manager of a user: user.project_set
+                return shard_for_user(instance.pk)
+            if instance._state.db:
+                return instance._state.db
+            shard = current_shard()
+            if shard is None and getattr(instance, 'user_id', None):
+                shard = shard_for_user(instance.user_id)
+            return shard
+        return current_shard()
+
+    def db_for_read(self, model, **hints):
+        shard = self._shard(model, hints)
+        # Tenants of default may still be read from the replica
+        return None if shard == DEFAULT_DB_ALIAS else shard
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not sharding_enabled() or db == DEFAULT_DB_ALIAS or db not in shard_aliases():
+            return None
+        return app_label == 'projects' and model_name not in CENTRAL_MODELS
+
+
+class ReadOnlyViewRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            _read_only.get()
+            and READ_ALIAS in settings.DATABASES
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return READ_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Objects read from the replica must still be saved through default
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same database, or a project and its owner on different shards
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != READ_ALIAS
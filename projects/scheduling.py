@@ -0,0 +1,187 @@
+"""Task deadline rescheduling.
+
+When a project's deadline moves, its open tasks are spread again over the
+window between today and the new deadline, higher priority tasks first.
+Tasks linked by dependencies get their latest finish instead, the date after
+which the project deadline slips (see ``projects.dependencies``). The
+new dates are computed for the whole project in memory (vectorized with NumPy
+when it is installed) and written back with batched set-based UPDATEs inside a
+single transaction, instead of one ``save()`` per task. Like ``projects.bulk``,
+that transaction also reconciles the counters, publishes a ``tasks.rescheduled``
+event and bumps the owner's cache version.
+
+``plan_task_deadlines()`` is side-effect free and can be used as a dry run;
+``apply_plan()`` persists a plan.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from django.db import router, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .cache import bump_user_version
+from .counters import reconcile_task_counters
+from .events import publish
+from .models import Project, Task, TaskDependency
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+# Priority weighting: high=3, medium=2, low=1
+PRIORITY_WEIGHTS = {'high': 3, 'medium': 2, 'low': 1}
+DEFAULT_WEIGHT = 2
+# Stays below SQLite's default limit of 999 bound parameters per statement
+UPDATE_BATCH_SIZE = 900
+
+
+@dataclass(frozen=True)
+class PlannedChange:
+    task_id: int
+    old_deadline: date
+    new_deadline: date
+
+
+@dataclass
+class ReschedulePlan:
+    project_id: int
+    changes: list = field(default_factory=list)
+    overdue_count: int = 0
+
+    @property
+    def updated_count(self):
+        return len(self.changes)
+
+    def as_dict(self):
+        return {
+            'project': self.project_id,
+            'updated_count': self.updated_count,
+            'overdue_count': self.overdue_count,
+            'changes': [
+                {
+                    'task': change.task_id,
+                    'old_deadline': change.old_deadline.isoformat(),
+                    'new_deadline': change.new_deadline.isoformat(),
+                }
+                for change in self.changes
+            ],
+        }
+
+
+def _offsets_python(weights, total_days):
+    total_weight = sum(weights)
+    offsets = []
+    cumulative = 0
+    for weight in weights:
+        cumulative += weight
+        offsets.append(round(cumulative / total_weight * total_days))
+    return offsets
+
+
+def _offsets_numpy(weights, total_days):
+    weights = np.asarray(weights, dtype=np.float64)
+    positions = np.cumsum(weights) / weights.sum()
+    # np.rint rounds half to even, exactly like the built-in round()
+    return np.rint(positions * total_days).astype(np.int64)
+
+
+def compute_deadlines(priorities, project_deadline, today=None):
+    """Return the new deadline of each task, given their priorities in order.
+
+    Tasks are laid out over ``[today, project_deadline]`` so that each one
+    ends at its cumulative share of the priority weights. A deadline already
+    in the past collapses the window and every task lands on it.
+    """
+    today = today or date.today()
+    end = max(project_deadline, today)
+    total_days = (end - today).days
+    weights = [PRIORITY_WEIGHTS.get(priority, DEFAULT_WEIGHT) for priority in priorities]
+    if not weights:
+        return []
+
+    if np is not None:
+        offsets = _offsets_numpy(weights, total_days)
+        deadlines = np.datetime64(today, 'D') + offsets
+        deadlines = np.minimum(deadlines, np.datetime64(project_deadline, 'D'))
+        return deadlines.astype(object).tolist()
+
+    return [
+        min(today + timedelta(days=offset), project_deadline)
+        for offset in _offsets_python(weights, total_days)
+    ]
+
+
+def plan_task_deadlines(project, today=None):
+    """Compute, without writing anything, how the open tasks would be rescheduled."""
+    today = today or date.today()
+    linked = TaskDependency.objects.filter(Q(predecessor=OuterRef('pk')) | Q(successor=OuterRef('pk')))
+    rows = list(
+        Task.objects.filter(project=project, is_completed=False)
+        .order_by('deadline', 'created_at')
+        .values_list('pk', 'deadline', 'priority', 'after_days', Exists(linked))
+    )
+    plan = ReschedulePlan(project.pk)
+    if not rows:
+        return plan
+
+    spread = [row for row in rows if not row[4]]
+    spread_deadlines = dict(zip(
+        [row[0] for row in spread],
+        compute_deadlines([row[2] for row in spread], project.deadline, today),
+    ))
+    for pk, old_deadline, _, after_days, is_linked in rows:
+        if is_linked:
+            new_deadline = project.deadline - timedelta(days=after_days)
+        else:
+            new_deadline = spread_deadlines[pk]
+        if new_deadline != old_deadline:
+            plan.changes.append(PlannedChange(pk, old_deadline, new_deadline))
+        if new_deadline < today:
+            plan.overdue_count += 1
+    return plan
+
+
+def apply_plan(plan, batch_size=UPDATE_BATCH_SIZE):
+    """Persist ``plan`` in a single transaction with set-based UPDATEs.
+
+    Rescheduled tasks share a handful of distinct dates (at most one per day
+    of the window), so the changes are grouped by new deadline and written as
+    ``UPDATE ... SET deadline = %s WHERE id IN (...)`` in batches of
+    ``batch_size`` ids. This is much cheaper than ``bulk_update()``, whose
+    ``CASE WHEN id = ...`` expression grows with every row.
+    """
+    if not plan.changes:
+        return plan
+    by_deadline = defaultdict(list)
+    for change in plan.changes:
+        by_deadline[change.new_deadline].append(change.task_id)
+    now = timezone.now()
+    using = router.db_for_write(Task)
+    with transaction.atomic(using=using):
+        for deadline, task_ids in by_deadline.items():
+            for start in range(0, len(task_ids), batch_size):
+                Task.objects.filter(pk__in=task_ids[start:start + batch_size]).update(
+                    deadline=deadline, updated_at=now
+                )
+        # QuerySet.update() bypasses the signals maintaining the project counters,
+        # the cached lists and the live pages
+        reconcile_task_counters(Project.objects.filter(pk=plan.project_id))
+        user_id = Project.all_objects.filter(pk=plan.project_id).values_list('user_id', flat=True).first()
+        publish(user_id, {
+            'type': 'tasks.rescheduled', 'project': plan.project_id, 'count': plan.updated_count,
+        }, using)
+        # Even when no counter drifted: the task deadlines shown changed
+        if user_id is not None:
+            bump_user_version(user_id, using=using)
+    return plan
+
+
+def recalculate_task_deadlines(project, dry_run=False):
+    """Reschedule the open tasks of ``project`` and return the ``ReschedulePlan``."""
+    plan = plan_task_deadlines(project)
+    if not dry_run:
+        apply_plan(plan)
+    return plan
@@ -0,0 +1,261 @@
+"""Full-text search over projects and their tasks.
+
+The search index is reached through a small backend interface so the storage
+can follow the database: SQLite gets an FTS5 virtual table, and any other
+vendor falls back to ``icontains`` filtering until a native backend (for
+example a Postgres ``tsvector`` one) is plugged in through the
+``PROJECTS_SEARCH_BACKEND`` setting.
+
+The index is kept in sync by the receivers in ``projects.signals``.
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, connections, router
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.module_loading import import_string
+
+# Private-use sentinels wrapped around matches by FTS5; they survive HTML
+# escaping untouched and are swapped for <mark> tags afterwards.
+_MARK_START = '\ue000'
+_MARK_END = '\ue001'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+@dataclass
+class SearchHit:
+    project_id: int
+    rank: float
+    snippet: str | None = None
+
+
+class BaseSearchBackend:
+    """Interface every search backend implements."""
+
+    def index_project(self, project):
+        pass
+
+    def remove_project(self, project):
+        pass
+
+    def index_task(self, task):
+        pass
+
+    def remove_task(self, task):
+        pass
+
+    def index_bulk(self, user_id, projects=(), tasks=()):
+        """Index new rows of ``user_id`` saved without signals (``bulk_create``)."""
+        for project in projects:
+            self.index_project(project)
+        for task in tasks:
+            self.index_task(task)
+
+    def remove_tasks(self, task_ids):
+        """Unindex tasks deleted without signals (``projects.bulk``)."""
+        from .models import Task
+
+        for pk in task_ids:
+            self.remove_task(Task(pk=pk))
+
+    def move_tasks(self, task_ids, project_id):
+        """Reindex tasks moved to ``project_id`` without signals (``projects.bulk``)."""
+        from .models import Task
+
+        for task in Task.objects.filter(pk__in=task_ids).select_related('project'):
+            self.index_task(task)
+
+    def search(self, user, query, limit=200):
+        """Return up to ``limit`` ``SearchHit`` for ``user``, best match first."""
+        raise NotImplementedError
+
+
+class IcontainsSearchBackend(BaseSearchBackend):
+    """Unindexed fallback used when no full-text engine is available."""
+
+    def search(self, user, query, limit=200):
+        from .models import Project
+
+        project_ids = (
+            Project.objects.filter(user=user)
+            .filter(
+                Q(title__icontains=query)
+                | Q(description__icontains=query)
+                | Q(tasks__title__icontains=query)
+                | Q(tasks__description__icontains=query)
+            )
+            .values_list('pk', flat=True)
+            .distinct()[:limit]
+        )
+        return [SearchHit(pk, 0.0) for pk in project_ids]
+
+
+class SQLiteFTS5SearchBackend(BaseSearchBackend):
+    """FTS5 index holding one row per project and one per task.
+
+    Row ids are derived from the primary keys (``2 * pk`` for projects,
+    ``2 * pk + 1`` for tasks) so updates and deletes address a single row.
+    The owner is stored as an indexed ``u<user_id>`` token, which lets FTS5
+    intersect the user's posting list with the query terms instead of
+    filtering matches afterwards.
+    """
+
+    table = 'projects_search'
+    snippet_tokens = 12
+
+    @staticmethod
+    def _cursor(instance=None):
+        """Cursor on the database of ``instance``, or of the current tenant's projects."""
+        from .models import Project
+
+        alias = instance._state.db if instance is not None else None
+        return connections[alias or router.db_for_write(Project)].cursor()
+
+    def _upsert(self, instance, rowid, title, body, user_id, project_id):
+        with self._cursor(instance) as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [rowid])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, body, owner, project_id) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [rowid, title, body, f'u{user_id}', project_id],
+            )
+
+    def _delete(self, instance, rowid):
+        with self._cursor(instance) as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [rowid])
+
+    def index_project(self, project):
+        self._upsert(project, 2 * project.pk, project.title, project.description,
+                     project.user_id, project.pk)
+
+    def remove_project(self, project):
+        self._delete(project, 2 * project.pk)
+
+    def index_task(self, task):
+        self._upsert(task, 2 * task.pk + 1, task.title, task.description,
+                     self._owner_id(task), task.project_id)
+
+    @staticmethod
+    def _owner_id(task):
+        """Owner of ``task``, without loading its whole project row on every save."""
+        from .models import Project, Task
+
+        if Task.project.is_cached(task):
+            return task.project.user_id
+        return (
+            Project.all_objects.using(task._state.db).filter(pk=task.project_id)
+            .values_list('user_id', flat=True).first()
+        )
+
+    def remove_task(self, task):
+        self._delete(task, 2 * task.pk + 1)
+
+    def index_bulk(self, user_id, projects=(), tasks=()):
+        owner = f'u{user_id}'
+        rows = [(2 * p.pk, p.title, p.description, owner, p.pk) for p in projects]
+        rows += [(2 * t.pk + 1, t.title, t.description, owner, t.project_id) for t in tasks]
+        with self._cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, title, body, owner, project_id) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove_tasks(self, task_ids):
+        with self._cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [(2 * pk + 1,) for pk in task_ids]
+            )
+
+    def move_tasks(self, task_ids, project_id):
+        # Same owner: only the project column of the rows changes
+        with self._cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {self.table} SET project_id = %s WHERE rowid = %s',
+                [(project_id, 2 * pk + 1) for pk in task_ids],
+            )
+
+    def rebuild(self):
+        """Re-index every project and task (of the current shard) from scratch."""
+        with self._cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, body, owner, project_id) '
+                "SELECT id * 2, title, description, 'u' || user_id, id "
+                'FROM projects_project'
+            )
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, body, owner, project_id) '
+                "SELECT t.id * 2 + 1, t.title, t.description, 'u' || p.user_id, t.project_id "
+                'FROM projects_task t JOIN projects_project p ON p.id = t.project_id'
+            )
+
+    @staticmethod
+    def build_match(user, query):
+        """Turn free text into an FTS5 expression: every word as a prefix, ANDed.
+
+        The words only match the title and body: unrestricted, ``u`` or
+        ``u1`` would match the owner token of every row.
+        """
+        terms = ' '.join(f'"{token}"*' for token in _TOKEN_RE.findall(query))
+        if not terms:
+            return None
+        return f'owner : "u{user.pk}" AND {{title body}} : ({terms})'
+
+    def search(self, user, query, limit=200):
+        match = self.build_match(user, query)
+        if match is None:
+            return []
+        # A project can match through several of its tasks; over-fetch rows
+        # and keep the best one per project.
+        with self._cursor() as cursor:
+            cursor.execute(
+                f'SELECT project_id, rank, '
+                f'highlight({self.table}, 0, %s, %s), '
+                f"snippet({self.table}, 1, %s, %s, '…', %s) "
+                f'FROM {self.table} '
+                f"WHERE {self.table} MATCH %s AND rank MATCH 'bm25(10.0, 1.0, 0.0, 0.0)' "
+                'ORDER BY rank LIMIT %s',
+                [_MARK_START, _MARK_END, _MARK_START, _MARK_END,
+                 self.snippet_tokens, match, limit * 4],
+            )
+            rows = cursor.fetchall()
+
+        hits = {}
+        for project_id, rank, title, body in rows:
+            if project_id in hits:
+                continue
+            fragment = body if _MARK_START in body else title
+            hits[project_id] = SearchHit(project_id, rank, _render_snippet(fragment))
+            if len(hits) >= limit:
+                break
+        return list(hits.values())
+
+
+def _render_snippet(fragment):
+    return mark_safe(
+        escape(fragment)
+        .replace(_MARK_START, '<mark>')
+        .replace(_MARK_END, '</mark>')
+    )
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_search_backend():
+    """Return the configured backend, defaulting to FTS5 on SQLite."""
+    path = getattr(settings, 'PROJECTS_SEARCH_BACKEND', None)
+    if path is None:
+        if connection.vendor == 'sqlite':
+            path = 'projects.search.SQLiteFTS5SearchBackend'
+        else:
+            path = 'projects.search.IcontainsSearchBackend'
+    return _load_backend(path)
@@ -0,0 +1,477 @@
+"""Per-user sharding of projects and tasks.
+
+Every query of the app is scoped to one user, so the projects and tasks of a
+user (a *tenant*) can live in their own database while auth, sessions and
+the job queue stay on ``default``. The database aliases holding tenants are
+listed in the ``PROJECTS_SHARDS`` setting; with a single alias (the default)
+sharding is off and nothing below has any effect.
+
+* New users are placed on a shard by consistent hashing of their id
+  (``HashRing``), and the placement is recorded in ``ShardPlacement`` on
+  ``default``. Users without a placement (created before sharding was
+  enabled) live on ``default``.
+* ``TenantShardMiddleware`` (and ``projects.jobs`` for background jobs) sets
+  the current tenant's shard for the duration of a request; ``ShardRouter``
+  in ``projects.routers`` then sends every ``Project``/``Task`` query there,
+  so the views need no changes.
+* Adding a shard to the ring only affects new users. ``manage.py
+  rebalance_shards`` moves the existing tenants whose hashed shard changed
+  with ``move_tenant()``, one tenant at a time, in short batches.
+
+Primary keys are kept when a tenant moves (URLs and job payloads stay
+valid), so each shard allocates ids from its own range of
+``SHARD_ID_SPAN`` ids, reserved when it is migrated.
+"""
+import bisect
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .cache import bump_user_version, get_cache
+
+VIRTUAL_NODES = 128
+SHARD_ID_SPAN = 10 ** 12
+# Stays below SQLite's default limit of 999 bound parameters per statement
+COPY_BATCH_SIZE = 900
+# Models stored on the tenant's shard; everything else stays on default
+SHARDED_MODELS = {
+    'projects.project', 'projects.task', 'projects.projectsnapshot', 'projects.usersnapshot',
+    'projects.timeentry', 'projects.timer', 'projects.taskdependency',
+}
+
+_current_shard = ContextVar('current_shard', default=None)
+
+
+def shard_aliases():
+    return list(getattr(settings, 'PROJECTS_SHARDS', None) or [DEFAULT_DB_ALIAS])
+
+
+def sharding_enabled():
+    return len(shard_aliases()) > 1
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes.
+
+    Each node is hashed at ``virtual_nodes`` points of the ring and a key
+    belongs to the first point after its own hash. Adding a node only moves
+    the keys that now fall on its points, about ``1 / len(nodes)`` of them.
+    """
+
+    def __init__(self, nodes, virtual_nodes=VIRTUAL_NODES):
+        points = sorted(
+            (self._hash(f'{node}#{i}'), node) for node in nodes for i in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    @staticmethod
+    def _hash(value):
+        digest = hashlib.md5(str(value).encode(), usedforsecurity=False).digest()
+        return int.from_bytes(digest[:8], 'big')
+
+    def node_for(self, key):
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+@lru_cache
+def _ring(aliases):
+    return HashRing(aliases)
+
+
+def hashed_shard(user_id):
+    """Shard the ring assigns to ``user_id``, whatever its current placement."""
+    return _ring(tuple(shard_aliases())).node_for(user_id)
+
+
+def _placement_key(user_id):
+    return f'projects:shard:{user_id}'
+
+
+def shard_for_user(user_id):
+    """Alias of the database holding the projects of ``user_id``."""
+    if not sharding_enabled():
+        return DEFAULT_DB_ALIAS
+    from .models import ShardPlacement
+
+    cache = get_cache()
+    alias = cache.get(_placement_key(user_id))
+    if alias is None:
+        alias = (
+            ShardPlacement.objects.using(DEFAULT_DB_ALIAS)
+            .filter(user_id=user_id).values_list('alias', flat=True).first()
+        ) or DEFAULT_DB_ALIAS
+        cache.set(_placement_key(user_id), alias, None)
+    return alias
+
+
+def place_user(user_id, alias=None):
+    """Record that the projects of ``user_id`` live on ``alias`` (default: hashed)."""
+    from .models import ShardPlacement
+
+    alias = alias or hashed_shard(user_id)
+    ShardPlacement.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        user_id=user_id, defaults={'alias': alias}
+    )
+    # Not before the commit: a request could cache the old placement again
+    transaction.on_commit(
+        lambda: get_cache().delete(_placement_key(user_id)), using=DEFAULT_DB_ALIAS
+    )
+    return alias
+
+
+# Current shard -------------------------------------------------------------
+
+def current_shard():
+    return _current_shard.get()
+
+
+@contextmanager
+def use_shard(alias):
+    """Route the Project/Task queries made inside the block to ``alias``."""
+    token = _current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_shard.reset(token)
+
+
+def tenant(user_id):
+    """``use_shard()`` for the shard of ``user_id``."""
+    return use_shard(shard_for_user(user_id))
+
+
+def on_each_shard(func, *args, **kwargs):
+    """Call ``func`` once per shard with its queries routed there; return the results."""
+    results = []
+    for alias in shard_aliases():
+        with use_shard(alias):
+            results.append(func(*args, **kwargs))
+    return results
+
+
+def bind_context(iterable):
+    """Iterate ``iterable`` in the current context, even once it has been left.
+
+    Streaming responses are consumed after the view (and the middleware)
+    returned, so their queries would otherwise lose the tenant's shard.
+    """
+    context = copy_context()
+    iterator = iter(iterable)
+    done = object()
+
+    def run():
+        while (item := context.run(next, iterator, done)) is not done:
+            yield item
+
+    return run()
+
+
+class TenantShardMiddleware:
+    """Route the queries of an authenticated request to its user's shard."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not sharding_enabled() or not request.user.is_authenticated:
+            return self.get_response(request)
+        with tenant(request.user.pk):
+            response = self.get_response(request)
+            if response.streaming:
+                response.streaming_content = bind_context(response.streaming_content)
+        return response
+
+    async def __acall__(self, request):
+        if not sharding_enabled() or not (await request.auser()).is_authenticated:
+            return await self.get_response(request)
+        with use_shard(await sync_to_async(shard_for_user)(request.user.pk)):
+            response = await self.get_response(request)
+            if response.streaming and not response.is_async:
+                response.streaming_content = bind_context(response.streaming_content)
+        return response
+
+
+# Shard maintenance ---------------------------------------------------------
+
+def reserve_id_range(alias):
+    """Make the sharded tables of ``alias`` allocate ids from its own range.
+
+    The alias at index ``n`` of ``PROJECTS_SHARDS`` starts at
+    ``n * SHARD_ID_SPAN``, the first one keeps starting at 1. Safe to run
+    again: a sequence is only ever raised.
+    """
+    if alias not in shard_aliases() or connections[alias].vendor != 'sqlite':
+        return
+    start = shard_aliases().index(alias) * SHARD_ID_SPAN
+    if not start:
+        return
+    with connections[alias].cursor() as cursor:
+        for model in map(apps.get_model, sorted(SHARDED_MODELS)):
+            table = model._meta.db_table
+            cursor.execute(
+                'INSERT INTO sqlite_sequence (name, seq) SELECT %s, 0 '
+                'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+                [table, table],
+            )
+            cursor.execute(
+                'UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s',
+                [start, table, start],
+            )
+
+
+def _tenant_tables(user_id, alias):
+    """``(model, where, params)`` selecting the rows of ``user_id``, parents first."""
+    from .models import Project, ProjectSnapshot, Task, TaskDependency, TimeEntry, Timer, UserSnapshot
+
+    quote = connections[alias].ops.quote_name
+    project_table = quote(Project._meta.db_table)
+    task_table = quote(Task._meta.db_table)
+    in_projects = f'project_id IN (SELECT id FROM {project_table} WHERE user_id = %s)'
+    in_tasks = (
+        f'task_id IN (SELECT t.id FROM {task_table} t JOIN {project_table} p '
+        f'ON p.id = t.project_id WHERE p.user_id = %s)'
+    )
+    return [
+        (Project, 'user_id = %s', [user_id]),
+        (Task, in_projects, [user_id]),
+        (TaskDependency, in_projects, [user_id]),
+        (ProjectSnapshot, in_projects, [user_id]),
+        (UserSnapshot, 'user_id = %s', [user_id]),
+        (TimeEntry, in_tasks, [user_id]),
+        (Timer, 'user_id = %s', [user_id]),
+    ]
+
+
+def _columns(model):
+    # Generated columns are computed again by the target; the primary key comes first
+    fields = [field for field in model._meta.concrete_fields if not field.generated]
+    fields.sort(key=lambda field: not field.primary_key)
+    return fields
+
+
+def _fetch(model, where, params, alias, after, limit=None, until=None):
+    """Rows of ``model`` matching ``where`` on ``alias`` by primary key, above ``after``.
+
+    At most ``limit`` rows, or every row up to ``until`` included.
+    """
+    quote = connections[alias].ops.quote_name
+    columns = ', '.join(quote(field.column) for field in _columns(model))
+    pk = quote(model._meta.pk.column)
+    sql = f'SELECT {columns} FROM {quote(model._meta.db_table)} WHERE ({where}) AND {pk} > %s'
+    params = [*params, after]
+    if until is not None:
+        sql += f' AND {pk} <= %s'
+        params.append(until)
+    sql += f' ORDER BY {pk}'
+    if limit is not None:
+        sql += f' LIMIT {int(limit)}'
+    # Outside a transaction, reading never takes the write lock
+    with connections[alias].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _insert(model, rows, alias):
+    quote = connections[alias].ops.quote_name
+    fields = _columns(model)
+    columns = ', '.join(quote(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    with connections[alias].cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})', rows
+        )
+
+
+def _copy_rows(model, where, params, source, target, copied, user_id, batch_size):
+    """Copy the rows of ``model`` matching ``where`` verbatim from ``source`` to ``target``.
+
+    Each batch is read from ``source`` without a transaction and written, and
+    indexed for search, in its own short transaction on ``target``. Rows
+    whose parent (a project or task, per ``copied``) was not copied, because
+    it was created meanwhile, are left to ``_sync_rows()``. The ids copied
+    are added to ``copied``.
+    """
+    parents = [
+        (index, copied[field.related_model])
+        for index, field in enumerate(_columns(model))
+        if field.is_relation and field.related_model in copied
+    ]
+    ids = copied.setdefault(model, set())
+    after = 0
+    while rows := _fetch(model, where, params, source, after, batch_size):
+        after = rows[-1][0]
+        rows = [row for row in rows if all(row[index] in known for index, known in parents)]
+        with transaction.atomic(using=target):
+            _insert(model, rows, target)
+            _index(model, [row[0] for row in rows], target, user_id, batch_size)
+        ids.update(row[0] for row in rows)
+    return len(ids)
+
+
+def _changed_rows(model, where, params, source, target, batch_size):
+    """Compare the rows of ``model`` on ``source`` and ``target``.
+
+    Returns ``(missing, changed, removed)``: the source rows absent from or
+    different on ``target``, and the ids of the ``target`` rows gone from
+    ``source``.
+    """
+    missing, changed, removed = [], [], []
+    after = 0
+    while True:
+        rows = _fetch(model, where, params, source, after, batch_size)
+        # Past the last batch, every remaining row of target
+        last = rows[-1][0] if len(rows) == batch_size else None
+        copies = {row[0]: row for row in _fetch(model, where, params, target, after, until=last)}
+        for row in rows:
+            copy = copies.pop(row[0], None)
+            if copy is None:
+                missing.append(row)
+            elif copy != row:
+                changed.append(row)
+        removed.extend(copies)
+        if last is None:
+            return missing, changed, removed
+        after = last
+
+
+def _delete_ids(model, ids, alias, batch_size):
+    quote = connections[alias].ops.quote_name
+    table, pk = quote(model._meta.db_table), quote(model._meta.pk.column)
+    ids = list(ids)
+    with connections[alias].cursor() as cursor:
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {pk} IN ({", ".join(["%s"] * len(chunk))})', chunk
+            )
+
+
+def _unindex(model, ids, alias):
+    from .models import Project, Task
+    from .search import get_search_backend
+
+    backend = get_search_backend()
+    with use_shard(alias):
+        if model is Task:
+            backend.remove_tasks(ids)
+        elif model is Project:
+            for pk in ids:
+                backend.remove_project(Project(pk=pk))
+
+
+def _index(model, ids, alias, user_id, batch_size):
+    from .models import Project, Task
+    from .search import get_search_backend
+
+    if model not in (Project, Task):
+        return
+    fields = ('title', 'description') if model is Project else ('project_id', 'title', 'description')
+    kind = 'projects' if model is Project else 'tasks'
+    ids = list(ids)
+    with use_shard(alias):
+        for start in range(0, len(ids), batch_size):
+            rows = model._base_manager.filter(pk__in=ids[start:start + batch_size]).only(*fields)
+            get_search_backend().index_bulk(user_id, **{kind: rows})
+
+
+def _sync_rows(user_id, source, target, batch_size):
+    """Bring the copy of ``user_id`` on ``target`` up to date with ``source``.
+
+    Removed rows go first, children before parents, then changed and new
+    rows, parents first. Returns the number of rows added less removed.
+    """
+    tables = _tenant_tables(user_id, source)
+    diffs = [_changed_rows(*table, source, target, batch_size) for table in tables]
+    delta = 0
+    for (model, _, _), (_, _, removed) in reversed(list(zip(tables, diffs))):
+        _unindex(model, removed, target)
+        _delete_ids(model, removed, target, batch_size)
+        delta -= len(removed)
+    for (model, _, _), (missing, changed, _) in zip(tables, diffs):
+        _unindex(model, [row[0] for row in changed], target)
+        _delete_ids(model, [row[0] for row in changed], target, batch_size)
+        _insert(model, changed + missing, target)
+        _index(model, [row[0] for row in changed + missing], target, user_id, batch_size)
+        delta += len(missing)
+    return delta
+
+
+def _delete_tenant(user_id, alias, batch_size=COPY_BATCH_SIZE):
+    """Remove the rows of ``user_id`` from ``alias`` and its search index.
+
+    Like ``deletion.purge_project()``: raw DELETEs of ``batch_size`` rows,
+    each batch in its own short transaction, children before parents, no
+    model loaded and no signal sent.
+    """
+    removed = 0
+    for model, where, params in reversed(_tenant_tables(user_id, alias)):
+        while ids := [row[0] for row in _fetch(model, where, params, alias, 0, batch_size)]:
+            with transaction.atomic(using=alias):
+                _unindex(model, ids, alias)
+                _delete_ids(model, ids, alias, batch_size)
+            removed += len(ids)
+    return removed
+
+
+def move_tenant(user_id, target, batch_size=COPY_BATCH_SIZE):
+    """Move the projects, tasks, dependencies, time and snapshots of ``user_id`` to the shard ``target``.
+
+    Rows are copied as stored (same primary keys, timestamps and counters)
+    ``batch_size`` at a time: the source is read without a transaction and
+    each batch is written, and indexed for search, in its own short
+    transaction on ``target``, so the source shard keeps serving writes
+    meanwhile. A last pass then writes to ``target`` what changed on the
+    source during the copy and switches the placement, in one transaction
+    per database. Shards begin their transactions with ``BEGIN IMMEDIATE``
+    (see ``SQLITE_OPTIONS``): the source shard's writers only wait for that
+    pass, and requests see the tenant on the source until the placement
+    switches to a complete copy. The rows are then deleted from the source
+    in batches, without signals: nothing changed for the tenant.
+
+    Returns the number of rows moved; a primary key already used on
+    ``target`` raises ``IntegrityError`` and leaves the tenant on the source.
+    """
+    source = shard_for_user(user_id)
+    if source == target:
+        return 0
+    # Left over by an interrupted move
+    _delete_tenant(user_id, target, batch_size)
+    copied = {}
+    try:
+        moved = 0
+        for model, where, params in _tenant_tables(user_id, source):
+            moved += _copy_rows(model, where, params, source, target, copied, user_id, batch_size)
+        with transaction.atomic(using=source), transaction.atomic(using=DEFAULT_DB_ALIAS), \
+                transaction.atomic(using=target):
+            moved += _sync_rows(user_id, source, target, batch_size)
+            place_user(user_id, target)
+    except Exception:
+        _delete_tenant(user_id, target, batch_size)
+        raise
+    _delete_tenant(user_id, source, batch_size)
+    bump_user_version(user_id)
+    return moved
+
+
+def misplaced_tenants(user_ids):
+    """Yield ``(user_id, current, hashed)`` for the users not on their hashed shard."""
+    for user_id in user_ids:
+        current, hashed = shard_for_user(user_id), hashed_shard(user_id)
+        if current != hashed:
+            yield user_id, current, hashed
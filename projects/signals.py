@@ -0,0 +1,216 @@
+"""Model signal receivers for the projects app."""
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .auth import bump_auth_version
+from .cache import bump_user_version
+from .counters import apply_task_counter_change, reconcile_task_counters
+from .dependencies import detach_tasks, reschedule_tasks
+from .events import publish
+from .models import Project, Task, UserSnapshot
+from .rollups import refresh_project_snapshots, refresh_user_snapshots
+from .search import get_search_backend
+from .timetracking import discount_task_time, transfer_task_time
+from .sharding import place_user, reserve_id_range, shard_for_user, sharding_enabled, use_shard
+
+
+@receiver(post_save, sender=Project)
+def index_project(sender, instance, **kwargs):
+    get_search_backend().index_project(instance)
+
+
+@receiver(post_delete, sender=Project)
+def unindex_project(sender, instance, **kwargs):
+    get_search_backend().remove_project(instance)
+
+
+@receiver(post_save, sender=Task)
+def index_task(sender, instance, **kwargs):
+    get_search_backend().index_task(instance)
+
+
+@receiver(post_delete, sender=Task)
+def unindex_task(sender, instance, **kwargs):
+    get_search_backend().remove_task(instance)
+
+
+def _deleted_with_project(origin):
+    """True when the task is removed by the cascade of its project's deletion."""
+    return isinstance(origin, Project) or getattr(origin, 'model', None) is Project
+
+
+@receiver(post_save, sender=Task)
+def update_task_counters(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    today = timezone.now().date()
+    new = instance.counted_state(today)
+    old = None if created else instance.loaded_counted_state(today)
+    if old is not None and new is not None and old[0] != new[0]:
+        # La tâche change de projet: son temps passé la suit
+        transfer_task_time(instance.time_spent, old[0], new[0])
+    if new is None or (old is None and not created):
+        # Previous (or current) state unknown: recount the project instead
+        reconcile_task_counters(Project.objects.filter(pk=instance.project_id))
+        instance._counter_deltas = {}
+    else:
+        instance._counter_deltas = apply_task_counter_change(old, new)
+    instance._counted_fields = instance.counted_fields()
+
+
+@receiver(post_delete, sender=Task)
+def discount_deleted_task(sender, instance, origin=None, **kwargs):
+    if _deleted_with_project(origin):
+        return
+    discount_task_time(instance.time_spent, instance.project_id)
+    state = instance.loaded_counted_state() or instance.counted_state()
+    instance._counter_deltas = apply_task_counter_change(state, None)
+
+
+@receiver(post_save, sender=Task)
+def reschedule_task(sender, instance, created, using, raw=False, **kwargs):
+    """Keep the dependency lengths up to date (see projects.dependencies)."""
+    new = instance.scheduled_state()
+    old = getattr(instance, '_scheduled_state', None)
+    instance._scheduled_state = new
+    # A new task has no dependency yet
+    if raw or created or (old is not None and old == new):
+        return
+    if old is not None and new is not None and old[0] != new[0]:
+        # Les dépendances ne franchissent pas les projets
+        detach_tasks([instance.pk], using)
+    else:
+        reschedule_tasks([instance.pk], using)
+
+
+@receiver(pre_delete, sender=Task)
+def detach_deleted_task(sender, instance, using, origin=None, **kwargs):
+    # A deleted project takes all its dependencies with it
+    if isinstance(origin, Task) or getattr(origin, 'model', None) is Task:
+        detach_tasks([instance.pk], using)
+
+
+@receiver(post_save, sender=Project)
+def invalidate_project_cache(sender, instance, using, **kwargs):
+    bump_user_version(instance.user_id, instance.updated_at, using)
+
+
+@receiver(post_delete, sender=Project)
+def invalidate_deleted_project_cache(sender, instance, using, **kwargs):
+    bump_user_version(instance.user_id, using=using)
+
+
+@receiver(post_save, sender=Project)
+def publish_project_change(sender, instance, created, using, raw=False, **kwargs):
+    if not raw:
+        event = 'project.created' if created else 'project.updated'
+        publish(instance.user_id, {'type': event, 'project': instance.pk}, using)
+
+
+@receiver(post_delete, sender=Project)
+def publish_project_deletion(sender, instance, using, **kwargs):
+    publish(instance.user_id, {'type': 'project.deleted', 'project': instance.pk}, using)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def notify_task_change(sender, instance, using, signal, origin=None, created=False, raw=False, **kwargs):
+    """Invalidate the owner's cached lists and publish the change with its counter deltas."""
+    if raw or _deleted_with_project(origin):
+        return
+    user_id = Project.objects.using(using).filter(pk=instance.project_id).values_list('user_id', flat=True).first()
+    if user_id is None:
+        return
+    bump_user_version(user_id, using=using)
+    action = 'deleted' if signal is post_delete else 'created' if created else 'updated'
+    publish(user_id, {'type': f'task.{action}', 'task': instance.pk, 'project': instance.project_id}, using)
+    for project_id, (tasks, completed, overdue) in getattr(instance, '_counter_deltas', {}).items():
+        publish(user_id, {
+            'type': 'counters', 'project': project_id,
+            'tasks': tasks, 'completed': completed, 'overdue': overdue,
+        }, using)
+    instance._counter_deltas = {}
+
+
+@receiver(post_save, sender=Project)
+def snapshot_project(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_project_snapshots([instance.pk])
+
+
+@receiver(post_delete, sender=Project)
+def snapshot_deleted_project(sender, instance, origin=None, **kwargs):
+    # Les relevés d'un utilisateur supprimé partent avec lui
+    if not (isinstance(origin, User) or getattr(origin, 'model', None) is User):
+        refresh_user_snapshots([instance.user_id])
+
+
+@receiver(post_save, sender=User)
+def place_new_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and sharding_enabled():
+        place_user(instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_projects(sender, instance, **kwargs):
+    # The cascade from the user only reaches projects stored on its own database
+    if sharding_enabled() and shard_for_user(instance.pk) != instance._state.db:
+        with use_shard(shard_for_user(instance.pk)):
+            Project.all_objects.filter(user_id=instance.pk).delete()
+            UserSnapshot.objects.filter(user_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Password, is_active, is_staff...: the cached user is stale
+    bump_auth_version(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            bump_auth_version(instance.pk)
+        return
+    # Changed from the group (or permission) side: pk_set holds user ids
+    if action == 'pre_clear':
+        column = f'{instance._meta.model_name}_id'
+        instance._auth_user_ids = list(
+            sender.objects.filter(**{column: instance.pk}).values_list('user_id', flat=True)
+        )
+    elif action == 'post_clear':
+        bump_auth_version(*instance.__dict__.pop('_auth_user_ids', ()))
+    elif action.startswith('post_'):
+        bump_auth_version(*pk_set)
+
+
+def _bump_group_members(group_ids):
+    members = User.groups.through.objects.filter(group_id__in=group_ids)
+    bump_auth_version(*members.values_list('user_id', flat=True).distinct())
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._auth_group_ids = list(
+            sender.objects.filter(permission_id=instance.pk).values_list('group_id', flat=True)
+        )
+    elif action == 'post_clear' and reverse:
+        _bump_group_members(instance.__dict__.pop('_auth_group_ids', ()))
+    elif action.startswith('post_'):
+        _bump_group_members(pk_set if reverse else [instance.pk])
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_deleted_group(sender, instance, **kwargs):
+    _bump_group_members([instance.pk])
+
+
+@receiver(post_migrate)
+def reserve_shard_ids(sender, using, **kwargs):
+    if sender.name == 'projects':
+        reserve_id_range(using)
@@ -0,0 +1,88 @@
+// Scripts communs à toutes les pages, chargés en différé par base.html
+
+// Thème sombre/clair (le thème initial est posé dans <head> par base.html)
+const themeToggle = document.getElementById('themeToggle');
+themeToggle.addEventListener('click', () => {
+    document.documentElement.classList.toggle('dark');
+    localStorage.setItem('pt-theme', document.documentElement.classList.contains('dark') ? 'dark' : 'light');
+});
+
+// Animate progress bars (look for elements with .progress-bar and data-progress)
+document.addEventListener('DOMContentLoaded', function(){
+    document.querySelectorAll('.progress-bar').forEach(function(el){
+        const target = el.dataset.progress || el.getAttribute('data-progress') || el.getAttribute('aria-valuenow');
+        const pct = Math.max(0, Math.min(100, parseFloat(target || 0)));
+        // small timeout to allow paint
+        setTimeout(() => { el.style.width = pct + '%'; }, 120);
+    });
+
+    // Count-up elements: animate numbers from 0 to data-target
+    document.querySelectorAll('[data-count-target]').forEach(function(el){
+        const target = parseInt(el.dataset.countTarget || '0', 10);
+        let current = 0;
+        const step = Math.max(1, Math.round(target / 40));
+        const id = setInterval(()=>{
+            current += step;
+            if(current >= target){ current = target; el.textContent = target; clearInterval(id); }
+            else { el.textContent = current; }
+        }, 18);
+    });
+});
+
+// Simple onboarding tour (shows once)
+(function(){
+    const seen = localStorage.getItem('pt-onboard-seen');
+    if(seen) return; // already shown
+
+    // Collect nodes with data-onboard and sort by order
+    const nodes = Array.from(document.querySelectorAll('[data-onboard]'))
+        .map(n => ({ el: n, order: parseInt(n.dataset.onboardOrder||'999',10), text: n.dataset.onboardText||'' }))
+        .sort((a,b)=>a.order - b.order);
+    if(!nodes.length) return;
+
+    const overlay = document.getElementById('onboardOverlay');
+    const tip = document.getElementById('onboardTip');
+    const tipText = document.getElementById('onboardTipText');
+    const btnNext = document.getElementById('onboardNext');
+    const btnSkip = document.getElementById('onboardSkip');
+
+    let idx = 0;
+
+    function showIndex(i){
+        const node = nodes[i];
+        if(!node) return finish();
+        const rect = node.el.getBoundingClientRect();
+        tipText.textContent = node.text || 'Astuce';
+        // Position tip above element if enough space else below
+        const topAbove = rect.top - 16 - tip.offsetHeight;
+        let top = Math.max(16, rect.top + window.scrollY - tip.offsetHeight - 12);
+        if(top < 8) top = rect.bottom + window.scrollY + 12; // position below
+        const left = Math.max(12, rect.left + window.scrollX + (rect.width/2) - (tip.offsetWidth/2));
+        // show overlay + tip
+        overlay.style.display = 'block';
+        tip.style.display = 'block';
+        // small timeout to ensure offsetWidth/Height are available
+        setTimeout(()=>{
+            tip.style.top = (top) + 'px';
+            tip.style.left = (left) + 'px';
+        }, 10);
+    }
+
+    function next(){ idx++; if(idx >= nodes.length) finish(); else showIndex(idx); }
+    function finish(){ overlay.style.display='none'; tip.style.display='none'; localStorage.setItem('pt-onboard-seen','1'); }
+
+    // wire buttons
+    btnNext.addEventListener('click', ()=> next());
+    btnSkip.addEventListener('click', ()=> finish());
+
+    // start after short delay so elements render
+    setTimeout(()=> showIndex(0), 350);
+})();
+
+// Toast helper
+function toast(msg){ 
+    const t = document.getElementById('toast'); 
+    t.textContent = msg; 
+    t.classList.remove('hidden'); 
+    setTimeout(() => t.classList.add('hidden'), 2000); 
+}
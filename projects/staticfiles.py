@@ -0,0 +1,214 @@
+"""Front-end assets: build, fingerprinting, precompression and serving.
+
+The pages load no third-party script or stylesheet. ``manage.py build_assets``
+compiles ``assets/app.css`` with the Tailwind CLI into ``static/projects/app.css``,
+keeping only the classes found in the templates and the Python code, and
+writes the Lucide icons the templates use (``{% icon 'name' %}``) as an SVG
+sprite that ``base.html`` inlines. Both outputs are committed, so neither Node
+nor the Tailwind CLI is needed to deploy; run the command again after adding
+classes or icons.
+
+``collectstatic`` then goes through ``CompressedManifestStaticFilesStorage``:
+content-hashed names (``app.3f2c9a.css``) plus ``.gz`` and, when the
+``brotli`` package is installed, ``.br`` variants of the text files.
+``StaticAssetsMiddleware`` serves ``STATIC_ROOT`` with the best variant the
+client accepts, hashed names being cached for a year as immutable.
+"""
+import gzip
+import os
+import re
+import shlex
+import subprocess
+from importlib.resources import files
+from pathlib import Path
+from xml.etree import ElementTree
+from zipfile import ZipFile
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse
+from django.utils._os import safe_join
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - Brotli is optional
+    brotli = None
+
+APP_DIR = Path(__file__).resolve().parent
+STYLESHEET_SOURCE = APP_DIR / 'assets' / 'app.css'
+STYLESHEET = APP_DIR / 'static' / 'projects' / 'app.css'
+ICON_SPRITE = APP_DIR / 'templates' / 'projects' / 'includes' / 'icons.svg'
+TEMPLATES_DIR = APP_DIR / 'templates'
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.html', '.txt', '.json', '.map', '.xml')
+# Below this size a compressed variant saves nothing worth an extra file
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Unhashed names (collected but not rewritten, or pre-manifest links) may change
+REVALIDATE = 'public, max-age=60'
+
+ICON_TAG = re.compile(r"""{%\s*icon\s+['"]([\w-]+)['"]""")
+SVG_NAMESPACE = 'http://www.w3.org/2000/svg'
+SYMBOL_ATTRIBUTES = {
+    'viewBox': '0 0 24 24', 'fill': 'none', 'stroke': 'currentColor', 'stroke-width': '2',
+    'stroke-linecap': 'round', 'stroke-linejoin': 'round',
+}
+
+
+# Build -----------------------------------------------------------------------
+
+def used_icons():
+    """Names of the icons used by the templates, sorted."""
+    names = set()
+    for path in TEMPLATES_DIR.rglob('*.html'):
+        names.update(ICON_TAG.findall(path.read_text(encoding='utf-8')))
+    return sorted(names)
+
+
+def build_icon_sprite(names, output=ICON_SPRITE):
+    """Write the ``<symbol>`` of each Lucide icon in ``names`` to ``output``.
+
+    Needs the ``lucide`` package, which ships the icon set. Raises
+    ``KeyError`` for an unknown icon.
+    """
+    import lucide
+
+    symbols = []
+    with ZipFile(files(lucide) / 'lucide.zip') as archive:
+        for name in names:
+            svg = ElementTree.fromstring(archive.read(f'{name}.svg'))
+            symbol = ElementTree.Element('symbol', {'id': f'icon-{name}', **SYMBOL_ATTRIBUTES})
+            for shape in svg:
+                # Inline in the page: the elements take the namespace of the enclosing <svg>
+                for node in shape.iter():
+                    node.tag = node.tag.rpartition('}')[2]
+                    node.tail = None
+                symbol.append(shape)
+            symbols.append(ElementTree.tostring(symbol, encoding='unicode'))
+    body = '\n'.join(symbols)
+    output.write_text(
+        '{# Généré par manage.py build_assets: ne pas modifier. Icônes Lucide (licence ISC). #}\n'
+        f'<svg xmlns="{SVG_NAMESPACE}" style="display:none">\n{body}\n</svg>\n',
+        encoding='utf-8',
+    )
+    return output
+
+
+def build_stylesheet(cli=None, output=STYLESHEET):
+    """Compile ``assets/app.css`` with the Tailwind CLI into ``output``, minified.
+
+    ``cli`` defaults to the ``PROJECTS_TAILWIND_CLI`` setting (``tailwindcss``,
+    as installed by the ``tailwindcss-bin`` package).
+    """
+    cli = cli or getattr(settings, 'PROJECTS_TAILWIND_CLI', 'tailwindcss')
+    subprocess.run(
+        [*shlex.split(cli), '--input', str(STYLESHEET_SOURCE), '--output', str(output), '--minify'],
+        check=True, capture_output=True, cwd=APP_DIR,
+    )
+    return output
+
+
+# collectstatic ---------------------------------------------------------------
+
+def _compress(path):
+    """Write the ``.gz`` (and ``.br``) variants of ``path`` when they are smaller."""
+    data = Path(path).read_bytes()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(data):
+            Path(f'{path}{suffix}').write_bytes(compressed)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed file names, plus precompressed variants of the hashed text files.
+
+    Until ``collectstatic`` has written the manifest (``runserver``, the test
+    suite) the files are linked under their plain names.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if not dry_run:
+            for name in set(self.hashed_files.values()):
+                if name.endswith(COMPRESSIBLE):
+                    _compress(self.path(name))
+
+
+# Serving ---------------------------------------------------------------------
+
+def _accepted_encodings(request):
+    encodings = set()
+    for token in request.headers.get('Accept-Encoding', '').split(','):
+        encoding, _, params = token.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0'):
+            encodings.add(encoding.strip())
+    return encodings
+
+
+class StaticAssetsMiddleware:
+    """Serve the files collected in ``STATIC_ROOT``.
+
+    Picks the Brotli or gzip variant written by ``collectstatic`` when the
+    client accepts it. Hashed names never change content, so they are sent
+    with a one year ``immutable`` ``Cache-Control``. Other requests, and
+    files that are not collected, go on to the next middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self._serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self._serve(request) or await self.get_response(request)
+
+    @staticmethod
+    def _serve(request):
+        prefix = settings.STATIC_URL
+        if not settings.STATIC_ROOT or request.method not in ('GET', 'HEAD') or not request.path.startswith(prefix):
+            return None
+        name = request.path[len(prefix):]
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        served, encoding = path, None
+        if name.endswith(COMPRESSIBLE):
+            accepted = _accepted_encodings(request)
+            for suffix, candidate in (('.br', 'br'), ('.gz', 'gzip')):
+                if candidate in accepted and os.path.isfile(path + suffix):
+                    served, encoding = path + suffix, candidate
+                    break
+        response = FileResponse(open(served, 'rb'), filename=os.path.basename(path))
+        # FileResponse would describe the .gz/.br file itself
+        response.headers.pop('Content-Disposition', None)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if name.endswith(COMPRESSIBLE):
+            response['Vary'] = 'Accept-Encoding'
+        immutable = name in getattr(staticfiles_storage, 'hashed_files', {}).values()
+        response['Cache-Control'] = IMMUTABLE if immutable else REVALIDATE
+        return response
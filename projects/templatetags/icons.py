@@ -0,0 +1,17 @@
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+@register.simple_tag
+def icon(name, css_class=''):
+    """Render the Lucide icon ``name`` from the sprite inlined by ``base.html``.
+
+    Only the icons used through this tag are in the sprite: run
+    ``manage.py build_assets`` after using a new one.
+    """
+    return format_html(
+        '<svg class="{}" width="24" height="24" aria-hidden="true"><use href="#icon-{}"></use></svg>',
+        css_class, name,
+    )
@@ -1,3 +1,1866 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import os
+import re
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.admin import site
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, router, transaction
+from django.db.models import F
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import jobs, scheduling, sharding
+from .instrumentation.metrics import registry
+from .auth import clear_expired_sessions
+from .bulk import apply_task_operation
+from .cache import cache_stats, user_version
+from .counters import reconcile_task_counters
+from .deletion import UNDO_WINDOW, purge_deleted_projects, restore_project, soft_delete_project
+from .dependencies import add_dependency, project_schedule, remove_dependency, schedule_project
+from .events import (
+    MAX_PENDING, BaseEventBackend, DatabaseEventBackend, event_stream, get_event_backend,
+)
+from .management.commands.bench_reschedule import legacy_recalculate
+from .models import (
+    Job, Project, ProjectSnapshot, ShardPlacement, Task, TaskDependency, TimeEntry, Timer, UserSnapshot,
+)
+from .pagination import KeysetPaginator
+from .perf import find_regressions, run_suite, seed
+from .rollups import backfill, burndown, history, velocity
+from .routers import read_only_view
+from .scheduling import apply_plan, plan_task_deadlines, recalculate_task_deadlines
+from .search import get_search_backend
+from .sharding import (
+    SHARD_ID_SPAN, HashRing, _tenant_tables, hashed_shard, misplaced_tenants, move_tenant, place_user,
+    reserve_id_range, shard_for_user, tenant, use_shard,
+)
+from .staticfiles import IMMUTABLE, REVALIDATE, used_icons
+from .timetracking import (
+    HEARTBEAT_TIMEOUT, compact_time_entries, day_start, heartbeat, record_time, start_timer, stop_timer,
+)
+from .transfer import FORMATS, import_file
+
+
+class QueryPlanTests(TestCase):
+    """Every query the views run against the projects tables must use an index.
+
+    Each view is exercised through the test client, the SQL it issues is
+    captured and replayed under ``EXPLAIN QUERY PLAN``. A full table scan or a
+    temporary B-tree (sorting rows that no index delivers in order) fails the
+    test, so a new query or ordering that needs an index cannot slip in
+    unnoticed.
+    """
+
+    tables = (
+        'projects_project', 'projects_task', 'projects_projectsnapshot', 'projects_usersnapshot',
+        'projects_timeentry', 'projects_timer', 'projects_taskdependency',
+    )
+    forbidden = ('USE TEMP B-TREE',)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='secret')
+        other = User.objects.create_user('other', password='secret')
+        today = timezone.now().date()
+        for owner in (cls.user, other):
+            for i in range(30):
+                project = Project.objects.create(
+                    user=owner,
+                    title=f'Projet {i}',
+                    description='Rapport de stage',
+                    deadline=today + timedelta(days=i),
+                    status=Project.STATUS_CHOICES[i % 4][0],
+                    progress=i % 10 * 10,
+                )
+                for j in range(5):
+                    Task.objects.create(
+                        project=project,
+                        title=f'Tâche {j}',
+                        deadline=today + timedelta(days=j),
+                        priority=Task.PRIORITY_CHOICES[j % 3][0],
+                        is_completed=j % 2 == 0,
+                    )
+        cls.project = Project.objects.filter(user=cls.user).first()
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite specific')
+        # A cached list would answer without running the queries under test
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertIndexedQueries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data or {})
+            if hasattr(response, 'streaming_content'):
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400)
+        checked = 0
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if sql.lstrip().upper().startswith(('INSERT', 'SAVEPOINT', 'RELEASE')):
+                continue
+            if not any(f'"{table}"' in sql for table in self.tables):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+            for step in plan:
+                for table in self.tables:
+                    self.assertNotEqual(
+                        step.strip(), f'SCAN {table}',
+                        f'Full scan of {table} for {url}:\n{sql}\n{plan}',
+                    )
+                for marker in self.forbidden:
+                    self.assertNotIn(marker, step, f'{url}:\n{sql}\n{plan}')
+            checked += 1
+        self.assertGreater(checked, 0)
+
+    def test_project_list_every_sort(self):
+        url = reverse('projects:project_list')
+        for sort in ('title', 'deadline', 'status', 'progress', 'created_at'):
+            for ordering in (sort, f'-{sort}'):
+                with self.subTest(sort=ordering):
+                    self.assertIndexedQueries('get', url, {'sort': ordering})
+
+    def test_project_list_urgency_and_due(self):
+        url = reverse('projects:project_list')
+        self.assertIndexedQueries('get', url, {'sort': 'urgency'})
+        for due in ('overdue', 'week', 'month'):
+            with self.subTest(due=due):
+                self.assertIndexedQueries('get', url, {'due': due, 'sort': 'deadline'})
+
+    def test_project_list_next_page(self):
+        url = reverse('projects:project_list')
+        for ordering in ('deadline', '-created_at', 'urgency'):
+            response = self.client.get(url, {'sort': ordering})
+            with self.subTest(sort=ordering):
+                self.assertIndexedQueries('get', url + response.context['next_url'])
+
+    def test_project_list_streaming(self):
+        self.assertIndexedQueries('get', reverse('projects:project_list'), {'stream': 1})
+
+    def test_project_list_search(self):
+        self.assertIndexedQueries('get', reverse('projects:project_list'), {'search': 'rapport'})
+
+    def test_project_detail(self):
+        self.assertIndexedQueries('get', reverse('projects:project_detail', args=[self.project.pk]))
+
+    @override_settings(PROJECTS_JOBS_EAGER=True)
+    def test_project_update_with_deadline_change(self):
+        self.assertIndexedQueries('post', reverse('projects:project_update', args=[self.project.pk]), {
+            'title': self.project.title,
+            'description': self.project.description,
+            'deadline': self.project.deadline + timedelta(days=10),
+            'status': self.project.status,
+            'progress': self.project.progress,
+        })
+
+    def test_project_delete(self):
+        self.assertIndexedQueries('post', reverse('projects:project_delete', args=[self.project.pk]))
+
+    def test_api_endpoints(self):
+        task = self.project.tasks.first()
+        for name, args in (
+            ('api_project_list', []),
+            ('api_project_detail', [self.project.pk]),
+            ('api_project_tasks', [self.project.pk]),
+            ('api_project_stats', [self.project.pk]),
+            ('api_task_detail', [task.pk]),
+            ('api_stats', []),
+            ('api_project_burndown', [self.project.pk]),
+            ('api_project_schedule', [self.project.pk]),
+            ('api_stats_history', []),
+        ):
+            with self.subTest(endpoint=name):
+                self.assertIndexedQueries('get', reverse(f'projects:{name}', args=args))
+
+    def test_api_next_pages(self):
+        for url, data in (
+            (reverse('projects:api_project_list'), {'sort': 'deadline', 'limit': 5, 'fields': 'title'}),
+            (reverse('projects:api_project_tasks', args=[self.project.pk]), {'limit': 2}),
+        ):
+            next_url = self.client.get(url, data).json()['next']
+            with self.subTest(url=url):
+                self.assertIndexedQueries('get', next_url)
+
+    def test_data_export(self):
+        for kind in ('projects', 'tasks'):
+            with self.subTest(kind=kind):
+                self.assertIndexedQueries('get', reverse('projects:data_export'), {'kind': kind})
+
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pages', password='secret')
+        today = timezone.localdate()
+        # Trois projets par échéance: les égalités sont départagées par la clé primaire
+        cls.projects = [
+            Project.objects.create(user=cls.user, title=f'Projet {i}', deadline=today + timedelta(days=i // 3))
+            for i in range(30)
+        ]
+        Project.objects.create(user=User.objects.create_user('autre'), title='Autre', deadline=today)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def walk(self, paginator):
+        seen, cursor = [], None
+        while True:
+            page = paginator.get_page(cursor)
+            seen += [project.pk for project in page]
+            if not page.has_next:
+                return seen
+            cursor = page.next_cursor
+
+    def test_round_trip_with_ties(self):
+        by_deadline = sorted(self.projects, key=lambda p: (p.deadline, p.pk))
+        for ordering, expected in (
+            ('deadline', [p.pk for p in by_deadline]),
+            ('-deadline', [p.pk for p in reversed(by_deadline)]),
+            (['is_closed', 'deadline'], [p.pk for p in by_deadline]),
+        ):
+            with self.subTest(ordering=ordering):
+                paginator = KeysetPaginator(Project.objects.filter(user=self.user), ordering, per_page=4)
+                self.assertEqual(self.walk(paginator), expected)
+        with self.assertRaises(ValueError):
+            KeysetPaginator(Project.objects.all(), ['deadline', '-title'])
+
+    def test_tampered_cursor(self):
+        paginator = KeysetPaginator(Project.objects.filter(user=self.user), 'deadline', per_page=4)
+        cursor = paginator.get_page().next_cursor
+        self.assertIsNotNone(paginator.decode_cursor(cursor))
+        forged = base64.urlsafe_b64encode(json.dumps(['pas une date', 1]).encode()).decode()
+        for value in ('%%%', cursor[:-3], forged, base64.urlsafe_b64encode(b'[1]').decode()):
+            with self.subTest(cursor=value):
+                self.assertIsNone(paginator.decode_cursor(value))
+        # Un curseur invalide ramène à la première page
+        url = reverse('projects:project_list')
+        first = self.client.get(url, {'sort': 'deadline'})
+        response = self.client.get(url, {'sort': 'deadline', 'cursor': forged})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cards'], first.context['cards'])
+
+    def test_views(self):
+        url = reverse('projects:project_list')
+        seen, next_url = [], '?sort=deadline'
+        while next_url:
+            response = self.client.get(url + next_url)
+            seen += [int(pk) for pk in re.findall(r'id="project-(\d+)"', response.content.decode())]
+            next_url = response.context['next_url']
+        by_deadline = sorted(self.projects, key=lambda p: (p.deadline, p.pk))
+        self.assertEqual(seen, [p.pk for p in by_deadline])
+
+        response = self.client.get(url, {'sort': '-deadline', 'stream': 1})
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(
+            [int(pk) for pk in re.findall(r'id="project-(\d+)"', content)],
+            [p.pk for p in reversed(by_deadline)],
+        )
+        self.assertIn('</html>', content)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('u1', password='secret')
+        self.today = timezone.localdate()
+        self.title_match = Project.objects.create(
+            user=self.user, title='Rapport de stage', description='Mise en forme', deadline=self.today,
+        )
+        self.body_match = Project.objects.create(
+            user=self.user, title='Soutenance', description='Relire le rapport', deadline=self.today,
+            status='completed',
+        )
+        self.task_match = Project.objects.create(user=self.user, title='Étude', deadline=self.today)
+        self.task = Task.objects.create(
+            project=self.task_match, title='<b>Rapport</b> & annexes', deadline=self.today,
+        )
+        other = User.objects.create_user('autre')
+        Project.objects.create(user=other, title='Rapport', deadline=self.today)
+        self.backend = get_search_backend()
+
+    def search(self, query):
+        return [hit.project_id for hit in self.backend.search(self.user, query)]
+
+    def test_ranking_and_prefixes(self):
+        # Le titre pèse plus que la description; seuls les projets de l'utilisateur
+        hits = self.search('rapport')
+        self.assertEqual(set(hits), {self.title_match.pk, self.body_match.pk, self.task_match.pk})
+        self.assertLess(hits.index(self.title_match.pk), hits.index(self.body_match.pk))
+        self.assertEqual(self.search('rapp sta'), [self.title_match.pk])
+        self.assertEqual(self.search('etude'), [self.task_match.pk])
+        self.assertEqual(self.search('!!'), [])
+
+    def test_owner_token_is_not_searchable(self):
+        for query in ('u', f'u{self.user.pk}', 'u1 rapport'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [])
+
+    def test_snippets_are_escaped(self):
+        hits = {hit.project_id: hit.snippet for hit in self.backend.search(self.user, 'rapport')}
+        self.assertEqual(hits[self.task_match.pk], '&lt;b&gt;<mark>Rapport</mark>&lt;/b&gt; &amp; annexes')
+        self.assertIn('<mark>rapport</mark>', hits[self.body_match.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.title_match.title = 'Mémoire'
+        self.title_match.save()
+        self.assertNotIn(self.title_match.pk, self.search('rapport'))
+        self.assertEqual(self.search('memoire'), [self.title_match.pk])
+        self.task.delete()
+        self.assertEqual(set(self.search('rapport')), {self.body_match.pk})
+        self.body_match.delete()
+        self.assertEqual(self.search('rapport'), [])
+
+    def test_index_task_reads_only_the_owner(self):
+        task = Task.objects.get(pk=self.task.pk)
+        # DELETE and INSERT of the index row, plus the owner's id
+        with CaptureQueriesContext(connection) as queries:
+            self.backend.index_task(task)
+        self.assertEqual(len(queries), 3)
+        self.assertTrue(queries[0]['sql'].startswith('SELECT "projects_project"."user_id"'))
+        self.assertNotIn('"title"', queries[0]['sql'])
+        # Already loaded with the task: no lookup
+        task = Task.objects.select_related('project').get(pk=self.task.pk)
+        with self.assertNumQueries(2):
+            self.backend.index_task(task)
+        self.assertEqual(self.search('annexes'), [self.task_match.pk])
+
+    def test_relevance_sort_with_filters(self):
+        self.client.force_login(self.user)
+        url = reverse('projects:project_list')
+        response = self.client.get(url, {'search': 'rapport'})
+        self.assertEqual(response.context['current_sort'], 'relevance')
+        cards = [int(pk) for pk in re.findall(r'id="project-(\d+)"', response.content.decode())]
+        self.assertEqual(cards, self.search('rapport'))
+        self.assertContains(response, '<mark>Rapport</mark>')
+
+        response = self.client.get(url, {'search': 'rapport', 'status': 'completed'})
+        cards = [int(pk) for pk in re.findall(r'id="project-(\d+)"', response.content.decode())]
+        self.assertEqual(cards, [self.body_match.pk])
+
+
+class StatisticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('stats', password='secret')
+        today = timezone.localdate()
+        cls.project = Project.objects.create(user=cls.user, title='Rapport', deadline=today)
+        cls.empty = Project.objects.create(user=cls.user, title='Vide', deadline=today)
+        for days, priority, done in (
+            (-3, 'high', False), (-1, 'low', True), (0, 'high', False), (5, 'medium', False), (-2, 'medium', False),
+        ):
+            Task.objects.create(
+                project=cls.project, title='Tâche', deadline=today + timedelta(days=days),
+                priority=priority, is_completed=done,
+            )
+        cls.expected = {
+            'total_tasks': 5, 'completed_tasks': 1, 'pending_tasks': 4, 'overdue_tasks': 2,
+            'high_priority_tasks': 2, 'medium_priority_tasks': 2, 'low_priority_tasks': 1,
+        }
+
+    def test_aggregates(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Task.objects.filter(project=self.project).statistics(), self.expected)
+        self.assertEqual(Task.objects.filter(project=self.empty).statistics()['total_tasks'], 0)
+        self.assertEqual(Task.objects.all().statistics_by_project(), {self.project.pk: self.expected})
+        with self.assertNumQueries(1):
+            projects = {p.pk: p for p in Project.objects.filter(user=self.user).with_task_statistics()}
+        self.assertEqual(projects[self.project.pk].overdue_tasks, 2)
+        self.assertEqual((projects[self.empty.pk].total_tasks, projects[self.empty.pk].pending_tasks), (0, 0))
+
+    def test_views(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('projects:project_detail', args=[self.project.pk]))
+        self.assertEqual(
+            [response.context[name] for name in ('total_tasks', 'completed_tasks', 'pending_tasks', 'overdue_tasks')],
+            [5, 1, 4, 2],
+        )
+        response = self.client.get(reverse('projects:api_project_stats', args=[self.project.pk]))
+        self.assertEqual(response.json(), {'project': self.project.pk, **self.expected})
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('compteurs', password='secret')
+        self.today = timezone.localdate()
+        self.project = Project.objects.create(user=self.user, title='Rapport', deadline=self.today)
+        self.other = Project.objects.create(user=self.user, title='Autre', deadline=self.today)
+
+    def counters(self, project=None):
+        project = Project.objects.get(pk=(project or self.project).pk)
+        return project.task_count, project.completed_count, project.overdue_count, project.progress
+
+    def test_follow_task_changes(self):
+        tasks = [
+            Task.objects.create(project=self.project, title=f'Tâche {i}', deadline=self.today + timedelta(days=i - 1))
+            for i in range(4)
+        ]
+        self.assertEqual(self.counters(), (4, 0, 1, 0))
+
+        tasks[0].is_completed = True
+        tasks[0].save()
+        self.assertEqual(self.counters(), (4, 1, 0, 25))
+        tasks[1].deadline = self.today - timedelta(days=3)
+        tasks[1].save()
+        self.assertEqual(self.counters(), (4, 1, 1, 25))
+
+        # Relue comme dans une vue, puis déplacée
+        task = Task.objects.get(pk=tasks[1].pk)
+        task.project = self.other
+        task.save()
+        self.assertEqual(self.counters(), (3, 1, 0, 33.3))
+        self.assertEqual(self.counters(self.other), (1, 0, 1, 0))
+
+        Task.objects.get(pk=tasks[2].pk).delete()
+        self.assertEqual(self.counters(), (2, 1, 0, 50))
+        # Nothing drifted along the way
+        self.assertEqual(reconcile_task_counters(), 0)
+
+    def test_reconcile(self):
+        for i in range(3):
+            Task.objects.create(project=self.project, title=f'Tâche {i}', deadline=self.today - timedelta(days=1))
+        # Sans signaux: les compteurs dérivent
+        Task.objects.filter(project=self.project).update(is_completed=True)
+        Task.objects.create(project=self.other, title='Ajoutée', deadline=self.today)
+        Project.objects.filter(pk=self.other.pk).update(task_count=0)
+        self.assertEqual(self.counters(), (3, 0, 3, 0))
+
+        out = StringIO()
+        call_command('reconcile_counters', batch_size=1, stdout=out)
+        self.assertIn('2 projet(s)', out.getvalue())
+        self.assertEqual(self.counters(), (3, 3, 0, 100))
+        self.assertEqual(self.counters(self.other)[0], 1)
+        self.assertEqual(ProjectSnapshot.objects.get(project=self.project, day=self.today).completed_count, 3)
+        self.assertEqual(reconcile_task_counters(Project.objects.filter(pk=self.project.pk)), 0)
+
+    def test_overdue_evaluated_on_save(self):
+        Task.objects.bulk_create(
+            Task(project=self.project, title=f'Tâche {i}', deadline=self.today) for i in range(50)
+        )
+        # Loading the tasks does not work out today's date once per row
+        with mock.patch('projects.models.timezone.now', side_effect=AssertionError):
+            tasks = list(Task.objects.filter(project=self.project))
+        reconcile_task_counters()
+        self.assertEqual(self.counters()[2], 0)
+
+        # Loaded before midnight, saved after: reconciled at midnight, nothing changes
+        later = timezone.now() + timedelta(days=1)
+        with mock.patch('projects.models.timezone.now', return_value=later):
+            reconcile_task_counters()
+            self.assertEqual(self.counters()[2], 50)
+            tasks[0].title = 'Renommée'
+            tasks[0].save()
+            self.assertEqual(self.counters()[2], 50)
+            tasks[1].is_completed = True
+            tasks[1].save()
+            self.assertEqual(self.counters()[2], 49)
+
+
+class CounterTransactionTests(TransactionTestCase):
+    def test_save_and_counters_share_a_transaction(self):
+        user = User.objects.create_user('atomique')
+        project = Project.objects.create(user=user, title='Rapport', deadline=timezone.localdate())
+        with mock.patch('projects.counters.apply_snapshot_delta', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Task.objects.create(project=project, title='Tâche', deadline=project.deadline)
+        # The failed counter update took the task down with it
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(Project.objects.get(pk=project.pk).task_count, 0)
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.failures = 0
+        for patch in (
+            mock.patch.dict(jobs._registry, {'echo': self.echo, 'flaky': self.flaky}),
+            # Failures are expected here
+            mock.patch.object(jobs, 'logger'),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def echo(self, value):
+        self.calls.append(value)
+        return {'value': value}
+
+    def flaky(self, fail):
+        self.calls.append(fail)
+        if len(self.calls) <= fail:
+            raise RuntimeError('Échec')
+        return {'calls': len(self.calls)}
+
+    def test_claim(self):
+        queued = jobs.enqueue('echo', {'value': 1})
+        self.assertTrue(jobs.claim(queued, 'worker-a'))
+        self.assertEqual((queued.status, queued.locked_by, queued.attempts), (Job.STATUS_RUNNING, 'worker-a', 1))
+        # The conditional UPDATE lets a single worker win
+        self.assertFalse(jobs.claim(Job.objects.get(pk=queued.pk), 'worker-b'))
+        self.assertIsNone(jobs.claim_next('worker-b'))
+        jobs.execute(queued)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.result, queued.locked_by), (Job.STATUS_SUCCEEDED, {'value': 1}, ''))
+
+        with self.assertRaises(ValueError):
+            jobs.enqueue('inconnue')
+
+    def test_retries_with_backoff(self):
+        queued = jobs.enqueue('flaky', {'fail': 5}, max_attempts=2)
+        jobs.claim(queued)
+        before = timezone.now()
+        jobs.execute(queued)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.STATUS_QUEUED)
+        self.assertIn('RuntimeError', queued.error)
+        self.assertGreaterEqual(queued.run_after, before + timedelta(seconds=2))
+        # Not runnable before the backoff is over
+        self.assertIsNone(jobs.claim_next())
+
+        Job.objects.filter(pk=queued.pk).update(run_after=timezone.now())
+        claimed = jobs.claim_next()
+        jobs.execute(claimed)
+        self.assertEqual((claimed.status, claimed.attempts), (Job.STATUS_FAILED, 2))
+        self.assertIsNotNone(claimed.finished_at)
+
+    def test_idempotency_key(self):
+        first = jobs.enqueue('echo', {'value': 1}, idempotency_key='import:1')
+        second = jobs.enqueue('echo', {'value': 2}, idempotency_key='import:1')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+    @override_settings(PROJECTS_JOBS_EAGER=True)
+    def test_eager(self):
+        queued = jobs.enqueue('flaky', {'fail': 2})
+        self.assertEqual((queued.status, queued.attempts, queued.result), (Job.STATUS_SUCCEEDED, 3, {'calls': 3}))
+        queued = jobs.enqueue('flaky', {'fail': 9}, max_attempts=1)
+        self.assertEqual(queued.status, Job.STATUS_FAILED)
+
+    def test_stale_jobs(self):
+        long_ago = timezone.now() - timedelta(seconds=jobs.STALE_AFTER + 1)
+        retried, once, alive = (
+            jobs.enqueue('echo', {'value': value}, max_attempts=attempts) for value, attempts in ((1, 3), (2, 1), (3, 3))
+        )
+        for queued in (retried, once, alive):
+            jobs.claim(queued, 'disparu')
+        Job.objects.filter(pk__in=[retried.pk, once.pk]).update(locked_at=long_ago)
+        # A heartbeat keeps a long job from being handed out again
+        Job.objects.filter(pk=alive.pk).update(locked_at=long_ago)
+        self.assertTrue(jobs.keep_alive(alive))
+        self.assertFalse(jobs.keep_alive(Job(pk=alive.pk, locked_by='autre')))
+
+        self.assertEqual(jobs.requeue_stale_jobs(), (1, 1))
+        statuses = dict(Job.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[queued.pk] for queued in (retried, once, alive)],
+            [Job.STATUS_QUEUED, Job.STATUS_FAILED, Job.STATUS_RUNNING],
+        )
+        self.assertIn('heartbeat', Job.objects.get(pk=once.pk).error)
+
+    def test_workers_sweep_stale_jobs(self):
+        queued = jobs.enqueue('echo', {'value': 1})
+        jobs.claim(queued, 'disparu')
+        Job.objects.filter(pk=queued.pk).update(locked_at=timezone.now() - timedelta(seconds=jobs.STALE_AFTER + 1))
+        # The test transaction must keep its connection
+        with mock.patch.object(jobs, 'connections'), mock.patch.object(jobs, 'close_old_connections'):
+            self.assertEqual(jobs.work(burst=True), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.STATUS_SUCCEEDED, 2))
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('source', password='secret')
+        self.target = User.objects.create_user('cible', password='secret')
+        today = timezone.localdate()
+        self.finished = Project.objects.create(
+            user=self.user, title='Ancien, "terminé"', description='Ligne 1\nLigne 2',
+            deadline=today - timedelta(days=400), status='completed', progress=100,
+        )
+        self.current = Project.objects.create(user=self.user, title='Actuel', deadline=today + timedelta(days=30))
+        Task.objects.create(project=self.finished, title='Archivée', deadline=today - timedelta(days=410), is_completed=True)
+        Task.objects.create(project=self.current, title='Ouverte', deadline=today, priority='high')
+
+    def export(self, kind, fmt):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('projects:data_export'), {'kind': kind, 'format': fmt})
+        return b''.join(response.streaming_content).decode()
+
+    def rows(self, user):
+        projects = Project.objects.filter(user=user).order_by('title')
+        tasks = Task.objects.filter(project__user=user).order_by('title')
+        return (
+            list(projects.values_list('title', 'description', 'deadline', 'status', 'progress', 'task_count', 'completed_count')),
+            list(tasks.values_list('project__title', 'title', 'deadline', 'priority', 'is_completed')),
+        )
+
+    def test_round_trip(self):
+        for fmt in FORMATS:
+            with self.subTest(fmt=fmt):
+                Project.objects.filter(user=self.target).delete()
+                projects = import_file(self.target, StringIO(self.export('projects', fmt)), 'projects', fmt)
+                self.assertEqual((projects.created, projects.error_count), (2, 0))
+                self.assertEqual(
+                    projects.id_map,
+                    {str(project.pk): Project.objects.get(user=self.target, title=project.title).pk
+                     for project in (self.finished, self.current)},
+                )
+                tasks = import_file(self.target, StringIO(self.export('tasks', fmt)), 'tasks', fmt, projects.id_map)
+                self.assertEqual((tasks.created, tasks.error_count), (2, 0))
+                self.assertEqual(self.rows(self.target), self.rows(self.user))
+                self.assertEqual(len(get_search_backend().search(self.target, 'Archivée')), 1)
+
+    def test_error_report(self):
+        stream = StringIO(
+            '{"title": "Valide", "deadline": "2020-01-01", "status": "on_hold"}\n'
+            'pas du json\n'
+            '\n'
+            '{"title": "", "deadline": "demain", "status": "perdu"}\n'
+        )
+        report = import_file(self.target, stream, 'projects', 'ndjson')
+        self.assertEqual((report.created, report.error_count), (1, 2))
+        self.assertEqual(report.errors[0], {'line': 2, 'errors': {'__all__': ['Ligne illisible.']}})
+        self.assertEqual(report.errors[1]['line'], 4)
+        self.assertEqual(set(report.errors[1]['errors']), {'title', 'deadline', 'status'})
+        self.assertEqual(Project.objects.get(user=self.target).progress, 0)
+
+        # Neither unknown ids nor another user's projects are reachable, even through a map
+        stream = StringIO(
+            'project,title,deadline,priority,is_completed\n'
+            f'{self.current.pk},Intruse,2030-01-01,low,False\n'
+            f'999,Orpheline,2030-01-01,low,False\n'
+        )
+        report = import_file(self.target, stream, 'tasks', 'csv', {str(self.current.pk): self.current.pk})
+        self.assertEqual((report.created, report.error_count), (0, 2))
+        self.assertEqual([error['line'] for error in report.errors], [2, 3])
+        self.assertEqual(report.errors[0]['errors'], {'project': ['Projet inconnu.']})
+        self.assertEqual(self.current.tasks.count(), 1)
+
+    def test_import_view(self):
+        projects, tasks = self.export('projects', 'ndjson'), self.export('tasks', 'csv')
+        self.client.force_login(self.target)
+        url = reverse('projects:data_import')
+        self.assertEqual(self.client.post(url, {'kind': 'projects'}).status_code, 400)
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(PROJECTS_JOBS_EAGER=True, PROJECTS_IMPORT_DIR=directory):
+            upload = SimpleUploadedFile('projects.ndjson', projects.encode())
+            response = self.client.post(url, {'kind': 'projects', 'file': upload})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['status'], Job.STATUS_SUCCEEDED)
+            id_map = response.json()['result']['id_map']
+            self.assertEqual(len(id_map), 2)
+
+            upload = SimpleUploadedFile('tasks.csv', tasks.encode())
+            response = self.client.post(url, {'kind': 'tasks', 'file': upload, 'id_map': json.dumps(id_map)})
+            self.assertEqual(response.json()['result']['created'], 2)
+            status = self.client.get(response.json()['status_url']).json()
+            self.assertEqual((status['name'], status['result']['error_count']), ('import_rows', 0))
+            # The worker deleted the uploaded files
+            self.assertEqual(os.listdir(directory), [])
+        self.assertEqual(self.rows(self.target), self.rows(self.user))
+        response = self.client.post(url, {'kind': 'tasks', 'file': upload, 'id_map': '[1]'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ListCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cache', password='secret', is_staff=True)
+        self.project = Project.objects.create(user=self.user, title='Rapport', deadline=timezone.localdate())
+        self.client.force_login(self.user)
+        self.url = reverse('projects:project_list')
+
+    def test_hits_and_invalidation(self):
+        self.assertContains(self.client.get(self.url), 'Rapport')
+        self.client.get(self.url)
+        self.assertEqual(self.client.get(reverse('projects:cache_statistics')).json(), {'hits': 1, 'misses': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Project.objects.create(user=self.user, title='Soutenance', deadline=timezone.localdate())
+        self.assertContains(self.client.get(self.url), 'Soutenance')
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 2})
+
+        # Task writes invalidate the lists of the owner only
+        other = User.objects.create_user('autre')
+        version = user_version(other.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(project=self.project, title='Rédaction', deadline=timezone.localdate())
+        self.assertEqual(user_version(other.pk), version)
+        self.client.get(self.url)
+        self.assertEqual(cache_stats()['misses'], 3)
+
+    def test_bumped_on_commit(self):
+        version = user_version(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.title = 'Mémoire'
+            self.project.save()
+            # Uncommitted: a concurrent request must not cache this under a new version
+            self.assertEqual(user_version(self.user.pk), version)
+        self.assertGreater(user_version(self.user.pk), version)
+
+        version = user_version(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.project.delete()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(user_version(self.user.pk), version)
+
+    def test_conditional_get(self):
+        # The first page sets the CSRF cookie, part of the ETag
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        etag, modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.client.get(self.url, headers={'If-Modified-Since': modified}).status_code, 304)
+        # Another filter is another representation
+        response = self.client.get(self.url, {'sort': 'deadline'}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Project.objects.create(user=self.user, title='Soutenance', deadline=timezone.localdate())
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertContains(response, 'Soutenance')
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('api', password='secret')
+        cls.other = User.objects.create_user('autre')
+        today = timezone.localdate()
+        cls.project = Project.objects.create(user=cls.user, title='Rapport', deadline=today + timedelta(days=7))
+        cls.task = Task.objects.create(project=cls.project, title='Plan', deadline=today, priority='high')
+        Task.objects.create(project=cls.project, title='Relecture', deadline=today - timedelta(days=1))
+        cls.foreign = Project.objects.create(user=cls.other, title='Secret', deadline=today)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def get(self, name, *args, **params):
+        return self.client.get(reverse(f'projects:{name}', args=args), params)
+
+    def test_payloads(self):
+        response = self.get('api_project_list')
+        self.assertEqual([row['title'] for row in response.json()['results']], ['Rapport'])
+        self.assertIsNone(response.json()['next'])
+        detail = self.get('api_project_detail', self.project.pk).json()
+        self.assertEqual((detail['id'], detail['task_count'], detail['overdue_count']), (self.project.pk, 2, 1))
+
+        tasks = self.get('api_project_tasks', self.project.pk).json()['results']
+        self.assertEqual([task['title'] for task in tasks], ['Relecture', 'Plan'])
+        self.assertEqual(tasks[1]['project'], self.project.pk)
+        self.assertEqual(self.get('api_project_tasks', self.project.pk, completed=1).json()['results'], [])
+        self.assertEqual(self.get('api_task_detail', self.task.pk).json()['priority'], 'high')
+
+        statistics = self.get('api_stats').json()
+        self.assertEqual(statistics['projects'], 1)
+        self.assertEqual(statistics['tasks']['total_tasks'], 2)
+        self.assertEqual(self.get('api_project_stats', self.project.pk).json()['project'], self.project.pk)
+        self.assertEqual(len(self.get('api_project_burndown', self.project.pk, days=7).json()['days']), 7)
+        self.assertEqual(len(self.get('api_stats_history', days=3).json()['days']), 3)
+        schedule = self.get('api_project_schedule', self.project.pk).json()
+        self.assertEqual(schedule['project'], self.project.pk)
+
+    def test_fields(self):
+        rows = self.get('api_project_list', fields='title').json()['results']
+        self.assertEqual(rows, [{'id': self.project.pk, 'title': 'Rapport'}])
+        task = self.get('api_task_detail', self.task.pk, fields='title,deadline').json()
+        self.assertEqual(set(task), {'id', 'title', 'deadline'})
+        for name, args in (('api_project_list', ()), ('api_project_tasks', (self.project.pk,))):
+            response = self.get(name, *args, fields='title,user')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('user', response.json()['error'])
+        self.assertEqual(self.get('api_project_list', sort='user').status_code, 400)
+        self.assertEqual(self.get('api_project_list', limit='dix').status_code, 400)
+
+    def test_anonymous(self):
+        self.client.logout()
+        for name, args in (('api_project_list', ()), ('api_project_detail', (self.project.pk,)), ('api_stats', ())):
+            response = self.get(name, *args)
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response.json(), {'error': 'Authentification requise.'})
+
+    def test_other_users_objects(self):
+        for name in ('api_project_detail', 'api_project_tasks', 'api_project_stats',
+                     'api_project_burndown', 'api_project_schedule'):
+            self.assertEqual(self.get(name, self.foreign.pk).status_code, 404, name)
+        foreign_task = Task.objects.create(project=self.foreign, title='Privé', deadline=timezone.localdate())
+        self.assertEqual(self.get('api_task_detail', foreign_task.pk).status_code, 404)
+
+    def test_conditional_get(self):
+        url = reverse('projects:api_stats')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        # Another query string is another representation
+        self.assertEqual(self.client.get(url, {'x': 1}, headers={'If-None-Match': etag}).status_code, 200)
+
+        # Overdue counts change at midnight without any write
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        with mock.patch('django.utils.timezone.localdate', return_value=tomorrow):
+            response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(project=self.project, title='Annexe', deadline=timezone.localdate())
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.json()['tasks']['total_tasks'], 3)
+
+
+class ReadRoutingTests(TransactionTestCase):
+    """Reads of the views wrapped in ``read_only_view`` go to the replica."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = User.objects.create_user('lecture')
+        self.project = Project.objects.create(user=self.user, title='Lecture', deadline=timezone.localdate())
+
+    def routes(self):
+        project = Project.objects.get(pk=self.project.pk)
+        return router.db_for_read(Project), project._state.db, router.db_for_write(Project, instance=project)
+
+    def test_sync_view(self):
+        @read_only_view
+        def view(request):
+            outside = self.routes()
+            with transaction.atomic():
+                # Must see the transaction's own writes
+                inside = self.routes()
+            return outside, inside
+
+        self.assertEqual(view(None), (('replica', 'replica', 'default'), ('default', 'default', 'default')))
+        self.assertEqual(self.routes(), ('default', 'default', 'default'))
+
+    def test_async_view(self):
+        @read_only_view
+        async def view(request):
+            return await sync_to_async(self.routes)()
+
+        self.assertEqual(async_to_sync(view)(None), ('replica', 'replica', 'default'))
+        self.assertEqual(self.routes(), ('default', 'default', 'default'))
+
+    def test_save_read_object(self):
+        @read_only_view
+        def view(request):
+            project = Project.objects.get(pk=self.project.pk)
+            project.title = 'Relu'
+            project.save()
+
+        view(None)
+        self.assertEqual(Project.objects.get(pk=self.project.pk).title, 'Relu')
+
+
+@override_settings(
+    PROJECTS_SHARDS=['default', 'shard1'],
+    PROJECTS_EVENT_BACKEND='projects.tests.RecordingEventBackend',
+)
+class ShardingTests(TransactionTestCase):
+    databases = {'default', 'replica', 'shard1'}
+
+    def setUp(self):
+        cache.clear()
+        reserve_id_range('shard1')
+        self.events = get_event_backend().events
+        self.today = timezone.localdate()
+
+    def user_on(self, alias, username):
+        user = User.objects.create_user(username, password='secret')
+        place_user(user.pk, alias)
+        return user
+
+    def populate(self, user):
+        """A project with everything stored under it, on the user's shard."""
+        with tenant(user.pk):
+            project = Project.objects.create(user=user, title='Rapport annuel', deadline=self.today)
+            first = Task.objects.create(project=project, title='Collecte', deadline=self.today)
+            second = Task.objects.create(project=project, title='Rédaction', deadline=self.today)
+            add_dependency(first, second)
+            record_time(user, first, timezone.now() - timedelta(hours=1), 600)
+            start_timer(user, second)
+            deleted = Project.objects.create(user=user, title='Abandonné', deadline=self.today)
+            soft_delete_project(deleted)
+        return project
+
+    def rows(self, alias, user):
+        counts = {}
+        for model, where, params in _tenant_tables(user.pk, alias):
+            with connections[alias].cursor() as cursor:
+                cursor.execute(f'SELECT id FROM {model._meta.db_table} WHERE {where} ORDER BY id', params)
+                counts[model.__name__] = [pk for pk, in cursor.fetchall()]
+        return counts
+
+    def test_hash_ring(self):
+        keys = range(3000)
+        ring = HashRing(['a', 'b', 'c'])
+        placed = [ring.node_for(key) for key in keys]
+        self.assertEqual(placed, [HashRing(['c', 'b', 'a']).node_for(key) for key in keys])
+        for node in 'abc':
+            self.assertGreater(placed.count(node), 600)
+        # A new node only takes keys, about a quarter of them
+        grown = HashRing(['a', 'b', 'c', 'd'])
+        moved = [key for key, node in zip(keys, placed) if grown.node_for(key) != node]
+        self.assertEqual({grown.node_for(key) for key in moved}, {'d'})
+        self.assertTrue(450 < len(moved) < 1050, len(moved))
+
+    def test_placement(self):
+        user = User.objects.create_user('nouveau')
+        self.assertEqual(ShardPlacement.objects.get(user=user).alias, hashed_shard(user.pk))
+        self.assertEqual(shard_for_user(user.pk), hashed_shard(user.pk))
+        ShardPlacement.objects.filter(user=user).delete()
+        cache.clear()
+        # Created before sharding was enabled
+        self.assertEqual(shard_for_user(user.pk), 'default')
+        self.assertEqual(list(misplaced_tenants([user.pk])), (
+            [] if hashed_shard(user.pk) == 'default' else [(user.pk, 'default', hashed_shard(user.pk))]
+        ))
+
+    def test_id_ranges(self):
+        near = self.user_on('default', 'proche')
+        far = self.user_on('shard1', 'loin')
+        with tenant(near.pk):
+            self.assertLess(Project.objects.create(user=near, title='A', deadline=self.today).pk, SHARD_ID_SPAN)
+        with tenant(far.pk):
+            project = Project.objects.create(user=far, title='B', deadline=self.today)
+            task = Task.objects.create(project=project, title='T', deadline=self.today)
+        self.assertTrue(SHARD_ID_SPAN <= project.pk < 2 * SHARD_ID_SPAN)
+        self.assertGreaterEqual(task.pk, SHARD_ID_SPAN)
+        # Only ever raised
+        reserve_id_range('shard1')
+        with tenant(far.pk):
+            self.assertGreater(Project.objects.create(user=far, title='C', deadline=self.today).pk, project.pk)
+
+    def test_router(self):
+        with use_shard('shard1'):
+            self.assertEqual(router.db_for_read(Project), 'shard1')
+            self.assertEqual(router.db_for_write(Task), 'shard1')
+            # Jobs, users and placements stay on default
+            self.assertEqual(router.db_for_write(Job), 'default')
+            self.assertEqual(router.db_for_read(User), 'default')
+        self.assertEqual(router.db_for_write(Project), 'default')
+        far = self.user_on('shard1', 'loin')
+        self.assertEqual(router.db_for_write(Project, instance=Project(user=far)), 'shard1')
+        self.assertEqual(router.db_for_read(Project, instance=far), 'shard1')
+        self.assertTrue(router.allow_migrate('shard1', 'projects', model_name='task'))
+        self.assertFalse(router.allow_migrate('shard1', 'projects', model_name='job'))
+        self.assertFalse(router.allow_migrate('replica', 'projects', model_name='task'))
+
+    def test_middleware(self):
+        far = self.user_on('shard1', 'loin')
+        near = self.user_on('default', 'proche')
+        self.client.force_login(far)
+        response = self.client.post(reverse('projects:project_create'), {
+            'title': 'Projet lointain', 'description': '', 'deadline': self.today, 'status': 'in_progress',
+        })
+        self.assertEqual(response.status_code, 302)
+        project = Project.objects.using('shard1').get(user=far)
+        self.assertFalse(Project.objects.using('default').filter(user=far).exists())
+        self.assertContains(self.client.get(reverse('projects:project_list'), {'search': 'lointain'}), 'Projet lointain')
+        streamed = self.client.get(reverse('projects:data_export'))
+        self.assertIn(b'Projet lointain', b''.join(streamed.streaming_content))
+        # Async views go through the same middleware
+        async_to_sync(self.async_client.aforce_login)(far)
+        response = async_to_sync(self.async_client.get)(reverse('projects:api_project_detail', args=[project.pk]))
+        self.assertEqual(response.json()['title'], 'Projet lointain')
+
+        self.client.force_login(near)
+        self.assertEqual(self.client.get(reverse('projects:project_detail', args=[project.pk])).status_code, 404)
+
+    def test_move_tenant(self):
+        user = self.user_on('default', 'mobile')
+        other = self.user_on('default', 'voisin')
+        project = self.populate(user)
+        self.populate(other)
+        before = self.rows('default', user)
+        self.events.clear()
+        version = user_version(user.pk)
+
+        moved = move_tenant(user.pk, 'shard1', batch_size=2)
+        self.assertEqual(moved, sum(map(len, before.values())))
+        self.assertEqual(self.rows('shard1', user), before)
+        self.assertEqual(self.rows('default', user), {name: [] for name in before})
+        self.assertEqual(shard_for_user(user.pk), 'shard1')
+        self.assertEqual(self.events, [])
+        self.assertGreater(user_version(user.pk), version)
+        # Untouched neighbour, counters and search index moved along
+        self.assertEqual(len(Project.all_objects.using('default').filter(user=other)), 2)
+        with tenant(user.pk):
+            self.assertEqual(Project.objects.get().task_count, 2)
+            self.assertEqual([hit.project_id for hit in get_search_backend().search(user, 'Rédaction')], [project.pk])
+        with use_shard('default'):
+            self.assertEqual(get_search_backend().search(user, 'Rédaction'), [])
+        self.assertEqual(move_tenant(user.pk, 'shard1'), 0)
+
+    def test_move_tenant_catches_up(self):
+        user = self.user_on('default', 'mobile')
+        project = self.populate(user)
+        copy_rows = sharding._copy_rows
+
+        def write_meanwhile(model, *args):
+            copied = copy_rows(model, *args)
+            if model is Timer:
+                # Writes made on the source while the copy runs
+                with tenant(user.pk):
+                    Task.objects.filter(title='Collecte').update(title='Collecte révisée')
+                    late = Project.objects.create(user=user, title='Tardif', deadline=self.today)
+                    Task.objects.create(project=late, title='Dernière', deadline=self.today)
+                    Project.all_objects.filter(title='Abandonné').update(title='Abandonné (bis)')
+            return copied
+
+        with mock.patch('projects.sharding._copy_rows', side_effect=write_meanwhile):
+            move_tenant(user.pk, 'shard1', batch_size=2)
+        with tenant(user.pk):
+            self.assertEqual(
+                sorted(Task.objects.values_list('title', flat=True)),
+                ['Collecte révisée', 'Dernière', 'Rédaction'],
+            )
+            self.assertEqual(Project.objects.get(title='Tardif').task_count, 1)
+            self.assertTrue(Project.all_objects.filter(title='Abandonné (bis)').exists())
+            self.assertEqual(len(get_search_backend().search(user, 'révisée')), 1)
+            self.assertEqual(len(get_search_backend().search(user, 'Dernière')), 1)
+        self.assertFalse(any(self.rows('default', user).values()))
+        self.assertTrue(Task.objects.using('shard1').filter(project=project).exists())
+
+    def test_move_tenant_conflict(self):
+        user = self.user_on('default', 'mobile')
+        self.populate(user)
+        taken = Project.objects.using('default').filter(user=user).order_by('pk').last()
+        squatter = self.user_on('shard1', 'occupant')
+        Project.objects.using('shard1').create(pk=taken.pk, user=squatter, title='Occupé', deadline=self.today)
+        before = self.rows('default', user)
+
+        with self.assertRaises(IntegrityError):
+            move_tenant(user.pk, 'shard1', batch_size=2)
+        self.assertEqual(shard_for_user(user.pk), 'default')
+        self.assertEqual(self.rows('default', user), before)
+        self.assertEqual(self.rows('shard1', user), {name: [] for name in before})
+        self.assertEqual(Project.objects.using('shard1').get(pk=taken.pk).title, 'Occupé')
+
+    def test_rebalance_shards(self):
+        users = [self.user_on('default', f'u{i}') for i in range(8)]
+        for user in users:
+            with tenant(user.pk):
+                Project.objects.create(user=user, title=f'Projet {user.username}', deadline=self.today)
+        misplaced = [user.pk for user in users if hashed_shard(user.pk) == 'shard1']
+        self.assertTrue(misplaced)
+
+        out = StringIO()
+        call_command('rebalance_shards', '--dry-run', stdout=out)
+        self.assertIn(f'{len(misplaced)} utilisateur(s) à déplacer', out.getvalue())
+        self.assertEqual({shard_for_user(user.pk) for user in users}, {'default'})
+
+        out = StringIO()
+        call_command('rebalance_shards', stdout=out)
+        self.assertIn(f'{len(misplaced)} utilisateur(s) déplacé(s), 0 échec(s)', out.getvalue())
+        for user in users:
+            self.assertEqual(shard_for_user(user.pk), hashed_shard(user.pk))
+            self.assertEqual(Project.objects.using(hashed_shard(user.pk)).filter(user=user).count(), 1)
+        self.assertEqual(list(misplaced_tenants(user.pk for user in users)), [])
+
+
+class AsyncViewTests(TestCase):
+    """The async views served through the ASGI handler."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('async', password='secret')
+        cls.project = Project.objects.create(
+            user=cls.user, title='Projet async', deadline=timezone.now().date()
+        )
+        Task.objects.create(project=cls.project, title='Tâche', deadline=cls.project.deadline)
+
+    async def test_views(self):
+        response = await self.async_client.get(reverse('projects:api_stats'))
+        self.assertEqual(response.status_code, 401)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('projects:project_detail', args=[self.project.pk]))
+        self.assertEqual(response.context['total_tasks'], 1)
+        response = await self.async_client.get(reverse('projects:api_stats'))
+        self.assertEqual(response.json()['tasks']['total_tasks'], 1)
+        response = await self.async_client.get(
+            reverse('projects:api_stats'), headers={'If-None-Match': response['ETag']}
+        )
+        self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get(reverse('projects:project_list'), {'stream': 1})
+        self.assertIn(b'Projet async', b''.join([chunk async for chunk in response.streaming_content]))
+
+
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', password='secret', is_staff=True)
+        Project.objects.create(user=cls.user, title='Projet', deadline=timezone.now().date())
+
+    def setUp(self):
+        registry.reset()
+        self.client.force_login(self.user)
+
+    def test_server_timing_and_metrics(self):
+        response = self.client.get(reverse('projects:project_list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="SQL \(\d+\)", tpl;dur=')
+        with override_settings(PROJECTS_METRICS_SAMPLE_RATE=0):
+            response = self.client.get(reverse('projects:project_list'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        metrics = self.client.get(reverse('projects:metrics')).content.decode()
+        self.assertIn('projects_request_duration_seconds_count{view="projects:project_list"} 2', metrics)
+        self.assertIn('projects_request_sql_queries_count{view="projects:project_list"} 1', metrics)
+
+
+class PerfTests(TestCase):
+    def test_seed_and_suite(self):
+        report = seed(users=3, projects=20, tasks=150, seed=1)
+        self.assertEqual((report.users, report.projects), (3, 20))
+        self.assertEqual(Task.objects.count(), report.tasks)
+        project = Project.objects.order_by('-task_count').first()
+        self.assertEqual(project.task_count, project.tasks.count())
+
+        report = run_suite(repeat=1, only='project_detail')
+        self.assertEqual(list(report['scenarios']), ['project_detail'])
+        baseline = {'scenarios': {
+            'project_detail': dict(report['scenarios']['project_detail'], queries=0)
+        }}
+        self.assertEqual(len(find_regressions(baseline, report)), 1)
+
+
+class BulkTaskTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('bulk', password='secret')
+        deadline = timezone.now().date() + timedelta(days=10)
+        cls.project = Project.objects.create(user=cls.user, title='Source', deadline=deadline)
+        cls.target = Project.objects.create(user=cls.user, title='Cible', deadline=deadline)
+        cls.tasks = Task.objects.bulk_create(
+            Task(project=cls.project, title=f'Rapport {i}', deadline=deadline) for i in range(30)
+        )
+        get_search_backend().index_bulk(cls.user.pk, tasks=cls.tasks)
+        other = User.objects.create_user('autre')
+        cls.foreign = Project.objects.create(user=other, title='Autre', deadline=deadline)
+        cls.foreign_task = Task.objects.create(project=cls.foreign, title='Autre', deadline=deadline)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def bulk(self, operation, tasks, **params):
+        return self.client.post(
+            reverse('projects:task_bulk'), {'operation': operation, 'tasks': tasks, **params},
+            content_type='application/json',
+        )
+
+    def test_operations(self):
+        ids = [task.pk for task in self.tasks] + [self.foreign_task.pk]
+        # User (just logged in, the session is cached), then a constant number of
+        # queries whatever the number of tasks (two look for their dependencies)
+        with self.assertNumQueries(13):
+            response = self.bulk('complete', ids)
+        self.assertEqual(response.json(), {'operation': 'complete', 'count': 30, 'projects': [self.project.pk]})
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.completed_count, self.project.progress), (30, 100.0))
+        self.assertFalse(Task.objects.get(pk=self.foreign_task.pk).is_completed)
+
+        response = self.bulk('shift', ids[:2], days=-3)
+        self.assertEqual(Task.objects.get(pk=ids[0]).deadline, self.tasks[0].deadline - timedelta(days=3))
+
+        response = self.bulk('move', ids[:10], project=self.target.pk)
+        self.assertEqual(response.json()['count'], 10)
+        self.target.refresh_from_db()
+        self.assertEqual(self.target.task_count, 10)
+        self.assertEqual(self.bulk('move', ids[:10], project=self.foreign.pk).json()['count'], 0)
+        hits = get_search_backend().search(self.user, 'rapport')
+        self.assertEqual({hit.project_id for hit in hits}, {self.project.pk, self.target.pk})
+
+        response = self.client.post(reverse('projects:task_bulk'), {
+            'operation': 'delete', 'tasks': ids[10:], 'next': reverse('projects:project_detail', args=[self.project.pk]),
+        })
+        self.assertRedirects(response, reverse('projects:project_detail', args=[self.project.pk]), fetch_redirect_response=False)
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.task_count, 0)
+        self.assertTrue(Task.objects.filter(pk=self.foreign_task.pk).exists())
+        self.assertEqual({hit.project_id for hit in get_search_backend().search(self.user, 'rapport')}, {self.target.pk})
+
+        self.assertEqual(self.bulk('priority', ids).status_code, 400)
+
+
+class SchedulingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('planning-auto', password='secret')
+        # The original implementation reads date.today()
+        self.today = date.today()
+
+    def create_project(self, deadline, priorities):
+        project = Project.objects.create(user=self.user, title='Échéancier', deadline=deadline)
+        Task.objects.bulk_create([
+            Task(project=project, title=f'Tâche {i}', priority=priority,
+                 deadline=self.today + timedelta(days=i % 5))
+            for i, priority in enumerate(priorities)
+        ])
+        return project
+
+    def legacy(self, project):
+        """Deadlines and overdue count of the original per-row implementation."""
+        with transaction.atomic():
+            legacy_recalculate(project)
+            deadlines = dict(Task.objects.filter(project=project).values_list('pk', 'deadline'))
+            transaction.set_rollback(True)
+        return deadlines, sum(deadline < self.today for deadline in deadlines.values())
+
+    def test_compute_deadlines_matches_legacy(self):
+        priorities = ['high', 'low', 'medium', 'high', 'low', 'medium', 'high'] * 3
+        for days in (17, 1, 0, -4):
+            project = self.create_project(self.today + timedelta(days=days), priorities)
+            deadlines, overdue = self.legacy(project)
+            for backend in ('numpy', 'python'):
+                with self.subTest(days=days, backend=backend):
+                    with mock.patch.object(scheduling, 'np', scheduling.np if backend == 'numpy' else None):
+                        plan = plan_task_deadlines(project, self.today)
+                        computed = scheduling.compute_deadlines(priorities, project.deadline, self.today)
+                    self.assertTrue(all(type(deadline) is date for deadline in computed))
+                    planned = dict(Task.objects.filter(project=project).values_list('pk', 'deadline'))
+                    planned.update((change.task_id, change.new_deadline) for change in plan.changes)
+                    self.assertEqual(planned, deadlines)
+                    self.assertEqual(plan.overdue_count, overdue)
+        self.assertGreater(overdue, 0)
+
+    def test_dry_run(self):
+        project = self.create_project(self.today + timedelta(days=9), ['high', 'low', 'medium'])
+        before = dict(Task.objects.values_list('pk', 'deadline'))
+        version = user_version(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                plan = recalculate_task_deadlines(project, dry_run=True)
+        self.assertEqual(plan.updated_count, 3)
+        self.assertFalse([query for query in queries if not query['sql'].startswith('SELECT')])
+        self.assertEqual(dict(Task.objects.values_list('pk', 'deadline')), before)
+        self.assertEqual(user_version(self.user.pk), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(recalculate_task_deadlines(project).as_dict(), plan.as_dict())
+        self.assertEqual(
+            dict(Task.objects.values_list('pk', 'deadline')),
+            {change.task_id: change.new_deadline for change in plan.changes},
+        )
+        self.assertGreater(user_version(self.user.pk), version)
+        self.assertEqual(recalculate_task_deadlines(project).updated_count, 0)
+
+    def test_apply_plan_batches(self):
+        # Every task lands on the deadline already passed: a single date to write
+        project = self.create_project(self.today - timedelta(days=1), ['medium'] * 1801)
+        plan = plan_task_deadlines(project, self.today)
+        self.assertEqual((plan.updated_count, plan.overdue_count), (1801, 1801))
+        with CaptureQueriesContext(connection) as queries:
+            apply_plan(plan)
+        updates = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE "projects_task" SET "deadline"')
+        ]
+        sizes = [len(re.search(r'"id" IN \(([^)]*)\)', sql).group(1).split(',')) for sql in updates]
+        self.assertEqual(sizes, [900, 900, 1])
+        self.assertEqual(Task.objects.filter(deadline=project.deadline).count(), 1801)
+
+
+class TimelineTests(TestCase):
+    def test_with_timeline(self):
+        user = User.objects.create_user('timeline')
+        today = timezone.localdate()
+        for title, days, status in (
+            ('retard', -2, 'in_progress'), ('semaine', 3, 'not_started'), ('mois', 20, 'on_hold'),
+            ('plus tard', 90, 'in_progress'), ('terminé', -5, 'completed'),
+        ):
+            Project.objects.create(user=user, title=title, deadline=today + timedelta(days=days), status=status)
+        projects = Project.objects.filter(user=user).with_timeline(today).order_by('urgency')
+        self.assertEqual(
+            [(p.title, p.overdue, p.days_left, p.urgency) for p in projects],
+            [('retard', True, -2, 0), ('semaine', False, 3, 1), ('mois', False, 20, 2),
+             ('plus tard', False, 90, 3), ('terminé', False, -5, 4)],
+        )
+        self.assertEqual(
+            [p.title for p in Project.objects.filter(user=user).order_by('is_closed', 'deadline')],
+            [p.title for p in projects],
+        )
+        for due, titles in (('overdue', ['retard']), ('week', ['semaine']), ('month', ['semaine', 'mois'])):
+            self.assertEqual(
+                sorted(Project.objects.filter(user=user).due(due, today).values_list('title', flat=True)),
+                sorted(titles),
+            )
+
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('rollup', password='secret')
+        self.today = timezone.localdate()
+        self.project = Project.objects.create(
+            user=self.user, title='Rapport', deadline=self.today + timedelta(days=10), time_spent=3 * 3600,
+        )
+
+    def snapshot(self):
+        return (
+            ProjectSnapshot.objects.get(project=self.project, day=self.today),
+            UserSnapshot.objects.get(user=self.user, day=self.today),
+        )
+
+    def test_follows_counters(self):
+        tasks = [
+            Task.objects.create(project=self.project, title=f'Tâche {i}', deadline=self.today + timedelta(days=i - 1))
+            for i in range(3)
+        ]
+        tasks[1].is_completed = True
+        tasks[1].save()
+        project, user = self.snapshot()
+        self.assertEqual((project.task_count, project.completed_count, project.overdue_count), (3, 1, 1))
+        self.assertEqual(project.progress, 33.3)
+        self.assertEqual(
+            (user.project_count, user.task_count, user.completed_count, user.overdue_count, user.total_time),
+            (1, 3, 1, 1, 3),
+        )
+
+        tasks[0].delete()
+        Project.objects.create(user=self.user, title='Autre', deadline=self.today)
+        project, user = self.snapshot()
+        self.assertEqual((project.task_count, project.overdue_count), (2, 0))
+        self.assertEqual((user.project_count, user.task_count, user.overdue_count), (2, 2, 0))
+
+        Project.objects.filter(user=self.user).delete()
+        user = UserSnapshot.objects.get(user=self.user, day=self.today)
+        self.assertEqual((user.project_count, user.task_count), (0, 0))
+
+    def test_backfill_and_series(self):
+        for i in range(4):
+            Task.objects.create(project=self.project, title=f'Tâche {i}', deadline=self.today + timedelta(days=5))
+        # Une tâche par jour depuis 4 jours, les deux premières terminées le lendemain
+        for i, task in enumerate(self.project.tasks.order_by('pk')):
+            created = timezone.now() - timedelta(days=4 - i)
+            Task.objects.filter(pk=task.pk).update(
+                created_at=created, updated_at=created + timedelta(days=1), is_completed=i < 2,
+            )
+        ProjectSnapshot.objects.all().delete()
+        UserSnapshot.objects.all().delete()
+        Project.objects.filter(pk=self.project.pk).update(
+            created_at=timezone.now() - timedelta(days=30), task_count=4, completed_count=2, progress=50,
+        )
+
+        self.assertGreater(backfill(self.user.pk, self.today - timedelta(days=7)), 0)
+        days = burndown(self.project, self.today - timedelta(days=5))
+        self.assertEqual([row['task_count'] for row in days], [0, 1, 2, 3, 4, 4])
+        self.assertEqual([row['completed_count'] for row in days], [0, 0, 1, 2, 2, 2])
+        # Une tâche ouverte il y a deux jours, échéance du projet dans 10 jours
+        days = burndown(self.project, self.today - timedelta(days=2))
+        self.assertEqual([row['ideal'] for row in days], [1, 0.9, 0.8])
+
+        days = history(self.user, self.today - timedelta(days=5))
+        self.assertEqual([row['open'] for row in days], [0, 1, 1, 1, 2, 2])
+        self.assertEqual(days[-1]['progress'], 50)
+        self.assertEqual(sum(week['completed'] for week in velocity(days)), 2)
+
+    def test_api(self):
+        self.client.force_login(self.user)
+        Task.objects.create(project=self.project, title='Tâche', deadline=self.today)
+        response = self.client.get(reverse('projects:api_project_burndown', args=[self.project.pk]), {'days': 7})
+        days = response.json()['days']
+        self.assertEqual(len(days), 7)
+        self.assertEqual(days[-1]['task_count'], 1)
+        response = self.client.get(reverse('projects:api_stats_history'))
+        self.assertEqual(len(response.json()['days']), 365)
+        other = User.objects.create_user('autre')
+        foreign = Project.objects.create(user=other, title='Autre', deadline=self.today)
+        response = self.client.get(reverse('projects:api_project_burndown', args=[foreign.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class TimeTrackingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('chrono', password='secret')
+        today = timezone.localdate()
+        self.project = Project.objects.create(user=self.user, title='Rapport', deadline=today)
+        self.other = Project.objects.create(user=self.user, title='Autre', deadline=today)
+        self.task = Task.objects.create(project=self.project, title='Rédaction', deadline=today)
+        self.client.force_login(self.user)
+
+    def totals(self):
+        self.project.refresh_from_db()
+        self.task.refresh_from_db()
+        return self.task.time_spent, self.project.time_spent, self.project.total_time
+
+    def test_manual_entry(self):
+        response = self.client.post(reverse('projects:time_entry_create'), {
+            'task': self.task.pk, 'day': timezone.localdate(), 'minutes': 90,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.totals(), (5400, 5400, 1.5))
+        self.assertEqual(ProjectSnapshot.objects.get(project=self.project).total_time, 1.5)
+
+        foreign_project = Project.objects.create(
+            user=User.objects.create_user('autre'), title='Autre', deadline=timezone.localdate(),
+        )
+        foreign = Task.objects.create(project=foreign_project, title='Autre', deadline=timezone.localdate())
+        response = self.client.post(reverse('projects:time_entry_create'), {
+            'task': foreign.pk, 'day': timezone.localdate(), 'minutes': 5,
+        })
+        self.assertEqual(response.status_code, 404)
+
+    def test_timer(self):
+        start = timezone.now() - timedelta(hours=1)
+        start_timer(self.user, self.task, now=start)
+        self.assertTrue(heartbeat(self.user, now=start + timedelta(minutes=5)))
+        # Ticks are a single UPDATE
+        with self.assertNumQueries(1):
+            heartbeat(self.user, now=start + timedelta(minutes=6))
+        # Silent for too long: the gap is not booked, the timer is not revived
+        late = start + timedelta(minutes=6) + HEARTBEAT_TIMEOUT + timedelta(seconds=1)
+        self.assertFalse(heartbeat(self.user, now=late))
+        entry = stop_timer(self.user, now=late)
+        self.assertEqual((entry.duration, entry.source), (360, TimeEntry.SOURCE_TIMER))
+        self.assertFalse(Timer.objects.exists())
+        self.assertIsNone(stop_timer(self.user))
+
+        self.client.post(reverse('projects:timer_start', args=[self.task.pk]))
+        Timer.objects.update(started_at=F('started_at') - timedelta(minutes=2))
+        self.client.post(reverse('projects:timer_stop'))
+        self.assertEqual(self.totals()[0], 480)
+
+    def test_moves_and_deletes(self):
+        self.client.post(reverse('projects:time_entry_create'), {
+            'task': self.task.pk, 'day': timezone.localdate(), 'minutes': 60,
+        })
+        # Comme une vue: la tâche est relue avant d'être modifiée
+        self.task.refresh_from_db()
+        self.task.project = self.other
+        self.task.save()
+        self.project.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.project.time_spent, self.other.time_spent), (0, 3600))
+
+        apply_task_operation(self.user, [self.task.pk], 'move', project=self.project.pk)
+        self.assertEqual(self.totals()[1], 3600)
+        start_timer(self.user, self.task)
+        apply_task_operation(self.user, [self.task.pk], 'delete')
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.time_spent, self.project.total_time), (0, 0))
+        self.assertFalse(TimeEntry.objects.exists() or Timer.objects.exists())
+
+    def test_compaction(self):
+        old = timezone.now() - timedelta(days=200)
+        for hours in range(3):
+            TimeEntry.objects.create(task=self.task, started_at=old + timedelta(hours=hours), duration=600)
+        TimeEntry.objects.create(task=self.task, started_at=timezone.now(), duration=60)
+        self.assertEqual(compact_time_entries(batch_size=2), 1)
+        self.assertEqual(compact_time_entries(), 1)
+        self.assertEqual(
+            sorted(TimeEntry.objects.values_list('source', 'duration')),
+            [('daily', 1800), ('manual', 60)],
+        )
+
+    def test_compaction_deletes_in_chunks(self):
+        # All on the same day, whatever the time of the run
+        old = day_start(timezone.localdate() - timedelta(days=200))
+        TimeEntry.objects.bulk_create([
+            TimeEntry(task=self.task, started_at=old + timedelta(seconds=i), duration=1) for i in range(1801)
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(compact_time_entries(), 1800)
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE FROM "projects_timeentry"')]
+        self.assertEqual([sql.count(',') + 1 for sql in deletes], [900, 900, 1])
+        self.assertEqual(list(TimeEntry.objects.values_list('source', 'duration')), [('daily', 1801)])
+
+
+class RecordingEventBackend(BaseEventBackend):
+    def __init__(self):
+        self.events = []
+
+    def publish(self, user_id, event):
+        self.events.append((user_id, event))
+
+
+@override_settings(PROJECTS_EVENT_BACKEND='projects.tests.RecordingEventBackend')
+class EventTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('direct', password='secret')
+        self.events = get_event_backend().events
+        self.events.clear()
+
+    def test_published_on_commit(self):
+        today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            project = Project.objects.create(user=self.user, title='Rapport', deadline=today)
+            task = Task.objects.create(project=project, title='Rédaction', deadline=today)
+        self.assertEqual([event for _, event in self.events], [
+            {'type': 'project.created', 'project': project.pk},
+            {'type': 'task.created', 'task': task.pk, 'project': project.pk},
+            {'type': 'counters', 'project': project.pk, 'tasks': 1, 'completed': 0, 'overdue': 0},
+        ])
+        self.assertEqual({user_id for user_id, _ in self.events}, {self.user.pk})
+
+        self.events.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_task_operation(self.user, [task.pk], 'complete')
+        self.assertEqual(self.events[-1][1], {
+            'type': 'tasks.bulk', 'operation': 'complete', 'count': 1, 'projects': [project.pk],
+        })
+
+        # Rien n'est publié pour une transaction annulée
+        self.events.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    project.delete()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.events, [])
+
+    def test_rescheduled_tasks(self):
+        today = timezone.localdate()
+        project = Project.objects.create(user=self.user, title='Rapport', deadline=today + timedelta(days=10))
+        tasks = [Task.objects.create(project=project, title=f'Tâche {i}', deadline=today) for i in range(3)]
+        version = user_version(self.user.pk)
+        self.events.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            plan = apply_plan(plan_task_deadlines(project, today))
+            # Nothing is visible before the commit
+            self.assertEqual(user_version(self.user.pk), version)
+        self.assertEqual(plan.updated_count, 3)
+        self.assertEqual(Task.objects.get(pk=tasks[-1].pk).deadline, project.deadline)
+        self.assertGreater(user_version(self.user.pk), version)
+        self.assertEqual(self.events, [
+            (self.user.pk, {'type': 'tasks.rescheduled', 'project': project.pk, 'count': 3}),
+        ])
+
+    @override_settings(PROJECTS_EVENT_BACKEND='projects.events.InProcessEventBackend')
+    async def test_stream(self):
+        backend = get_event_backend()
+        stream = event_stream(self.user.pk, max_age=1, keepalive=0.05)
+        self.assertIn('"ready"', await anext(stream))
+        backend.publish(self.user.pk, {'type': 'project.deleted', 'project': 3})
+        backend.publish(self.user.pk + 1, {'type': 'project.deleted', 'project': 4})
+        self.assertEqual(await anext(stream), 'data: {"type": "project.deleted", "project": 3}\n\n')
+        self.assertEqual(await anext(stream), ': keepalive\n\n')
+        # A page too slow to follow is asked to reload
+        for pk in range(MAX_PENDING + 1):
+            backend.publish(self.user.pk, {'type': 'project.updated', 'project': pk})
+        self.assertEqual(await anext(stream), 'data: {"type": "resync"}\n\n')
+        await stream.aclose()
+        self.assertNotIn(self.user.pk, backend._subscriptions)
+
+    async def test_database_backend(self):
+        backend = DatabaseEventBackend()
+        subscription = backend.subscribe(self.user.pk)
+        self.assertEqual(await subscription.get(0), [])
+        await sync_to_async(backend.publish)(self.user.pk, {'type': 'project.updated', 'project': 1})
+        self.assertEqual(await subscription.get(1), [{'type': 'project.updated', 'project': 1}])
+
+    @override_settings(PROJECTS_EVENT_BACKEND='projects.events.InProcessEventBackend')
+    async def test_views(self):
+        project = await Project.objects.acreate(user=self.user, title='Rapport', deadline=timezone.localdate())
+        # Sous WSGI le flux n'est pas servi
+        await sync_to_async(self.client.force_login)(self.user)
+        response = await sync_to_async(self.client.get)(reverse('projects:project_events'))
+        self.assertEqual(response.status_code, 501)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('projects:project_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertIn(b'"ready"', await anext(chunks))
+        await chunks.aclose()
+
+        response = await self.async_client.get(reverse('projects:project_card', args=[project.pk]))
+        self.assertContains(response, f'id="project-{project.pk}"')
+        other = await User.objects.acreate(username='autre')
+        await Project.objects.filter(pk=project.pk).aupdate(user=other)
+        response = await self.async_client.get(reverse('projects:project_card', args=[project.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class AssetTests(TestCase):
+    def test_pages_are_self_contained(self):
+        self.client.force_login(User.objects.create_user('offline', password='secret'))
+        content = self.client.get(reverse('projects:project_list')).content.decode()
+        self.assertNotRegex(content, r'(src|href)="(https?:)?//')
+        # Le sprite inclus contient toutes les icônes utilisées (sinon: manage.py build_assets)
+        for name in used_icons():
+            self.assertIn(f'<symbol id="icon-{name}"', content)
+
+    def test_collectstatic_and_serving(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            url = staticfiles_storage.url('projects/app.css')
+            self.assertRegex(url, r'/app\.[0-9a-f]{12}\.css$')
+            self.assertContains(self.client.get(reverse('login')), url)
+
+            response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertEqual(response['Cache-Control'], IMMUTABLE)
+            with staticfiles_storage.open('projects/app.css') as original:
+                self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), original.read())
+
+            response = self.client.get('/static/projects/app.css', headers={'Accept-Encoding': 'gzip;q=0'})
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(response['Cache-Control'], REVALIDATE)
+            response.close()
+
+
+class AuthCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('session', password='secret')
+        self.client.force_login(self.user)
+        # Première requête: l'utilisateur vient d'être enregistré (last_login)
+        self.client.get(reverse('projects:project_list'))
+
+    def auth_queries(self, url=None):
+        response = self.client.get(url or reverse('projects:project_list'))
+        return int(re.search(r'auth;desc="SQL \((\d+)\)"', response['Server-Timing']).group(1))
+
+    def test_cached_session_and_user(self):
+        self.assertEqual(self.auth_queries(), 0)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.auth_queries(), 1)
+        self.assertEqual(self.client.get(reverse('projects:metrics')).status_code, 200)
+
+        # Changer le mot de passe déconnecte les autres sessions
+        self.user.set_password('nouveau')
+        self.user.save()
+        response = self.client.get(reverse('projects:project_list'))
+        self.assertRedirects(response, f"{reverse('login')}?next={reverse('projects:project_list')}")
+
+    def test_permissions(self):
+        permission = Permission.objects.get(codename='view_project')
+        group = Group.objects.create(name='lecteurs')
+        user = User.objects.get(pk=self.user.pk)
+        self.assertFalse(user.has_perm('projects.view_project'))
+        user.groups.add(group)
+        group.permissions.add(permission)
+        # Fresh instances: the permissions come from the cache, invalidated above
+        user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(user.has_perm('projects.view_project'))
+        with self.assertNumQueries(0):
+            self.assertTrue(User(pk=self.user.pk).has_perm('projects.view_project'))
+        permission.group_set.clear()
+        self.assertFalse(User.objects.get(pk=self.user.pk).has_perm('projects.view_project'))
+
+    def test_clear_expired_sessions(self):
+        Session.objects.update(expire_date=timezone.now() - timedelta(days=1))
+        self.assertEqual(clear_expired_sessions(batch_size=1), 1)
+        self.assertFalse(Session.objects.exists())
+
+
+class SoftDeleteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('corbeille', password='secret')
+        today = timezone.localdate()
+        self.project = Project.objects.create(user=self.user, title='Rapport', deadline=today)
+        self.tasks = Task.objects.bulk_create([
+            Task(project=self.project, title=f'Tâche {i}', deadline=today) for i in range(7)
+        ])
+        record_time(self.user, self.tasks[0], timezone.now(), 600)
+        self.client.force_login(self.user)
+
+    def test_delete_and_restore(self):
+        response = self.client.post(reverse('projects:project_delete', args=[self.project.pk]), follow=True)
+        self.assertContains(response, reverse('projects:project_restore', args=[self.project.pk]))
+        self.assertFalse(Project.objects.exists())
+        self.assertEqual(Task.objects.count(), 7)
+        self.assertFalse(Task.objects.visible().exists())
+        self.assertEqual(UserSnapshot.objects.get(user=self.user).project_count, 0)
+        self.assertEqual(self.client.get(reverse('projects:project_detail', args=[self.project.pk])).status_code, 404)
+        self.assertEqual(self.client.post(reverse('projects:timer_start', args=[self.tasks[0].pk])).status_code, 404)
+
+        response = self.client.post(reverse('projects:project_restore', args=[self.project.pk]))
+        self.assertRedirects(response, reverse('projects:project_detail', args=[self.project.pk]))
+        self.assertEqual(UserSnapshot.objects.get(user=self.user).project_count, 1)
+
+    def test_purge(self):
+        soft_delete_project(self.project, now=timezone.now() - UNDO_WINDOW - timedelta(seconds=1))
+        # Encore dans le délai: rien n'est purgé
+        self.assertEqual(purge_deleted_projects(before=timezone.now() - 2 * UNDO_WINDOW), (0, 0))
+        self.assertIsNone(restore_project(self.user, self.project.pk))
+
+        self.assertEqual(purge_deleted_projects(batch_size=3), (1, 7))
+        self.assertFalse(Project.all_objects.exists())
+        self.assertFalse(Task.objects.exists())
+        self.assertFalse(TimeEntry.objects.exists())
+        self.assertFalse(ProjectSnapshot.objects.exists())
+        self.assertEqual(get_search_backend().search(self.user, 'rapport'), [])
+
+    def test_admin_delete(self):
+        User.objects.create_superuser('admin', password='secret')
+        self.client.login(username='admin', password='secret')
+        url = reverse('admin:projects_project_delete', args=[self.project.pk])
+        response = self.client.get(url)
+        self.assertContains(response, 'Rapport')
+        self.assertContains(response, 'Tâches: 7')
+        self.assertContains(response, 'Temps passés: 1')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'post': 'yes'})
+        # Hidden at once, purged by a job
+        self.assertFalse(Project.objects.exists())
+        self.assertEqual(Task.objects.count(), 7)
+        job = Job.objects.get(name='purge_project')
+        self.assertEqual((job.payload, job.user_id), ({'project_id': self.project.pk}, self.user.pk))
+        self.assertTrue(jobs.claim(job))
+        jobs.execute(job)
+        self.assertFalse(Project.all_objects.exists())
+        self.assertFalse(Task.objects.exists())
+        self.assertFalse(TimeEntry.objects.exists())
+
+    def test_admin_delete_selection(self):
+        other = User.objects.create_user('corbeille-2', password='secret')
+        today = timezone.localdate()
+        projects = [self.project] + [
+            Project.objects.create(user=user, title=f'Projet {i}', deadline=today)
+            for i, user in enumerate((self.user, other, other))
+        ]
+        admin = User.objects.create_superuser('admin', password='secret')
+        request = RequestFactory().post('/')
+        request.user = admin
+        model_admin = site._registry[Project]
+        queryset = Project.all_objects.filter(pk__in=[project.pk for project in projects])
+        with mock.patch('projects.deletion.bump_user_version') as bump:
+            with CaptureQueriesContext(connection) as queries:
+                model_admin.delete_queryset(request, queryset)
+        statements = [query['sql'] for query in queries]
+        # One UPDATE for the whole selection, and no owner loaded
+        self.assertEqual(sum(sql.startswith('UPDATE "projects_project"') for sql in statements), 1)
+        self.assertFalse([sql for sql in statements if 'FROM "auth_user"' in sql])
+        self.assertEqual(sorted(call.args[0] for call in bump.call_args_list), [self.user.pk, other.pk])
+        self.assertFalse(Project.objects.exists())
+        self.assertEqual(UserSnapshot.objects.get(user=other).project_count, 0)
+        self.assertEqual(
+            sorted(Job.objects.filter(name='purge_project').values_list('payload__project_id', 'user_id')),
+            sorted((project.pk, project.user_id) for project in projects),
+        )
+
+    def test_admin_delete_restored(self):
+        soft_delete_project(self.project)
+        restore_project(self.user, self.project.pk)
+        with override_settings(PROJECTS_JOBS_EAGER=True):
+            self.assertEqual(jobs.enqueue('purge_project', {'project_id': self.project.pk}).result, {'tasks': 0})
+        self.assertEqual(Task.objects.count(), 7)
+
+    def test_admin_delete_permissions(self):
+        staff = User.objects.create_user('equipe', password='secret', is_staff=True)
+        staff.user_permissions.add(*Permission.objects.filter(codename__in=['view_project', 'delete_project']))
+        self.client.login(username='equipe', password='secret')
+        url = reverse('admin:projects_project_delete', args=[self.project.pk])
+        response = self.client.get(url)
+        self.assertEqual(set(response.context['perms_lacking']), {'Tâche', 'Temps passé', 'Relevé de projet'})
+        self.assertEqual(self.client.post(url, {'post': 'yes'}).status_code, 403)
+        self.assertTrue(Project.objects.exists())
+        self.assertFalse(Job.objects.exists())
+
+
+class DependencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('planning', password='secret')
+        self.today = timezone.localdate()
+        self.project = Project.objects.create(
+            user=self.user, title='Chantier', deadline=self.today + timedelta(days=30),
+        )
+        self.a, self.b, self.c, self.d = (
+            Task.objects.create(project=self.project, title=title, deadline=self.today, duration=duration)
+            for title, duration in (('Fondations', 2), ('Murs', 3), ('Toit', 1), ('Réseaux', 2))
+        )
+        self.client.force_login(self.user)
+
+    def test_critical_path(self):
+        add_dependency(self.a, self.b)
+        add_dependency(self.b, self.c)
+        add_dependency(self.a, self.d)
+        schedule = project_schedule(self.project, today=self.today)
+        self.assertEqual((schedule.length, schedule.slack), (6, 24))
+        self.assertEqual(schedule.critical_path, [self.a.pk, self.b.pk, self.c.pk])
+        tasks = {task.task_id: task for task in schedule.tasks}
+        self.assertEqual(tasks[self.c.pk].earliest_start, self.today + timedelta(days=5))
+        self.assertEqual(tasks[self.a.pk].latest_finish, self.project.deadline - timedelta(days=4))
+        self.assertEqual(tasks[self.d.pk].slack, 26)
+
+        # Moving the deadline changes the dates, not the stored lengths
+        with self.assertNumQueries(1):
+            self.project.deadline = self.today + timedelta(days=3)
+            self.assertEqual(project_schedule(self.project, today=self.today).slack, -3)
+
+        # Linked tasks get their latest finish, the others the priority spread
+        plan = {change.task_id: change.new_deadline for change in plan_task_deadlines(self.project, self.today).changes}
+        self.assertEqual(plan[self.b.pk], self.project.deadline - timedelta(days=1))
+
+    def test_cycles(self):
+        add_dependency(self.a, self.b)
+        add_dependency(self.b, self.c)
+        for predecessor, successor in ((self.c, self.a), (self.b, self.a), (self.a, self.a)):
+            with self.subTest(predecessor=predecessor.title, successor=successor.title):
+                with self.assertRaises(ValidationError):
+                    add_dependency(predecessor, successor)
+        other = Task.objects.create(
+            project=Project.objects.create(user=self.user, title='Autre', deadline=self.today),
+            title='Ailleurs', deadline=self.today,
+        )
+        with self.assertRaises(ValidationError):
+            add_dependency(self.a, other)
+        self.assertEqual(TaskDependency.objects.count(), 2)
+
+    def test_incremental_matches_full_schedule(self):
+        tasks = [self.a, self.b, self.c, self.d] + [
+            Task.objects.create(project=self.project, title=f'Tâche {i}', deadline=self.today, duration=i % 4)
+            for i in range(16)
+        ]
+        for i, task in enumerate(tasks):
+            for j in (i + 1, i + 3, i + 7):
+                if j < len(tasks):
+                    add_dependency(task, tasks[j])
+        steps = (
+            lambda: setattr(tasks[5], 'duration', 9) or tasks[5].save(),
+            lambda: apply_task_operation(self.user, [t.pk for t in tasks[3:9]], 'complete'),
+            lambda: remove_dependency(tasks[4].pk, tasks[7].pk),
+            lambda: Task.objects.get(pk=tasks[10].pk).delete(),
+            lambda: apply_task_operation(self.user, [tasks[12].pk], 'delete'),
+            lambda: apply_task_operation(self.user, [t.pk for t in tasks[3:9]], 'uncomplete'),
+        )
+        for step in steps:
+            step()
+            # A full recomputation finds nothing left to change
+            self.assertEqual(schedule_project(self.project), 0)
+
+    def test_views(self):
+        url = reverse('projects:task_dependency_create', args=[self.b.pk])
+        response = self.client.post(url, {'predecessor': self.a.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(
+            reverse('projects:task_dependency_create', args=[self.a.pk]),
+            {'predecessor': self.b.pk}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            reverse('projects:task_duration', args=[self.a.pk]), {'duration': 5}, content_type='application/json',
+        )
+        self.assertEqual(response.json(), {'task': self.a.pk, 'duration': 5})
+        schedule = self.client.get(reverse('projects:api_project_schedule', args=[self.project.pk])).json()
+        self.assertEqual((schedule['length'], schedule['critical_path']), (8, [self.a.pk, self.b.pk]))
+
+        url = reverse('projects:task_dependency_delete', args=[self.b.pk, self.a.pk])
+        self.assertEqual(self.client.post(url).status_code, 302)
+        self.assertEqual(self.client.post(url).status_code, 404)
+        self.assertEqual(Task.objects.get(pk=self.b.pk).before_days, 0)
 
-# Create your tests here.
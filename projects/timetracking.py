@@ -0,0 +1,183 @@
+"""Time tracking: an append-only ledger of ``TimeEntry`` rows and running timers.
+
+Every entry adds its duration to ``Task.time_spent`` and ``Project.time_spent``
+(seconds; ``Project.total_time`` is the same in hours, computed by the
+database) in the transaction that appends it, so totals never need a
+``SUM()`` over the ledger. ``reconcile_task_counters()`` recounts the project
+totals from the tasks after set-based moves and deletions.
+
+A running timer is the user's ``Timer`` row. Clients keep it alive with
+``heartbeat()``, a single-row UPDATE on the unique ``user`` column: nothing
+is appended and no total changes on a tick, so ticks from many users stay
+cheap. The time is booked when the timer stops, as one entry ending now, or
+at the last heartbeat when the client went silent for more than
+``HEARTBEAT_TIMEOUT`` (``close_stale_timers()`` stops those).
+
+``compact_time_entries()`` folds old entries into one ``SOURCE_DAILY`` entry
+per task and day; the totals do not change.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import router, transaction
+from django.db.models import F, Max, Min
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .cache import bump_user_version
+from .deletion import PURGE_BATCH_SIZE
+from .events import publish
+from .models import Project, Task, TimeEntry, Timer
+from .rollups import refresh_project_snapshots
+
+# Silence after which a timer is considered abandoned
+HEARTBEAT_TIMEOUT = timedelta(minutes=10)
+# Une saisie manuelle couvre au plus une journée
+MAX_ENTRY_DURATION = 24 * 3600
+COMPACT_AFTER = timedelta(days=90)
+COMPACT_BATCH_SIZE = 5000
+
+
+def day_start(day):
+    """Midnight of ``day`` in the current time zone, where day-level entries start."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _add_project_time(project_id, seconds):
+    Project.objects.filter(pk=project_id).update(
+        time_spent=Greatest(F('time_spent') + seconds, 0),
+        # Cards and list ETags key on updated_at
+        updated_at=timezone.now(),
+    )
+
+
+def _book(user_id, task, started_at, duration, source, note=''):
+    with transaction.atomic(using=router.db_for_write(TimeEntry)):
+        entry = TimeEntry.objects.create(
+            task_id=task.pk, started_at=started_at, duration=duration, source=source, note=note,
+        )
+        Task.objects.filter(pk=task.pk).update(time_spent=F('time_spent') + duration)
+        _add_project_time(task.project_id, duration)
+        refresh_project_snapshots([task.project_id])
+        publish(user_id, {'type': 'project.updated', 'project': task.project_id}, router.db_for_write(Project))
+        bump_user_version(user_id, using=router.db_for_write(Project))
+    return entry
+
+
+def record_time(user, task, started_at, duration, note=''):
+    """Append a manual entry of ``duration`` seconds on ``task`` (of ``user``)."""
+    return _book(user.pk, task, started_at, duration, TimeEntry.SOURCE_MANUAL, note)
+
+
+def transfer_task_time(seconds, from_project_id, to_project_id):
+    """Move the time of a task that changed project from one project total to the other."""
+    if not seconds:
+        return
+    with transaction.atomic(using=router.db_for_write(Project)):
+        _add_project_time(from_project_id, -seconds)
+        _add_project_time(to_project_id, seconds)
+        refresh_project_snapshots([from_project_id, to_project_id])
+
+
+def discount_task_time(seconds, project_id):
+    """Remove the time of a deleted task from its project total."""
+    if not seconds:
+        return
+    with transaction.atomic(using=router.db_for_write(Project)):
+        _add_project_time(project_id, -seconds)
+        refresh_project_snapshots([project_id])
+
+
+# Timers ----------------------------------------------------------------------
+
+def _stop(timer, now):
+    """Delete ``timer`` and book its time; ``None`` if another request stopped it first."""
+    with transaction.atomic(using=router.db_for_write(Timer)):
+        deleted, _ = Timer.objects.filter(pk=timer.pk).delete()
+        if not deleted:
+            return None
+        end = now if now - timer.last_seen_at <= HEARTBEAT_TIMEOUT else timer.last_seen_at
+        duration = int((end - timer.started_at).total_seconds())
+        if duration <= 0:
+            return None
+        return _book(timer.user_id, timer.task, timer.started_at, duration, TimeEntry.SOURCE_TIMER)
+
+
+def stop_timer(user, now=None):
+    """Stop the running timer of ``user``; return the entry booked, if any."""
+    timer = Timer.objects.filter(user=user).select_related('task').first()
+    if timer is None:
+        return None
+    return _stop(timer, now or timezone.now())
+
+
+def start_timer(user, task, now=None):
+    """Start timing ``task``, stopping the timer already running for ``user``."""
+    now = now or timezone.now()
+    with transaction.atomic(using=router.db_for_write(Timer)):
+        stop_timer(user, now)
+        return Timer.objects.create(user=user, task=task, started_at=now, last_seen_at=now)
+
+
+def heartbeat(user, now=None):
+    """Keep the timer of ``user`` alive; ``False`` when it is not running (any more).
+
+    A timer silent for longer than ``HEARTBEAT_TIMEOUT`` is not revived:
+    the gap would otherwise be booked as worked time.
+    """
+    now = now or timezone.now()
+    return bool(
+        Timer.objects.filter(user=user, last_seen_at__gte=now - HEARTBEAT_TIMEOUT)
+        .update(last_seen_at=now)
+    )
+
+
+def close_stale_timers(now=None):
+    """Stop the timers whose client went silent; return the number stopped."""
+    now = now or timezone.now()
+    stale = Timer.objects.filter(last_seen_at__lt=now - HEARTBEAT_TIMEOUT).select_related('task')
+    return sum(_stop(timer, now) is not None for timer in stale)
+
+
+# Compaction ------------------------------------------------------------------
+
+def compact_time_entries(before=None, batch_size=COMPACT_BATCH_SIZE):
+    """Fold the entries started before ``before`` into one entry per task and day.
+
+    ``before`` defaults to ``COMPACT_AFTER`` ago. Entries are read one primary
+    key range at a time, each range in its own short transaction, and only
+    days with several entries in the range are rewritten. Returns the number
+    of entries removed.
+    """
+    before = before or timezone.now() - COMPACT_AFTER
+    old = TimeEntry.objects.filter(started_at__lt=before)
+    bounds = old.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return 0
+    using = router.db_for_write(TimeEntry)
+    removed = 0
+    for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+        with transaction.atomic(using=using):
+            days = defaultdict(list)
+            rows = old.filter(pk__gte=start, pk__lt=start + batch_size).values_list(
+                'pk', 'task_id', 'started_at', 'duration'
+            )
+            for pk, task_id, started_at, duration in rows:
+                days[task_id, timezone.localdate(started_at)].append((pk, duration))
+            folded, buckets = [], []
+            for (task_id, day), entries in days.items():
+                if len(entries) < 2:
+                    continue
+                folded.extend(pk for pk, _ in entries)
+                buckets.append(TimeEntry(
+                    task_id=task_id, started_at=day_start(day),
+                    duration=sum(duration for _, duration in entries), source=TimeEntry.SOURCE_DAILY,
+                ))
+            if folded:
+                # A range can fold up to batch_size entries: delete them in
+                # chunks that each bind fewer parameters than SQLite accepts
+                for chunk in range(0, len(folded), PURGE_BATCH_SIZE):
+                    TimeEntry.objects.filter(pk__in=folded[chunk:chunk + PURGE_BATCH_SIZE])._raw_delete(using)
+                TimeEntry.objects.bulk_create(buckets)
+                removed += len(folded) - len(buckets)
+    return removed
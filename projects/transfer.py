@@ -0,0 +1,234 @@
+"""Bulk export and import of projects and tasks.
+
+Exports stream a user's rows as CSV or NDJSON (one JSON object per line),
+reading them with ``.iterator(chunk_size=...)`` and emitting one chunk of
+text at a time, so memory stays flat whatever the number of rows.
+
+Imports validate every row with the rules of ``ProjectForm``/``TaskForm``
+(through ``ProjectImportForm``/``TaskImportForm``) and insert the valid ones
+with ``bulk_create()``, one transaction per batch. Invalid rows are skipped
+and reported with their line number. Since ``bulk_create()`` bypasses model
+signals, the search index, the task counters, the daily snapshots and the
+list cache are brought up to date explicitly afterwards.
+
+Project rows keep their original ``id`` in the export. Importing projects
+returns the mapping from those ids to the new ones, which is then passed to
+``import_tasks()`` so the tasks follow their project.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router, transaction
+
+from .cache import bump_user_version
+from .counters import reconcile_in_batches
+from .forms import ProjectImportForm, TaskImportForm
+from .models import Project, Task
+from .rollups import refresh_project_snapshots
+from .search import get_search_backend
+
+FORMATS = ('csv', 'ndjson')
+KINDS = ('projects', 'tasks')
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 5000
+# Errors kept in a report stored as a job result; the count is always exact
+MAX_REPORTED_ERRORS = 100
+
+COLUMNS = {
+    'projects': ('id', 'title', 'description', 'deadline', 'status', 'progress'),
+    'tasks': ('id', 'project', 'title', 'description', 'deadline', 'priority', 'is_completed'),
+}
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_queryset(user, kind):
+    if kind == 'projects':
+        # Served in order by project_user_created_idx
+        return Project.objects.filter(user=user).order_by('created_at')
+    return Task.objects.visible().filter(project__user=user).order_by()
+
+
+def export_rows(user, kind, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the ``kind`` rows of ``user`` as ``fmt`` text, one chunk at a time."""
+    columns = COLUMNS[kind]
+    rows = iter(export_queryset(user, kind).values_list(*columns).iterator(chunk_size=chunk_size))
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+    while chunk := list(islice(rows, chunk_size)):
+        if fmt == 'csv':
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+        else:
+            yield ''.join(
+                json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+                for row in chunk
+            )
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line, data)`` for every record of a text ``stream``.
+
+    ``data`` is None when the line could not be decoded.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for data in reader:
+            yield reader.line_num, data
+        return
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        yield line, data if isinstance(data, dict) else None
+
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+    id_map: dict = field(default_factory=dict)
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'id_map': self.id_map,
+        }
+
+
+class _RowValidator:
+    """Validate rows one after the other with a single form instance.
+
+    Instantiating a ModelForm deep-copies all of its fields, which costs more
+    than validating a row, so the form is built once and re-bound to each
+    row instead.
+    """
+
+    def __init__(self, form_class):
+        self.form = form_class()
+
+    def __call__(self, data):
+        """Return ``(instance, None)`` for a valid row, ``(None, errors)`` otherwise."""
+        form = self.form
+        form.data = data
+        form.is_bound = True
+        form._errors = None
+        form.instance = form._meta.model()
+        if form.is_valid():
+            return form.instance, None
+        return None, {name: list(messages) for name, messages in form.errors.items()}
+
+
+def _flush(model, batch, user, report):
+    if not batch:
+        return
+    with transaction.atomic(using=router.db_for_write(model)):
+        model.objects.bulk_create(batch)
+        if model is Project:
+            get_search_backend().index_bulk(user.pk, projects=batch)
+            refresh_project_snapshots(project.pk for project in batch)
+        else:
+            get_search_backend().index_bulk(user.pk, tasks=batch)
+    report.created += len(batch)
+
+
+def import_projects(user, rows, batch_size=IMPORT_BATCH_SIZE):
+    """Create the projects of ``rows`` (from ``read_rows()``) for ``user``."""
+    report = ImportReport()
+    validate = _RowValidator(ProjectImportForm)
+    batch, original_ids = [], []
+
+    def flush():
+        _flush(Project, batch, user, report)
+        for project, original_id in zip(batch, original_ids):
+            if original_id not in (None, ''):
+                report.id_map[str(original_id)] = project.pk
+        batch.clear()
+        original_ids.clear()
+
+    for line, data in rows:
+        if data is None:
+            report.add_error(line, {'__all__': ['Ligne illisible.']})
+            continue
+        project, errors = validate(data)
+        if errors:
+            report.add_error(line, errors)
+            continue
+        project.user = user
+        batch.append(project)
+        original_ids.append(data.get('id'))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    if report.created:
+        bump_user_version(user.pk, using=router.db_for_write(Project))
+    return report
+
+
+def import_tasks(user, rows, project_map=None, batch_size=IMPORT_BATCH_SIZE):
+    """Create the tasks of ``rows`` (from ``read_rows()``) in projects of ``user``.
+
+    The ``project`` column is looked up in ``project_map`` (original id to new
+    id, as returned by ``import_projects()``) when given, otherwise it must be
+    the id of one of the user's projects.
+    """
+    report = ImportReport()
+    validate = _RowValidator(TaskImportForm)
+    owned = set(Project.objects.filter(user=user).values_list('pk', flat=True))
+    if project_map is None:
+        project_map = {str(pk): pk for pk in owned}
+    else:
+        # A map read from a file must not reach into another user's projects
+        project_map = {str(old): new for old, new in project_map.items() if new in owned}
+    batch = []
+    for line, data in rows:
+        if data is None:
+            report.add_error(line, {'__all__': ['Ligne illisible.']})
+            continue
+        task, errors = validate(data)
+        project_id = project_map.get(str(data.get('project', '')))
+        if project_id is None:
+            errors = dict(errors or {}, project=['Projet inconnu.'])
+        if errors:
+            report.add_error(line, errors)
+            continue
+        task.project_id = project_id
+        batch.append(task)
+        if len(batch) >= batch_size:
+            _flush(Task, batch, user, report)
+            batch.clear()
+    _flush(Task, batch, user, report)
+    if report.created:
+        # bulk_create() skipped the signals maintaining the counters
+        reconcile_in_batches(Project.objects.filter(user=user))
+    return report
+
+
+def import_file(user, stream, kind, fmt, project_map=None, batch_size=IMPORT_BATCH_SIZE):
+    """Import a CSV/NDJSON text ``stream`` of ``kind`` rows for ``user``."""
+    rows = read_rows(stream, fmt)
+    if kind == 'projects':
+        return import_projects(user, rows, batch_size)
+    return import_tasks(user, rows, project_map, batch_size)
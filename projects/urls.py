@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'projects'
 
@@ -7,7 +7,34 @@ urlpatterns = [
     path('', views.project_list, name='project_list'),
     path('create/', views.project_create, name='project_create'),
     path('<int:pk>/', views.project_detail, name='project_detail'),
+    path('<int:pk>/card/', views.project_card, name='project_card'),
+    path('events/', views.project_events, name='project_events'),
     path('<int:pk>/update/', views.project_update, name='project_update'),
+    path('<int:pk>/reschedule/preview/', views.project_reschedule_preview, name='project_reschedule_preview'),
     path('<int:pk>/delete/', views.project_delete, name='project_delete'),
+    path('<int:pk>/restore/', views.project_restore, name='project_restore'),
+    path('tasks/bulk/', views.task_bulk, name='task_bulk'),
+    path('tasks/<int:pk>/timer/start/', views.timer_start, name='timer_start'),
+    path('tasks/timer/stop/', views.timer_stop, name='timer_stop'),
+    path('tasks/timer/heartbeat/', views.timer_heartbeat, name='timer_heartbeat'),
+    path('tasks/time/', views.time_entry_create, name='time_entry_create'),
+    path('tasks/<int:pk>/dependencies/', views.task_dependency_create, name='task_dependency_create'),
+    path('tasks/<int:pk>/dependencies/<int:predecessor>/delete/', views.task_dependency_delete, name='task_dependency_delete'),
+    path('tasks/<int:pk>/duration/', views.task_duration, name='task_duration'),
+    path('export/', views.data_export, name='data_export'),
+    path('import/', views.data_import, name='data_import'),
+    path('jobs/<int:pk>/', views.job_status, name='job_status'),
+    path('cache/stats/', views.cache_statistics, name='cache_statistics'),
+    path('metrics/', views.metrics, name='metrics'),
     path('logout/', views.logout_view, name='logout'),
+    # API JSON en lecture seule
+    path('api/v1/projects/', api.project_list, name='api_project_list'),
+    path('api/v1/projects/<int:pk>/', api.project_detail, name='api_project_detail'),
+    path('api/v1/projects/<int:pk>/tasks/', api.project_tasks, name='api_project_tasks'),
+    path('api/v1/projects/<int:pk>/stats/', api.project_stats, name='api_project_stats'),
+    path('api/v1/projects/<int:pk>/burndown/', api.project_burndown, name='api_project_burndown'),
+    path('api/v1/projects/<int:pk>/schedule/', api.project_schedule, name='api_project_schedule'),
+    path('api/v1/tasks/<int:pk>/', api.task_detail, name='api_task_detail'),
+    path('api/v1/stats/', api.stats, name='api_stats'),
+    path('api/v1/stats/history/', api.stats_history, name='api_stats_history'),
 ]
\ No newline at end of file
@@ -1,47 +1,238 @@
+import hashlib
+import json
+import os
+import tempfile
+from functools import partial
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Q
-from .models import Project, Task
-from .forms import ProjectForm, TaskForm, ProjectUpdateForm
+from django.core.handlers.asgi import ASGIRequest
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import get_template, render_to_string
+from django.urls import reverse
+from django.utils.html import format_html
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import require_POST
+from .models import Job, Project, Task, Timer
+from .forms import (
+    BulkTaskForm, ProjectForm, TaskForm, ProjectUpdateForm, TaskDependencyForm, TaskDurationForm, TimeEntryForm,
+)
+from .bulk import apply_task_operation
+from .deletion import UNDO_WINDOW, restore_project, soft_delete_project
+from .dependencies import add_dependency, remove_dependency
+from .timetracking import day_start, heartbeat, record_time, start_timer, stop_timer
+from .pagination import KeysetPaginator
+from .asynchronous import aget_object_or_404, condition, gather_queries
+from .events import event_stream
+from .instrumentation.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry
+from .routers import read_only_view
+from .scheduling import plan_task_deadlines
+from . import jobs
+from .search import get_search_backend
+from .transfer import CONTENT_TYPES, FORMATS, KINDS, export_rows
+from .cache import (
+    bump_user_version, cache_stats, get_cached_list, last_modified, list_cache_key, set_cached_list, user_version,
+)
 from django.utils import timezone
 from django.contrib.auth import logout
-from datetime import timedelta, date
+from datetime import date
+from itertools import islice
 
-@login_required
-def project_list(request):
-    """1.2 - Lister tous les projets"""
-    projects = Project.objects.filter(user=request.user)
-    
-    # Filtres
+PROJECTS_PER_PAGE = 24
+STREAM_CHUNK_SIZE = 100
+SEARCH_RESULTS_LIMIT = 200
+STREAM_MARKER = '<!--project-cards-->'
+DUE_FILTERS = ('overdue', 'week', 'month')
+# Tris sur plusieurs colonnes: projets ouverts d'abord, par échéance
+SORT_ORDERINGS = {'urgency': ['is_closed', 'deadline']}
+
+def _list_parameters(request):
+    """Read and validate the filters, search and sort of ``project_list``."""
     status_filter = request.GET.get('status', '')
-    if status_filter:
-        projects = projects.filter(status=status_filter)
-    
-    # Recherche
+    due_filter = request.GET.get('due', '')
+    if due_filter not in DUE_FILTERS:
+        due_filter = ''
     search_query = request.GET.get('search', '')
-    if search_query:
-        projects = projects.filter(
-            Q(title__icontains=search_query) | 
-            Q(description__icontains=search_query)
-        )
-    
-    # Tri
-    sort_by = request.GET.get('sort', '-created_at')  # Par défaut: plus récent d'abord
+    default_sort = 'relevance' if search_query else '-created_at'
+    sort_by = request.GET.get('sort') or default_sort  # Par défaut: plus récent d'abord
     valid_sort_fields = ['title', '-title', 'deadline', '-deadline', 'status', '-status',
-                        'progress', '-progress', 'created_at', '-created_at']
-    if sort_by in valid_sort_fields:
-        projects = projects.order_by(sort_by)
-    
-    context = {
-        'projects': projects,
+                        'progress', '-progress', 'created_at', '-created_at', 'urgency']
+    if search_query:
+        valid_sort_fields.append('relevance')
+    if sort_by not in valid_sort_fields:
+        sort_by = default_sort
+    return {
         'current_filter': status_filter,
+        'current_due': due_filter,
         'search_query': search_query,
         'current_sort': sort_by,
     }
+
+def _project_list_etag(request):
+    # Pending flash messages must be rendered, never answered with a 304
+    if request.GET.get('stream') or len(messages.get_messages(request)):
+        return None
+    parts = [
+        str(user_version(request.user.pk)),
+        timezone.localdate().isoformat(),
+        request.GET.urlencode(),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ]
+    return hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+
+def _project_list_last_modified(request):
+    if request.GET.get('stream') or len(messages.get_messages(request)):
+        return None
+    return last_modified(request.user.pk)
+
+@login_required
+@read_only_view
+@condition(etag_func=_project_list_etag, last_modified_func=_project_list_last_modified)
+async def project_list(request):
+    """1.2 - Lister tous les projets
+
+    Results are served one keyset page at a time (``?cursor=``) so that a user
+    with tens of thousands of projects never has them all rendered into one
+    response. ``?stream=1`` instead streams every matching card in chunks with
+    constant memory.
+
+    Rendered pages of cards are cached per user (see ``projects.cache``) and
+    the response carries an ``ETag``/``Last-Modified`` so that an unchanged
+    list is answered with a 304.
+    """
+    context = _list_parameters(request)
+    today = timezone.localdate()
+    
+    if request.GET.get('stream'):
+        return _stream_project_list(request, _stream_projects(request, context), context)
+    
+    key = await sync_to_async(list_cache_key)(request.user.pk, request.GET, today)
+    fragment = await sync_to_async(get_cached_list)(key)
+    if fragment is None:
+        projects, next_url = await _list_projects(request, context)
+        fragment = {
+            'cards': render_to_string('projects/includes/project_cards.html', {
+                'projects': projects,
+                'today': today,
+            }, request=request),
+            'next_url': next_url,
+        }
+        await sync_to_async(set_cached_list)(key, fragment)
+    
+    context.update({
+        'cards': mark_safe(fragment['cards']),
+        'next_url': fragment['next_url'],
+    })
     return render(request, 'projects/project_list.html', context)
 
+def _search_hits(request, context):
+    # Recherche (index plein texte, voir projects.search)
+    if not context['search_query']:
+        return []
+    return get_search_backend().search(
+        request.user, context['search_query'], limit=SEARCH_RESULTS_LIMIT
+    )
+
+def _list_queryset(request, context, hits):
+    today = timezone.localdate()
+    # Retard et jours restants calculés par la base, pas par carte
+    projects = Project.objects.filter(user=request.user).with_timeline(today)
+    
+    # Filtres
+    if context['current_filter']:
+        projects = projects.filter(status=context['current_filter'])
+    if context['current_due']:
+        projects = projects.due(context['current_due'], today)
+    if context['search_query']:
+        projects = projects.filter(pk__in=[hit.project_id for hit in hits])
+    return projects
+
+def _ordering(context):
+    return SORT_ORDERINGS.get(context['current_sort'], context['current_sort'])
+
+def _ranked(projects, hits):
+    # Hits are capped at SEARCH_RESULTS_LIMIT, so they fit on a single page
+    by_pk = {project.pk: project for project in projects}
+    return [by_pk[hit.project_id] for hit in hits if hit.project_id in by_pk]
+
+async def _list_projects(request, context):
+    """Run the list query for ``context`` and return ``(projects, next_url)`` for one page."""
+    hits = await sync_to_async(_search_hits)(request, context)
+    projects = _list_queryset(request, context, hits)
+    snippets = {hit.project_id: hit.snippet for hit in hits}
+    
+    # Tri
+    if context['current_sort'] == 'relevance':
+        ranked = _ranked([project async for project in projects.order_by().aiterator()], hits)
+        return list(_with_snippets(ranked, snippets)), None
+    
+    paginator = KeysetPaginator(projects, _ordering(context), per_page=PROJECTS_PER_PAGE)
+    page = await paginator.aget_page(request.GET.get('cursor'))
+    next_url = None
+    if page.has_next:
+        query = request.GET.copy()
+        query['cursor'] = page.next_cursor
+        next_url = f'?{query.urlencode()}'
+    return list(_with_snippets(page, snippets)), next_url
+
+def _stream_projects(request, context):
+    """Lazily yield every project matching ``context``.
+
+    The queries only run once the response is being streamed.
+    """
+    hits = _search_hits(request, context)
+    projects = _list_queryset(request, context, hits)
+    if context['current_sort'] == 'relevance':
+        rows = _ranked(projects.order_by(), hits)
+    else:
+        paginator = KeysetPaginator(projects, _ordering(context), per_page=PROJECTS_PER_PAGE)
+        rows = paginator.ordered_queryset().iterator(chunk_size=STREAM_CHUNK_SIZE)
+    yield from _with_snippets(rows, {hit.project_id: hit.snippet for hit in hits})
+
+def _with_snippets(projects, snippets):
+    """Attach the search snippet (if any) to each project as ``search_snippet``."""
+    for project in projects:
+        project.search_snippet = snippets.get(project.pk)
+        yield project
+
+def _stream_project_list(request, projects, context):
+    """Stream the project list page, rendering cards ``STREAM_CHUNK_SIZE`` at a time.
+
+    The page is rendered once with a marker where the cards go; the markup
+    before the marker is sent immediately, then the cards follow in chunks.
+    ``projects`` should be a lazy iterable (e.g. ``.iterator()``) so the
+    queryset is never held in memory.
+    """
+    context = dict(context, streaming=True, stream_marker=STREAM_MARKER)
+    head, tail = render_to_string(
+        'projects/project_list.html', context, request=request
+    ).split(STREAM_MARKER, 1)
+    card_template = get_template('projects/includes/project_card.html')
+    today = timezone.localdate()
+
+    def chunks():
+        yield head
+        projects_iter = iter(projects)
+        count = 0
+        while batch := list(islice(projects_iter, STREAM_CHUNK_SIZE)):
+            yield ''.join(
+                card_template.render({'project': project, 'today': today}, request)
+                for project in batch
+            )
+            count += len(batch)
+        if not count:
+            yield render_to_string('projects/includes/project_empty.html', request=request)
+        yield tail
+
+    return StreamingHttpResponse(chunks(), content_type='text/html; charset=utf-8')
+
 @login_required
 def project_create(request):
     """1.1 - Créer un nouveau projet"""
@@ -62,34 +253,79 @@ def project_create(request):
     })
 
 @login_required
-def project_detail(request, pk):
+@read_only_view
+async def project_detail(request, pk):
     """1.2 - Afficher les détails d'un projet"""
-    project = get_object_or_404(Project, pk=pk, user=request.user)
-    tasks = project.tasks.all()
-    
-    # Statistiques des tâches
-    total_tasks = tasks.count()
-    completed_tasks = tasks.filter(is_completed=True).count()
-    pending_tasks = total_tasks - completed_tasks
+    # Projet, statistiques, tâches, projets cibles d'un déplacement et chronomètre:
+    # requêtes lancées en parallèle
+    tasks = Task.objects.filter(project_id=pk, project__user=request.user)
+    other_projects = (
+        Project.objects.filter(user=request.user).exclude(pk=pk)
+        .order_by('title').values_list('pk', 'title')
+    )
+    running = Timer.objects.filter(user=request.user).values_list('task_id', flat=True)
+    project, statistics, tasks, other_projects, running_task_id = await gather_queries(
+        partial(get_object_or_404, Project, pk=pk, user=request.user),
+        tasks.statistics,
+        partial(list, tasks.with_timeline()),
+        partial(list, other_projects),
+        running.first,
+    )
+    for name, value in statistics.items():
+        setattr(project, name, value)
     
     context = {
         'project': project,
         'tasks': tasks,
-        'total_tasks': total_tasks,
-        'completed_tasks': completed_tasks,
-        'pending_tasks': pending_tasks,
+        'total_tasks': project.total_tasks,
+        'completed_tasks': project.completed_tasks,
+        'pending_tasks': project.pending_tasks,
+        'overdue_tasks': project.overdue_tasks,
+        'other_projects': other_projects,
+        'bulk_operations': BulkTaskForm.OPERATION_CHOICES,
+        'priorities': Task.PRIORITY_CHOICES,
+        'running_task_id': running_task_id,
+        'today': timezone.localdate(),
     }
     return render(request, 'projects/project_detail.html', context)
 
+@login_required
+@read_only_view
+async def project_card(request, pk):
+    """Carte d'un projet seule, rechargée par la liste à chaque événement qui le concerne"""
+    today = timezone.localdate()
+    project = await aget_object_or_404(
+        Project.objects.with_timeline(today), pk=pk, user=request.user
+    )
+    return render(request, 'projects/includes/project_card.html', {'project': project, 'today': today})
+
+@login_required
+async def project_events(request):
+    """Stream the changes to the user's projects as Server-Sent Events.
+
+    See ``projects.events``. Only served under ASGI: with WSGI the open
+    stream would hold a worker thread for as long as the page stays open.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': "Les mises à jour en direct nécessitent un serveur ASGI."}, status=501
+        )
+    response = StreamingHttpResponse(event_stream(request.user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Pas de mise en tampon par un proxy nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 def project_update(request, pk):
     """1.3 - Modifier un projet et 1.4 - Recalculer les délais"""
     project = get_object_or_404(Project, pk=pk, user=request.user)
     
     if request.method == 'POST':
+        # is_valid() copies the cleaned data onto the instance: read it first
+        old_deadline = project.deadline
         form = ProjectUpdateForm(request.POST, instance=project)
         if form.is_valid():
-            old_deadline = project.deadline
             project = form.save()
             
             # 1.4 - Vérifier si la deadline a changé
@@ -97,12 +333,20 @@ def project_update(request, pk):
                 messages.warning(request, 
                     f'La deadline a été modifiée. Nouvelle date: {project.deadline}.'
                 )
-                # Recalculate task deadlines and report changes
-                updated_count, overdue_count = _recalculate_task_deadlines(project)
-                if updated_count:
-                    messages.info(request, f'{updated_count} tâche(s) ont été réordonnées en fonction de la nouvelle deadline.')
-                if overdue_count:
-                    messages.error(request, f'Attention : {overdue_count} tâche(s) sont maintenant en retard.')
+                # Recalculate task deadlines in the background and report changes
+                job = jobs.enqueue(
+                    'recalculate_task_deadlines',
+                    {'project_id': project.pk},
+                    user=request.user,
+                    idempotency_key=f'reschedule:{project.pk}:{project.updated_at.isoformat()}',
+                )
+                if job.status == Job.STATUS_SUCCEEDED:
+                    if job.result['updated_count']:
+                        messages.info(request, f"{job.result['updated_count']} tâche(s) ont été réordonnées en fonction de la nouvelle deadline.")
+                    if job.result['overdue_count']:
+                        messages.error(request, f"Attention : {job.result['overdue_count']} tâche(s) sont maintenant en retard.")
+                else:
+                    messages.info(request, f'Les délais des tâches sont en cours de recalcul (tâche de fond n°{job.pk}).')
             
             messages.success(request, f'Le projet "{project.title}" a été modifié avec succès!')
             return redirect('projects:project_detail', pk=project.pk)
@@ -115,21 +359,327 @@ def project_update(request, pk):
         'project': project,
     })
 
+@login_required
+def project_reschedule_preview(request, pk):
+    """Dry run of 1.4: list the task deadlines a new project deadline would change.
+
+    The candidate deadline is read from ``?deadline=YYYY-MM-DD`` and defaults
+    to the current one; nothing is written.
+    """
+    project = get_object_or_404(Project, pk=pk, user=request.user)
+    deadline = request.GET.get('deadline')
+    if deadline:
+        try:
+            project.deadline = date.fromisoformat(deadline)
+        except ValueError:
+            return JsonResponse({'error': 'Date limite invalide.'}, status=400)
+    plan = plan_task_deadlines(project)
+    return JsonResponse(plan.as_dict())
+
 @login_required
 def project_delete(request, pk):
     """1.5 - Supprimer un projet"""
     project = get_object_or_404(Project, pk=pk, user=request.user)
     
     if request.method == 'POST':
-        project_title = project.title
-        project.delete()
-        messages.success(request, f'Le projet "{project_title}" a été supprimé avec succès!')
+        # Suppression logique: la purge passe en tâche de fond à la fin du délai d'annulation
+        soft_delete_project(project)
+        jobs.enqueue(
+            'purge_deleted_projects', {'user_id': request.user.pk},
+            user=request.user, delay=int(UNDO_WINDOW.total_seconds()),
+        )
+        messages.success(request, format_html(
+            'Le projet "{}" a été supprimé. '
+            '<form method="post" action="{}" class="inline ml-2">'
+            '<input type="hidden" name="csrfmiddlewaretoken" value="{}">'
+            '<button type="submit" class="underline font-medium">Annuler</button></form>',
+            project.title, reverse('projects:project_restore', args=[project.pk]), get_token(request),
+        ))
         return redirect('projects:project_list')
     
     return render(request, 'projects/project_confirm_delete.html', {
         'project': project
     })
 
+@login_required
+@require_POST
+def project_restore(request, pk):
+    """Undo a deletion during ``UNDO_WINDOW`` (see projects.deletion)."""
+    project = restore_project(request.user, pk)
+    if project is None:
+        messages.error(request, "Ce projet ne peut plus être restauré: le délai d'annulation est écoulé.")
+        return redirect('projects:project_list')
+    messages.success(request, f'Le projet "{project.title}" a été restauré.')
+    return redirect('projects:project_detail', pk=project.pk)
+
+BULK_DONE = {
+    'complete': 'marquée(s) comme terminée(s)',
+    'uncomplete': 'marquée(s) comme non terminée(s)',
+    'priority': 'repriorisée(s)',
+    'shift': 'replanifiée(s)',
+    'move': 'déplacée(s)',
+    'delete': 'supprimée(s)',
+}
+
+@login_required
+@require_POST
+def task_bulk(request):
+    """Apply one operation to many tasks: complete, reprioritize, shift, move or delete.
+
+    Takes the ``tasks`` ids with ``operation`` and its parameter (``priority``,
+    ``days`` or ``project``), either as a form post, which redirects to
+    ``next``, or as a JSON body, answered in JSON. Whatever the number of
+    tasks, the change is one set-based query (see ``projects.bulk``).
+    """
+    as_json = request.content_type == 'application/json'
+    data = _posted_data(request)
+    if data is None:
+        return JsonResponse({'error': 'Corps JSON invalide.'}, status=400)
+    form = BulkTaskForm(data)
+    if not form.is_valid():
+        if as_json:
+            return JsonResponse({'error': 'Opération invalide.', 'fields': form.errors}, status=400)
+        _form_errors(request, form)
+        return _redirect_next(request)
+    
+    result = apply_task_operation(
+        request.user, form.cleaned_data['tasks'], form.cleaned_data['operation'],
+        priority=form.cleaned_data['priority'], days=form.cleaned_data['days'],
+        project=form.cleaned_data['project'],
+    )
+    if as_json:
+        return JsonResponse(result.as_dict())
+    if result.count:
+        messages.success(request, f'{result.count} tâche(s) {BULK_DONE[result.operation]}.')
+    else:
+        messages.warning(request, "Aucune tâche n'a été modifiée.")
+    return _redirect_next(request)
+
+def _posted_data(request):
+    """The JSON object of an ``application/json`` body, otherwise ``request.POST``.
+
+    ``None`` when the body is not a JSON object.
+    """
+    if request.content_type != 'application/json':
+        return request.POST
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def _form_errors(request, form):
+    for errors in form.errors.values():
+        for error in errors:
+            messages.error(request, error)
+
+@login_required
+@require_POST
+def timer_start(request, pk):
+    """Start timing a task, stopping the timer already running (see projects.timetracking)."""
+    task = get_object_or_404(Task.objects.visible(), pk=pk, project__user=request.user)
+    timer = start_timer(request.user, task)
+    if request.content_type == 'application/json':
+        return JsonResponse({'task': task.pk, 'started_at': timer.started_at})
+    messages.success(request, f'Chronomètre démarré sur « {task.title} ».')
+    return _redirect_next(request)
+
+@login_required
+@require_POST
+def timer_stop(request):
+    entry = stop_timer(request.user)
+    if request.content_type == 'application/json':
+        return JsonResponse({
+            'entry': entry.pk if entry else None,
+            'duration': entry.duration if entry else 0,
+        })
+    if entry:
+        messages.success(request, f'{entry.duration // 60} minute(s) enregistrée(s).')
+    else:
+        messages.warning(request, "Aucun chronomètre en cours.")
+    return _redirect_next(request)
+
+@login_required
+@require_POST
+def timer_heartbeat(request):
+    """Keep the running timer alive: one UPDATE, answered in JSON."""
+    return JsonResponse({'running': heartbeat(request.user)})
+
+@login_required
+@require_POST
+def time_entry_create(request):
+    """Record time spent on a task by hand, from a form post or a JSON body."""
+    as_json = request.content_type == 'application/json'
+    data = _posted_data(request)
+    if data is None:
+        return JsonResponse({'error': 'Corps JSON invalide.'}, status=400)
+    form = TimeEntryForm(data)
+    if not form.is_valid():
+        if as_json:
+            return JsonResponse({'error': 'Saisie invalide.', 'fields': form.errors}, status=400)
+        _form_errors(request, form)
+        return _redirect_next(request)
+    
+    task = get_object_or_404(
+        Task.objects.visible().only('pk', 'project_id'), pk=form.cleaned_data['task'], project__user=request.user
+    )
+    entry = record_time(
+        request.user, task, day_start(form.cleaned_data['day']),
+        form.cleaned_data['minutes'] * 60, form.cleaned_data['note'],
+    )
+    if as_json:
+        return JsonResponse({'entry': entry.pk, 'duration': entry.duration}, status=201)
+    messages.success(request, f"{form.cleaned_data['minutes']} minute(s) enregistrée(s).")
+    return _redirect_next(request)
+
+def _owned_task(request, pk):
+    return get_object_or_404(Task.objects.visible().only('pk', 'project_id'), pk=pk, project__user=request.user)
+
+@login_required
+@require_POST
+def task_dependency_create(request, pk):
+    """Make a task wait for another task of its project (see projects.dependencies)."""
+    as_json = request.content_type == 'application/json'
+    data = _posted_data(request)
+    if data is None:
+        return JsonResponse({'error': 'Corps JSON invalide.'}, status=400)
+    form = TaskDependencyForm(data)
+    if not form.is_valid():
+        if as_json:
+            return JsonResponse({'error': 'Saisie invalide.', 'fields': form.errors}, status=400)
+        _form_errors(request, form)
+        return _redirect_next(request)
+    
+    task = _owned_task(request, pk)
+    predecessor = _owned_task(request, form.cleaned_data['predecessor'])
+    try:
+        add_dependency(predecessor, task)
+    except ValidationError as error:
+        if as_json:
+            return JsonResponse({'error': error.messages[0]}, status=400)
+        messages.error(request, error.messages[0])
+        return _redirect_next(request)
+    bump_user_version(request.user.pk)
+    if as_json:
+        return JsonResponse({'task': task.pk, 'predecessor': predecessor.pk}, status=201)
+    messages.success(request, "Dépendance ajoutée.")
+    return _redirect_next(request)
+
+@login_required
+@require_POST
+def task_dependency_delete(request, pk, predecessor):
+    task = _owned_task(request, pk)
+    if not remove_dependency(predecessor, task.pk):
+        raise Http404("Aucune dépendance de ce type.")
+    bump_user_version(request.user.pk)
+    if request.content_type == 'application/json':
+        return JsonResponse({'task': task.pk, 'predecessor': predecessor})
+    messages.success(request, "Dépendance supprimée.")
+    return _redirect_next(request)
+
+@login_required
+@require_POST
+def task_duration(request, pk):
+    """Change the planned duration of a task, in days; its schedule follows (see projects.dependencies)."""
+    as_json = request.content_type == 'application/json'
+    data = _posted_data(request)
+    if data is None:
+        return JsonResponse({'error': 'Corps JSON invalide.'}, status=400)
+    task = get_object_or_404(Task.objects.visible(), pk=pk, project__user=request.user)
+    form = TaskDurationForm(data, instance=task)
+    if not form.is_valid():
+        if as_json:
+            return JsonResponse({'error': 'Saisie invalide.', 'fields': form.errors}, status=400)
+        _form_errors(request, form)
+        return _redirect_next(request)
+    
+    form.save()
+    if as_json:
+        return JsonResponse({'task': task.pk, 'duration': task.duration})
+    messages.success(request, f'Durée de « {task.title} » fixée à {task.duration} jour(s).')
+    return _redirect_next(request)
+
+def _redirect_next(request):
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, {request.get_host()}, request.is_secure()):
+        return redirect(next_url)
+    return redirect('projects:project_list')
+
+@login_required
+def data_export(request):
+    """Stream the projects (or ``?kind=tasks``) of the user as CSV or ``?format=ndjson``."""
+    kind = request.GET.get('kind', 'projects')
+    fmt = request.GET.get('format', 'csv')
+    if kind not in KINDS or fmt not in FORMATS:
+        return JsonResponse({'error': 'Paramètres kind ou format invalides.'}, status=400)
+    response = StreamingHttpResponse(export_rows(request.user, kind, fmt), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    return response
+
+@login_required
+@require_POST
+def data_import(request):
+    """Import an uploaded CSV/NDJSON ``file`` of projects or tasks in the background.
+
+    The rows are validated and inserted by a job (see ``projects.transfer``);
+    the response gives its id and the URL to poll for the import report.
+    """
+    kind = request.POST.get('kind', 'projects')
+    upload = request.FILES.get('file')
+    if kind not in KINDS or upload is None:
+        return JsonResponse({'error': 'Fichier ou type de données manquant.'}, status=400)
+    fmt = request.POST.get('format') or ('ndjson' if upload.name.endswith(('.ndjson', '.jsonl')) else 'csv')
+    if fmt not in FORMATS:
+        return JsonResponse({'error': 'Format invalide.'}, status=400)
+    project_map = None
+    if request.POST.get('id_map'):
+        try:
+            project_map = json.loads(request.POST['id_map'])
+        except ValueError:
+            project_map = None
+        if not isinstance(project_map, dict):
+            return JsonResponse({'error': 'Correspondance des projets invalide.'}, status=400)
+    
+    # Le worker lit le fichier depuis le disque puis le supprime
+    fd, path = tempfile.mkstemp(dir=getattr(settings, 'PROJECTS_IMPORT_DIR', None))
+    with os.fdopen(fd, 'wb') as target:
+        for chunk in upload.chunks():
+            target.write(chunk)
+    job = jobs.enqueue('import_rows', {
+        'user_id': request.user.pk, 'path': path, 'kind': kind, 'fmt': fmt,
+        'project_map': project_map,
+    }, user=request.user, max_attempts=1)
+    return JsonResponse({
+        'job': job.pk,
+        'status': job.status,
+        'status_url': reverse('projects:job_status', args=[job.pk]),
+        'result': job.result,
+    }, status=200 if job.is_finished else 202)
+
+@login_required
+def job_status(request, pk):
+    """Poll the state of a background job started by the current user."""
+    job = get_object_or_404(Job, pk=pk, user=request.user)
+    return JsonResponse({
+        'id': job.pk,
+        'name': job.name,
+        'status': job.status,
+        'attempts': job.attempts,
+        'result': job.result,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    })
+
+@staff_member_required
+def cache_statistics(request):
+    """Hit/miss counters of the project list cache."""
+    return JsonResponse(cache_stats())
+
+@staff_member_required
+def metrics(request):
+    """Request timings aggregated by ``projects.instrumentation``, for Prometheus."""
+    return HttpResponse(registry.render(), content_type=METRICS_CONTENT_TYPE)
+
 
 def logout_view(request):
     """Logout the current user and redirect to login page.
@@ -145,61 +695,3 @@ def logout_view(request):
     # If accessed by GET, don't log out — just redirect to projects list
     return redirect('projects:project_list')
 
-
-def _recalculate_task_deadlines(project):
-    """Recalculate deadlines for tasks of a project when the project deadline changes.
-
-    Strategy:
-    - Compute the available window from today (or earliest task date) to project.deadline.
-    - Distribute tasks within that window according to priority weights so higher priority tasks
-      get earlier slots.
-    - If the new project deadline is in the past, set tasks' deadlines to today (so they appear overdue).
-    Returns a tuple (updated_count, overdue_count).
-    """
-    tasks = list(project.tasks.filter(is_completed=False).order_by('deadline', 'created_at'))
-    if not tasks:
-        return 0, 0
-
-    today = date.today()
-    end = project.deadline
-    # If deadline is before today, set end to today to avoid negative windows
-    if end < today:
-        end = today
-
-    total_days = max(0, (end - today).days)
-
-    # Priority weighting: high=3, medium=2, low=1
-    weight_map = {'high': 3, 'medium': 2, 'low': 1}
-    weights = [weight_map.get(t.priority, 2) for t in tasks]
-    total_weight = sum(weights)
-
-    updated = 0
-    overdue = 0
-
-    # Cumulative allocation
-    cumulative = 0
-    for idx, task in enumerate(tasks):
-        w = weights[idx]
-        cumulative += w
-        # proportional position in (0, total_days]
-        if total_weight > 0:
-            pos = cumulative / total_weight
-        else:
-            pos = (idx + 1) / len(tasks)
-
-        # assign deadline
-        days_offset = round(pos * total_days)
-        new_deadline = today + timedelta(days=days_offset)
-        # ensure not beyond project.deadline
-        if new_deadline > project.deadline:
-            new_deadline = project.deadline
-
-        if task.deadline != new_deadline:
-            task.deadline = new_deadline
-            task.save()
-            updated += 1
-
-        if task.deadline < date.today() and not task.is_completed:
-            overdue += 1
-
-    return updated, overdue
\ No newline at end of file